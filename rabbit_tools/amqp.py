@@ -0,0 +1,744 @@
+"""
+Minimal client of the AMQP 0-9-1 protocol, implementing only
+the methods needed to purge and delete queues, and a backend
+of tools, which pipelines these operations over one channel;
+and the mover of messages of queues (see `MessageMover`).
+
+Frames are encoded and decoded by functions of this module,
+so they can also be used by a stand-in of the broker in tests.
+"""
+
+import socket
+import struct
+import time
+from collections import deque
+
+from pyrabbit.http import NetworkError
+
+
+DEFAULT_AMQP_PORT = 5672
+
+PROTOCOL_HEADER = 'AMQP\x00\x00\x09\x01'
+FRAME_METHOD = 1
+FRAME_CONTENT_HEADER = 2
+FRAME_CONTENT_BODY = 3
+FRAME_HEARTBEAT = 8
+FRAME_END = '\xce'
+FRAME_HEADER_SIZE = 7
+
+# (class id, method id) pairs
+CONNECTION_START = (10, 10)
+CONNECTION_START_OK = (10, 11)
+CONNECTION_TUNE = (10, 30)
+CONNECTION_TUNE_OK = (10, 31)
+CONNECTION_OPEN = (10, 40)
+CONNECTION_OPEN_OK = (10, 41)
+CONNECTION_CLOSE = (10, 50)
+CONNECTION_CLOSE_OK = (10, 51)
+CHANNEL_OPEN = (20, 10)
+CHANNEL_OPEN_OK = (20, 11)
+CHANNEL_CLOSE = (20, 40)
+CHANNEL_CLOSE_OK = (20, 41)
+EXCHANGE_DECLARE = (40, 10)
+EXCHANGE_DECLARE_OK = (40, 11)
+QUEUE_DECLARE = (50, 10)
+QUEUE_DECLARE_OK = (50, 11)
+QUEUE_PURGE = (50, 30)
+QUEUE_PURGE_OK = (50, 31)
+QUEUE_DELETE = (50, 40)
+QUEUE_DELETE_OK = (50, 41)
+BASIC_QOS = (60, 10)
+BASIC_QOS_OK = (60, 11)
+BASIC_CONSUME = (60, 20)
+BASIC_CONSUME_OK = (60, 21)
+BASIC_CANCEL = (60, 30)
+BASIC_CANCEL_OK = (60, 31)
+BASIC_PUBLISH = (60, 40)
+BASIC_RETURN = (60, 50)
+BASIC_DELIVER = (60, 60)
+BASIC_ACK = (60, 80)
+BASIC_NACK = (60, 120)
+CONFIRM_SELECT = (85, 10)
+CONFIRM_SELECT_OK = (85, 11)
+
+# reply codes
+REPLY_SUCCESS = 200
+NO_ROUTE = 312
+ACCESS_REFUSED = 403
+NOT_FOUND = 404
+PRECONDITION_FAILED = 406
+INTERNAL_ERROR = 541
+
+# number of messages published by the mover, before frames
+# are sent, even if more deliveries have been received
+PUBLISH_BATCH_SIZE = 100
+
+
+class AMQPError(Exception):
+
+    """
+    Raised, when the broker closes a channel or the connection.
+    The `status` is the reply code of the broker, which has
+    the same meaning as the HTTP status code of the management
+    API (e.g. 404 - the queue does not exist, 403 - access
+    refused, 5xx - an error of the server), so errors of both
+    backends can be handled the same way.
+    """
+
+    def __init__(self, status, reason):
+        super(AMQPError, self).__init__('{} - {}'.format(status, reason))
+        self.status = status
+        self.reason = reason
+
+
+def encode_shortstr(value):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return struct.pack('>B', len(value)) + value
+
+
+def encode_longstr(value):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return struct.pack('>I', len(value)) + value
+
+
+def encode_frame(frame_type, channel, payload):
+    return struct.pack('>BHI', frame_type, channel, len(payload)) + payload + FRAME_END
+
+
+def encode_method_frame(channel, method, arguments=''):
+    return encode_frame(FRAME_METHOD, channel, struct.pack('>HH', *method) + arguments)
+
+
+def encode_passive_queue_declare(queue_name):
+    # passive declaration, to check the queue and count its messages
+    return '\0\0' + encode_shortstr(queue_name) + '\x01' + encode_longstr('')
+
+
+def encode_close(reply_code, reply_text, failed_method=(0, 0)):
+    """
+    Encode arguments of the Connection.Close or Channel.Close
+    method.
+    """
+    return (struct.pack('>H', reply_code) + encode_shortstr(reply_text)
+            + struct.pack('>HH', *failed_method))
+
+
+class ArgumentDecoder(object):
+
+    """
+    Reads arguments of a method from the payload of its frame.
+    """
+
+    def __init__(self, payload, offset=4):
+        self._payload = payload
+        self._offset = offset
+
+    def _unpack(self, fmt):
+        size = struct.calcsize(fmt)
+        value, = struct.unpack_from(fmt, self._payload, self._offset)
+        self._offset += size
+        return value
+
+    def read_octet(self):
+        return self._unpack('>B')
+
+    def read_short(self):
+        return self._unpack('>H')
+
+    def read_long(self):
+        return self._unpack('>I')
+
+    def read_longlong(self):
+        return self._unpack('>Q')
+
+    def read_shortstr(self):
+        size = self.read_octet()
+        value = self._payload[self._offset:self._offset + size]
+        self._offset += size
+        return value
+
+    def read_longstr(self):
+        size = self.read_long()
+        value = self._payload[self._offset:self._offset + size]
+        self._offset += size
+        return value
+
+    # tables are not needed by the client, so they are skipped
+    skip_table = read_longstr
+
+
+def get_body_size(header_payload):
+    """
+    Return the size of the body of a message from the payload
+    of its content header frame.
+    """
+    return struct.unpack_from('>Q', header_payload, 4)[0]
+
+
+def decode_method(payload):
+    """
+    Return the (class id, method id) pair of a method frame's
+    payload, and the decoder of its arguments.
+    """
+    return struct.unpack_from('>HH', payload), ArgumentDecoder(payload)
+
+
+def read_frame(stream):
+    """
+    Read a frame from a file-like object; return its type,
+    channel and payload, or None, if the stream has ended.
+    """
+    header = stream.read(FRAME_HEADER_SIZE)
+    if len(header) < FRAME_HEADER_SIZE:
+        return None
+    frame_type, channel, size = struct.unpack('>BHI', header)
+    # the payload is read together with the end of the frame
+    payload = stream.read(size + 1)
+    if len(payload) <= size or payload[-1] != FRAME_END:
+        return None
+    return frame_type, channel, payload[:-1]
+
+
+class SocketReader(object):
+
+    """
+    Buffered reader of a socket. Unlike the file object of the
+    socket, it tells, whether received data is buffered, so
+    a client can send frames in batches, until it has to wait
+    for the broker.
+    """
+
+    chunk_size = 65536
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._buffer = ''
+        self._offset = 0
+
+    @property
+    def buffered(self):
+        return len(self._buffer) - self._offset
+
+    def read(self, size):
+        while self.buffered < size:
+            chunk = self._sock.recv(max(self.chunk_size, size - self.buffered))
+            if not chunk:
+                break
+            self._buffer = self._buffer[self._offset:] + chunk
+            self._offset = 0
+        data = self._buffer[self._offset:self._offset + size]
+        self._offset += len(data)
+        return data
+
+
+class AMQPConnection(object):
+
+    """
+    Connection to the broker, opened on a vhost. Heartbeats
+    are disabled, so the connection can be idle between
+    operations.
+    """
+
+    def __init__(self, host, port, user, password, vhost, timeout):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.vhost = vhost
+        self.timeout = timeout
+        self.channel_max = 65535
+        self._sock = None
+        self._stream = None
+        self._last_channel = 0
+
+    @property
+    def is_open(self):
+        return self._sock is not None
+
+    def _call_socket(self, func, *args):
+        try:
+            return func(*args)
+        except socket.timeout:
+            self.close()
+            raise NetworkError("Timeout while trying to connect to RabbitMQ")
+        except (socket.error, IOError) as e:
+            self.close()
+            raise NetworkError("Error: %s %s" % (type(e), e))
+
+    def send(self, data):
+        self._call_socket(self._sock.sendall, data)
+
+    def send_method(self, channel, method, arguments=''):
+        self.send(encode_method_frame(channel, method, arguments))
+
+    def has_buffered_data(self):
+        return self._stream is not None and self._stream.buffered > 0
+
+    def read_frame(self):
+        """
+        Return the type, the channel and the payload of the next
+        frame, other than a heartbeat. If the broker closes
+        the connection, AMQPError is raised.
+        """
+        while True:
+            frame = self._call_socket(read_frame, self._stream)
+            if frame is None:
+                self.close()
+                raise NetworkError("Connection closed by RabbitMQ")
+            frame_type, channel, payload = frame
+            if frame_type == FRAME_HEARTBEAT:
+                continue
+            if frame_type == FRAME_METHOD:
+                method, arguments = decode_method(payload)
+                if method == CONNECTION_CLOSE:
+                    error = AMQPError(arguments.read_short(), arguments.read_shortstr())
+                    self.send_method(0, CONNECTION_CLOSE_OK)
+                    self.close()
+                    raise error
+            return frame
+
+    def read_method(self):
+        """
+        Return the channel and the method of the next method frame,
+        and the decoder of its arguments. If the broker closes
+        the connection, AMQPError is raised.
+        """
+        while True:
+            frame_type, channel, payload = self.read_frame()
+            if frame_type != FRAME_METHOD:
+                continue
+            method, arguments = decode_method(payload)
+            return channel, method, arguments
+
+    def _expect(self, expected_method):
+        channel, method, arguments = self.read_method()
+        if method != expected_method:
+            self.close()
+            raise NetworkError("Unexpected AMQP method: {}".format(method))
+        return arguments
+
+    def connect(self):
+        self._sock = self._call_socket(socket.create_connection, (self.host, self.port),
+                                       self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._stream = SocketReader(self._sock)
+        self.send(PROTOCOL_HEADER)
+        self._expect(CONNECTION_START)
+        self.send_method(0, CONNECTION_START_OK,
+                         encode_longstr('')
+                         + encode_shortstr('PLAIN')
+                         + encode_longstr('\0{}\0{}'.format(self.user, self.password))
+                         + encode_shortstr('en_US'))
+        arguments = self._expect(CONNECTION_TUNE)
+        self.channel_max = arguments.read_short() or self.channel_max
+        frame_max = arguments.read_long()
+        self.send_method(0, CONNECTION_TUNE_OK,
+                         struct.pack('>HIH', self.channel_max, frame_max, 0))
+        self.send_method(0, CONNECTION_OPEN,
+                         encode_shortstr(self.vhost) + encode_shortstr('') + '\0')
+        self._expect(CONNECTION_OPEN_OK)
+
+    def open_channel(self):
+        self._last_channel = self._last_channel % self.channel_max + 1
+        self.send_method(self._last_channel, CHANNEL_OPEN, encode_shortstr(''))
+        self._expect(CHANNEL_OPEN_OK)
+        return self._last_channel
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+                self._stream = None
+
+
+class AMQPBackend(object):
+
+    """
+    Backend of tools purging and deleting queues of a vhost
+    with AMQP methods, instead of management API requests.
+
+    Operations are pipelined: up to `pipeline_size` of them are
+    sent without waiting for replies. Replies come in the order
+    of operations; if an operation fails, the broker closes the
+    channel, ignoring operations sent after it, so they are sent
+    again on a new channel.
+
+    The broker deletes a missing queue successfully, so a deletion
+    is preceded by a passive declaration of the queue (in the same
+    pipeline), which fails with 404, like the management API.
+    """
+
+    # name of a method of the management API client: steps of the
+    # operation - (AMQP method, its reply, function encoding arguments
+    # for a queue name); the number of messages is read from the reply
+    # of the last step
+    operations = {
+        'delete_queue': (
+            (QUEUE_DECLARE, QUEUE_DECLARE_OK, encode_passive_queue_declare),
+            (QUEUE_DELETE, QUEUE_DELETE_OK, lambda name: '\0\0' + encode_shortstr(name) + '\0'),
+        ),
+        'purge_queue': (
+            (QUEUE_PURGE, QUEUE_PURGE_OK, lambda name: '\0\0' + encode_shortstr(name) + '\0'),
+        ),
+    }
+
+    def __init__(self, host, port, user, password, vhost, timeout, pipeline_size=1):
+        self._connection = AMQPConnection(host, port, user, password, vhost, timeout)
+        self.pipeline_size = pipeline_size
+        self._channel = None
+
+    @classmethod
+    def supports(cls, method_name):
+        return method_name in cls.operations
+
+    def _get_channel(self):
+        if not self._connection.is_open:
+            self._connection.connect()
+            self._channel = None
+        if self._channel is None:
+            self._channel = self._connection.open_channel()
+        return self._channel
+
+    def close(self):
+        self._connection.close()
+        self._channel = None
+
+    def iter_results(self, method_name, chosen_queues, before_send=None):
+        """
+        Apply the operation to queues from an iterable of (key,
+        queue name) pairs. Yield (pair, error, latency, messages)
+        tuples, in the order of pairs; `error` is AMQPError raised
+        by the operation, or None, `messages` - the number of purged
+        or deleted messages (None, if the operation failed). The `before_send` function,
+        if passed, is called before sending each operation
+        (e.g. to limit their rate).
+        """
+        # [pair, (method, encoded arguments) of steps, start time,
+        # number of received replies] of sent operations
+        in_flight = deque()
+        try:
+            for result in self._iter_results(method_name, iter(chosen_queues), before_send,
+                                             in_flight):
+                yield result
+        finally:
+            # replies to operations in flight would be read
+            # as replies to next operations
+            if in_flight:
+                self.close()
+
+    def _iter_results(self, method_name, chosen_queues, before_send, in_flight):
+        operation = self.operations[method_name]
+        exhausted = False
+        while True:
+            frames = []
+            while not exhausted and len(in_flight) < self.pipeline_size:
+                try:
+                    chosen_queue = next(chosen_queues)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if before_send is not None:
+                    before_send()
+                steps = [(method, encode_arguments(chosen_queue[1]))
+                         for method, _, encode_arguments in operation]
+                channel = self._get_channel()
+                frames.extend(encode_method_frame(channel, method, arguments)
+                              for method, arguments in steps)
+                in_flight.append([chosen_queue, steps, time.time(), 0])
+            if frames:
+                self._connection.send(''.join(frames))
+            if not in_flight:
+                return
+            channel, received_method, arguments = self._connection.read_method()
+            sent_operation = in_flight[0]
+            chosen_queue, _, start, reply_count = sent_operation
+            if received_method == operation[reply_count][1]:
+                sent_operation[3] += 1
+                if sent_operation[3] < len(operation):
+                    continue
+                in_flight.popleft()
+                yield chosen_queue, None, time.time() - start, arguments.read_long()
+            elif received_method == CHANNEL_CLOSE:
+                in_flight.popleft()
+                error = AMQPError(arguments.read_short(), arguments.read_shortstr())
+                self._connection.send_method(channel, CHANNEL_CLOSE_OK)
+                self._channel = None
+                self._resend(in_flight)
+                yield chosen_queue, error, time.time() - start, None
+            else:
+                self.close()
+                raise NetworkError("Unexpected AMQP method: {}".format(received_method))
+
+    def _resend(self, in_flight):
+        # operations after the failed one have not been replied to
+        if in_flight:
+            channel = self._get_channel()
+            self._connection.send(''.join(encode_method_frame(channel, method, arguments)
+                                          for _, steps, _, _ in in_flight
+                                          for method, arguments in steps))
+
+
+class _Delivery(object):
+
+    """
+    Message delivered to the mover, whose content is being received.
+    """
+
+    def __init__(self, delivery_tag, routing_key):
+        self.delivery_tag = delivery_tag
+        self.routing_key = routing_key
+        self.header = None
+        self.body_frames = []
+        self.remaining_size = None
+
+    @property
+    def is_complete(self):
+        return self.remaining_size == 0
+
+
+class MessageMover(object):
+
+    """
+    Moves messages of queues of a vhost to an exchange (the default
+    exchange - to a queue, whose name is the routing key), with
+    their routing keys, unless `routing_key` is passed.
+
+    Messages are consumed with a window of `prefetch_count`
+    unacknowledged messages and published on the same channel,
+    in the confirm mode, copying their content frames. Messages
+    are acknowledged (with the "multiple" flag, in batches), when
+    the broker confirms messages published from them, so a message
+    is never lost, but it can be duplicated, if the move fails.
+    Publishing is mandatory: if a message cannot be routed,
+    the move fails, and unacknowledged messages are requeued.
+
+    Frames are sent in batches, before the mover waits for next
+    frames of the broker.
+    """
+
+    def __init__(self, host, port, user, password, vhost, timeout, prefetch_count,
+                 exchange='', routing_key=None):
+        self._connection = AMQPConnection(host, port, user, password, vhost, timeout)
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.prefetch_count = prefetch_count
+
+    def close(self):
+        self._connection.close()
+
+    def _open_channel(self):
+        if not self._connection.is_open:
+            self._connection.connect()
+        return self._connection.open_channel()
+
+    def _close_channel(self, channel):
+        """
+        Close the channel, so messages delivered to it and not
+        acknowledged are requeued.
+        """
+        self._connection.send_method(channel, CHANNEL_CLOSE,
+                                     encode_close(REPLY_SUCCESS, 'OK'))
+        while True:
+            frame_type, frame_channel, payload = self._connection.read_frame()
+            if (frame_type == FRAME_METHOD and frame_channel == channel
+                    and decode_method(payload)[0] in (CHANNEL_CLOSE_OK, CHANNEL_CLOSE)):
+                return
+
+    def _get_error(self, channel, arguments):
+        # the broker has closed the channel
+        self._connection.send_method(channel, CHANNEL_CLOSE_OK)
+        return AMQPError(arguments.read_short(), arguments.read_shortstr())
+
+    def _call(self, channel, method, arguments, reply):
+        self._connection.send_method(channel, method, arguments)
+        _, received_method, received_arguments = self._connection.read_method()
+        if received_method == CHANNEL_CLOSE:
+            raise self._get_error(channel, received_arguments)
+        if received_method != reply:
+            self.close()
+            raise NetworkError("Unexpected AMQP method: {}".format(received_method))
+        return received_arguments
+
+    def check_target(self):
+        """
+        Raise AMQPError, if the target exchange or queue does
+        not exist.
+        """
+        channel = self._open_channel()
+        if self.exchange:
+            self._call(channel, EXCHANGE_DECLARE,
+                       '\0\0' + encode_shortstr(self.exchange) + encode_shortstr('')
+                       + '\x01' + encode_longstr(''),
+                       EXCHANGE_DECLARE_OK)
+        else:
+            self._call(channel, QUEUE_DECLARE, encode_passive_queue_declare(self.routing_key),
+                       QUEUE_DECLARE_OK)
+        self._close_channel(channel)
+
+    def move(self, queue_name, drain=False):
+        """
+        Move messages of the queue; return the number of moved
+        messages. Only messages in the queue at the start
+        are moved, unless `drain` is True - then messages are
+        moved, until the queue is empty.
+        """
+        channel = self._open_channel()
+        self._call(channel, CONFIRM_SELECT, '\0', CONFIRM_SELECT_OK)
+        arguments = self._call(channel, QUEUE_DECLARE, encode_passive_queue_declare(queue_name),
+                               QUEUE_DECLARE_OK)
+        arguments.read_shortstr()
+        state = _MoveState(None if drain else arguments.read_long())
+        try:
+            if state.limit != 0:
+                self._move(channel, queue_name, state)
+        except _MoveFailed as e:
+            # messages confirmed so far are acknowledged, others
+            # are requeued
+            state.frames = []
+            self._flush(channel, state)
+            self._close_channel(channel)
+            raise e.error
+        self._close_channel(channel)
+        return state.moved_count
+
+    def _move(self, channel, queue_name, state):
+        self._call(channel, BASIC_QOS, struct.pack('>IHB', 0, self.prefetch_count, 0),
+                   BASIC_QOS_OK)
+        self._call(channel, BASIC_CONSUME,
+                   '\0\0' + encode_shortstr(queue_name) + encode_shortstr('') + '\0'
+                   + encode_longstr(''),
+                   BASIC_CONSUME_OK)
+        while True:
+            is_waiting = not self._connection.has_buffered_data()
+            if state.is_done:
+                self._flush(channel, state)
+                return
+            if is_waiting and not state.pending and state.delivery is None and not state.checking:
+                # no message is being moved - check, whether the queue is empty
+                state.frames.append(encode_method_frame(channel, QUEUE_DECLARE,
+                                                        encode_passive_queue_declare(queue_name)))
+                state.checking = True
+            if is_waiting or len(state.frames) >= PUBLISH_BATCH_SIZE:
+                self._flush(channel, state)
+            frame_type, frame_channel, payload = self._connection.read_frame()
+            if frame_channel == channel:
+                self._handle_frame(channel, frame_type, payload, state)
+
+    def _handle_frame(self, channel, frame_type, payload, state):
+        if frame_type == FRAME_METHOD:
+            method, arguments = decode_method(payload)
+            if method == BASIC_DELIVER:
+                arguments.read_shortstr()
+                delivery_tag = arguments.read_longlong()
+                arguments.read_octet()
+                arguments.read_shortstr()
+                state.delivery = _Delivery(delivery_tag, arguments.read_shortstr())
+            elif method == BASIC_ACK:
+                state.confirm(arguments.read_longlong(), arguments.read_octet() & 1)
+            elif method == QUEUE_DECLARE_OK:
+                arguments.read_shortstr()
+                state.checking = False
+                if not arguments.read_long() and not state.pending and state.delivery is None:
+                    state.is_empty = True
+            elif method == BASIC_NACK:
+                raise _MoveFailed(AMQPError(INTERNAL_ERROR, 'The broker has rejected a message.'))
+            elif method == BASIC_RETURN:
+                raise _MoveFailed(AMQPError(arguments.read_short(), arguments.read_shortstr()))
+            elif method == BASIC_CANCEL:
+                raise _MoveFailed(AMQPError(NOT_FOUND, 'The consumer has been cancelled.'))
+            elif method == CHANNEL_CLOSE:
+                raise self._get_error(channel, arguments)
+        elif frame_type == FRAME_CONTENT_HEADER:
+            state.delivery.header = payload
+            state.delivery.remaining_size = get_body_size(payload)
+        elif frame_type == FRAME_CONTENT_BODY:
+            state.delivery.body_frames.append(payload)
+            state.delivery.remaining_size -= len(payload)
+        if state.delivery is not None and state.delivery.is_complete:
+            delivery, state.delivery = state.delivery, None
+            if state.limit is None or state.published_count < state.limit:
+                self._publish(channel, delivery, state)
+
+    def _publish(self, channel, delivery, state):
+        routing_key = delivery.routing_key if self.routing_key is None else self.routing_key
+        state.frames.append(encode_method_frame(channel, BASIC_PUBLISH,
+                                                '\0\0' + encode_shortstr(self.exchange)
+                                                + encode_shortstr(routing_key) + '\x01'))
+        state.frames.append(encode_frame(FRAME_CONTENT_HEADER, channel, delivery.header))
+        state.frames.extend(encode_frame(FRAME_CONTENT_BODY, channel, body)
+                            for body in delivery.body_frames)
+        state.published_count += 1
+        state.pending.append((state.published_count, delivery.delivery_tag))
+        if state.published_count == state.limit:
+            # next deliveries are requeued, when the channel is closed
+            state.frames.append(encode_method_frame(channel, BASIC_CANCEL,
+                                                    encode_shortstr('') + '\0'))
+
+    def _flush(self, channel, state):
+        if state.ack_tag is not None:
+            state.frames.append(encode_method_frame(channel, BASIC_ACK,
+                                                    struct.pack('>QB', state.ack_tag, 1)))
+            state.ack_tag = None
+        if state.frames:
+            self._connection.send(''.join(state.frames))
+            state.frames = []
+
+
+class _MoveFailed(Exception):
+
+    """
+    Raised by the mover, when it stops moving messages of a queue,
+    closing the channel; `error` is the AMQPError raised to callers.
+    """
+
+    def __init__(self, error):
+        super(_MoveFailed, self).__init__(str(error))
+        self.error = error
+
+
+class _MoveState(object):
+
+    """
+    State of the move of messages of a queue. Messages published
+    and not confirmed yet are kept in `pending`, as (sequence
+    number, delivery tag) pairs, both increasing.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.delivery = None
+        self.published_count = 0
+        self.moved_count = 0
+        self.pending = deque()
+        self.frames = []
+        # the highest delivery tag of confirmed messages, which
+        # has not been acknowledged yet
+        self.ack_tag = None
+        # sequence numbers of messages confirmed out of order
+        self._confirmed = set()
+        # whether the queue is being checked for messages
+        self.checking = False
+        self.is_empty = False
+
+    @property
+    def is_done(self):
+        return self.is_empty or (self.published_count == self.limit and not self.pending)
+
+    def confirm(self, sequence_number, multiple):
+        if not multiple:
+            self._confirmed.add(sequence_number)
+        while self.pending:
+            pending_number, delivery_tag = self.pending[0]
+            if multiple and pending_number <= sequence_number:
+                pass
+            elif pending_number in self._confirmed:
+                self._confirmed.remove(pending_number)
+            else:
+                break
+            self.pending.popleft()
+            self.ack_tag = delivery_tag
+            self.moved_count += 1
@@ -1,21 +1,60 @@
 import argparse
+import copy
+import heapq
 import logging
+import os
 import re
 import sys
-from collections import Sequence
-
-from pyrabbit import Client
-from pyrabbit.http import HTTPError
+import threading
+import time
+from collections import (
+    Sequence,
+    deque,
+)
+from contextlib import contextmanager
 
 from rabbit_tools.config import (
     Config,
     ConfigFileMissingException,
 )
+from rabbit_tools.executor import (
+    AIMDLimiter,
+    BoundedExecutor,
+    RateLimiter,
+    get_backoff_delay,
+)
+from rabbit_tools.index import QueueIndex
+from rabbit_tools.journal import Journal
+from rabbit_tools.output import ResultWriter
+from rabbit_tools.lib import (
+    DEFAULT_DEDUPLICATION_WINDOW,
+    iter_unique_lines,
+)
+from rabbit_tools.logs import (
+    PER_QUEUE,
+    flush_background_logging,
+)
+from rabbit_tools.picker import QueuePicker
+from rabbit_tools.selection import (
+    Predicate,
+    SelectionError,
+    Selector,
+)
+from rabbit_tools.stats import OperationStats
+
+# The HTTP stack (pyrabbit and httplib2) and the AMQP backend are slow
+# to import, so they are imported, when the first client or backend
+# is built; the help, argument errors and runs, which do not reach
+# the broker, do not pay for it.
 
 
 logger = logging.getLogger(__name__)
 
 
+# default number of retries of failed requests in the adaptive mode
+DEFAULT_RETRIES = 3
+
+
 class StopReceivingInput(Exception):
     """
     Raised when no queues are left, or user typed a quitting command.
@@ -62,7 +101,11 @@ class RabbitToolBase(object):
     ** Usage
     There are two ways of using Rabbit Tools. The first is to
     pass a known queue name or many queue names, separated by
-    space, or "all" string, to choose all queues. The other way
+    space, or "all" string, to choose all queues. Long lists
+    of names can be read from a file or from the standard
+    input (the `--from-file` argument, or "-" instead of
+    names); queues are manipulated while names are read,
+    so another tool can generate them. The other way
     is to run a tool with no arguments, so current list of queues
     will be shown and it will wait for input from user. Each
     queue has a number associated with it, so in this mode user
@@ -71,14 +114,41 @@ class RabbitToolBase(object):
     Additional comfort of usage comes from:
       * using the config file, so there is no need to define every
         time options like API address or user credentials;
-      * ability to choose ranges of queue numbers.
+      * ability to choose ranges of queue numbers;
+      * ability to manipulate many queues in parallel (the
+        `--concurrency` argument), optionally adapting the number
+        of parallel requests to the latency of the API (the
+        `--adaptive` argument) and limiting their rate (the
+        `--max-rate` argument);
+      * spreading the work evenly across nodes of a cluster (the
+        `--node-concurrency` argument), optionally sending requests
+        to the management API on the home node of each queue (the
+        `--node-endpoints` argument);
+      * manipulating the largest queues first (the `--largest-first`
+        argument), e.g. to free the memory of the broker as soon
+        as possible during a memory alarm;
+      * manipulating queues of many vhosts and clusters in one run
+        (see below);
+      * purging and deleting queues with AMQP methods, pipelined
+        over one connection, instead of management API requests
+        (the "backend = amqp" option of the config; see the
+        `AMQPBackend` class). The listing of queues still uses
+        the management API.
 
     ** Choosing queues in the interactive mode:
     In this mode a tool runs in a loop, until user quits or there
     are no queues left. In each iteration of the loop, the list
     of available queues is shown, each queue has a number assigned,
-    so user inputs proper number, not a whole name. Input can be
+    so user inputs proper number, not a whole name. The number
+    of a queue does not change during the session. Long lists
+    are shown page by page and can be searched (see the
+    `QueuePicker` class); if a search is active, only found
+    queues can be chosen. Input can be
     a single number, list of numbers or range.
+    The list is fetched from the API only once and then updated
+    after each action. Input "r" (or "refresh") fetches it again;
+    it can also be fetched again periodically (the `--cache-ttl`
+    argument).
     In the list of numbers, each number should be separated by
     space, comma or space and comma (number of spaces does not
     matter, there can be more than one, before and after the
@@ -90,6 +160,34 @@ class RabbitToolBase(object):
         2 - 5 (will chose: 2, 3, 4, 5)
     IMPORTANT: list and range of numbers should not be mixed
     in one input.
+
+    ** Selections
+    Queues can also be chosen by patterns of their names and by
+    their statistics (see the `Selector` class), both in the
+    interactive mode and with the `--select` argument:
+        re:^tmp\.loadtest\. consumers=0 messages>1M
+    Name patterns are passed to the management API, so the broker
+    filters the queues; only columns needed to check conditions
+    are fetched.
+
+    ** Many vhosts and clusters
+    Queues passed by names, "all" or a selection can be chosen
+    in many vhosts (the `--vhost` argument with comma-separated
+    names, or `--all-vhosts`) and clusters (the `--cluster`
+    argument with comma-separated names of config sections).
+    Each pair of a cluster and a vhost is a target handled
+    by a copy of the tool; targets are handled in parallel
+    and their statistics are merged into one report.
+
+    ** Watch mode
+    With the `--watch SECONDS` argument, the tool runs, until
+    it is interrupted, applying the action to queues matching
+    the selection every SECONDS, like a policy:
+        rabpurge --watch 60 --select 're:\.dlq$ messages>10k'
+        rabdel --watch 600 --select 'consumers=0 idle>1d'
+    It replaces runs of the tool from cron: the client, its
+    connections and the backend are kept between polls.
+    Only polls, which have affected queues, are logged.
     """
 
     config_section = 'rabbit_tools'
@@ -103,6 +201,125 @@ class RabbitToolBase(object):
                     '"all" to choose all queues.',
             'nargs': '*',
         },
+        '--from-file': {
+            'help': 'Read names of queues from the file, one per line, manipulating '
+                    'queues while names are read ("-" - read them from the standard '
+                    'input, like passing "-" instead of names). Repeated names are '
+                    'skipped, unless there are more than {} other names between '
+                    'them.'.format(DEFAULT_DEDUPLICATION_WINDOW),
+            'metavar': 'FILE',
+        },
+        '--concurrency': {
+            'help': 'Number of queues manipulated in parallel.',
+            'type': int,
+            'default': 1,
+        },
+        '--adaptive': {
+            'help': 'Adapt the number of parallel requests (up to the concurrency) '
+                    'to the latency of the API: lower it, when the API slows down '
+                    'or is overloaded, and raise it again, when the API recovers. '
+                    'Failed requests are retried (see --retries).',
+            'action': 'store_true',
+        },
+        '--max-rate': {
+            'help': 'Maximum number of requests per second.',
+            'type': float,
+            'metavar': 'RPS',
+        },
+        '--retries': {
+            'help': 'Number of retries of a request, which has failed with a server '
+                    'or network error, or has been rejected with the "429 Too Many '
+                    'Requests" status (default: {} with --adaptive, otherwise '
+                    '0).'.format(DEFAULT_RETRIES),
+            'type': int,
+        },
+        '--node-concurrency': {
+            'help': 'Group queues by their home nodes and manipulate no more than '
+                    'N queues of the same node in parallel (the total number is '
+                    'still limited by the concurrency). Queues of the least busy '
+                    'nodes are manipulated first.',
+            'type': int,
+            'metavar': 'N',
+        },
+        '--node-endpoints': {
+            'help': 'Send requests concerning a queue to the management API on its '
+                    'home node; the host is taken from the name of the node '
+                    '("rabbit@HOST"), the port is the configured one.',
+            'action': 'store_true',
+        },
+        '--largest-first': {
+            'help': 'Apply the action to the largest queues first, by the number '
+                    'of messages, their bytes or the memory used by a queue, taken '
+                    'from the listing (the whole list is fetched, before the action '
+                    'starts); the amount freed over time is reported.',
+            'choices': ['messages', 'bytes', 'memory'],
+            'metavar': 'FIELD',
+        },
+        '--vhost': {
+            'help': 'Vhost or comma-separated vhosts to use instead of the configured '
+                    'one; queues of many vhosts are manipulated in parallel.',
+            'metavar': 'VHOSTS',
+        },
+        '--all-vhosts': {
+            'help': 'Manipulate queues of all vhosts.',
+            'action': 'store_true',
+        },
+        '--cluster': {
+            'help': 'Name or comma-separated names of clusters, configured in '
+                    'the "[rabbit_tools:NAME]" sections of the config file (options '
+                    'missing in a section are taken from the "[rabbit_tools]" '
+                    'section); queues of many clusters are manipulated in parallel.',
+            'metavar': 'CLUSTERS',
+        },
+        '--select': {
+            'help': 'Choose queues matching the selection (instead of passing '
+                    'their names), e.g.: "re:^tmp\\. consumers=0 messages>1M". '
+                    'Terms: glob:PATTERN, re:PATTERN, FIELD(>|>=|<|<=|=|!=)VALUE, '
+                    'where FIELD is one of: messages, ready, unacked, consumers, '
+                    'memory, bytes, idle.',
+            'metavar': 'SELECTION',
+        },
+        '--watch': {
+            'help': 'Run continuously: every SECONDS, list queues (fetching only '
+                    'columns needed by the selection) and apply the action to queues '
+                    'matching the selection (--select is required), e.g. '
+                    '"--watch 60 --select \'re:\\.dlq$ messages>10k\'". Stats of all '
+                    'polls, with counters of polls, are written to the --stats-json '
+                    'file after each poll.',
+            'type': float,
+            'metavar': 'SECONDS',
+        },
+        '--stats-json': {
+            'help': 'Write timings of phases and of operations on single queues, '
+                    'with latency percentiles, to the JSON file.',
+            'metavar': 'FILE',
+        },
+        '--json-lines': {
+            'help': 'Write the result of the operation on each queue to the file '
+                    '("-" - the standard output) as soon as it is known, as a JSON '
+                    'object in a separate line, with fields: queue, vhost, status '
+                    '("ok" or the error code), latency (in seconds) and messages '
+                    '(the number of purged or deleted messages, if it is known). '
+                    'Names of affected queues are not logged then.',
+            'metavar': 'FILE',
+        },
+        '--journal': {
+            'help': 'Append names of queues, on which the action has been completed '
+                    '(including deleted queues, which did not exist), to the file, '
+                    'so the run can be resumed, if it is interrupted (see --resume).',
+            'metavar': 'FILE',
+        },
+        '--resume': {
+            'help': 'Skip queues found in the journal file of an interrupted run, '
+                    'and append next completed queues to it.',
+            'metavar': 'JOURNAL',
+        },
+        '--cache-ttl': {
+            'help': 'Number of seconds, after which the list of queues shown '
+                    'in the interactive mode is fetched again (by default it is '
+                    'fetched again only on the refresh command).',
+            'type': float,
+        },
     }
 
     queue_not_affected_msg = 'Queue not affected'
@@ -111,74 +328,502 @@ class RabbitToolBase(object):
 
     quitting_commands = ['q', 'quit', 'exit', 'e']
     choose_all_commands = ['a', 'all']
+    refresh_commands = ['r', 'refresh']
 
     # set to True, if queues are deleted after an action,
     # and the associated number should not be shown anymore
     do_remove_chosen_numbers = False
 
+    # the client of the management API and its method applying
+    # the action are created on the first use (see the `client`
+    # property)
+    _client = None
+    _client_lock = threading.Lock()
+    _method_to_call = None
+
+    # number of parallel API calls, overridden by the `--concurrency`
+    # argument
+    concurrency = 1
+
+    # in the adaptive mode, the number of requests in progress
+    # is limited by the `AIMDLimiter`; the rate of requests
+    # can be limited by the `RateLimiter`; transient errors
+    # are retried `retries` times
+    _limiter = None
+    _rate_limiter = None
+    retries = 0
+
+    # in the node-aware mode (the `--node-concurrency` or
+    # `--node-endpoints` argument), home nodes of listed queues
+    # are kept in the `_queue_nodes` dict; clients of management
+    # APIs on nodes are created on the first use
+    node_concurrency = None
+    use_node_endpoints = False
+    _queue_nodes = None
+    _node_clients = None
+
+    # with the `--largest-first` argument, sizes of listed queues
+    # (values of the column of the `priority_field`, see
+    # fields of the `Predicate`) are kept in the `_queue_sizes` dict,
+    # queues are taken from a heap, the largest first, and sizes
+    # of affected queues are added to the freed amount of the stats
+    priority_field = None
+    _queue_sizes = None
+
+    # the list of queues in the interactive mode is kept between
+    # iterations and updated after actions; it is fetched again
+    # on the refresh command, or after `cache_ttl` seconds, if set
+    cache_ttl = None
+    _queue_mapping = None
+    # queues of the vhost listed without a selection can be taken
+    # from a cache shared by many runs of tools (the `QueueListCache`
+    # of a session, see the `session` module)
+    queue_list_cache = None
+    # names of queues of handled vhosts are cached for completion
+    # in the shell (see the `names_cache` module); the cache is
+    # refreshed in the background after a run, if it is older
+    # than the "names_cache_ttl" option of the config (0 disables
+    # it). Names of deleted queues (or found missing) are kept
+    # in `_deleted_names` by (cluster name, vhost) pairs, shared
+    # by copies of the tool, and removed from the cache at once.
+    # Only tools reading the config file refresh it, as the
+    # refreshing process reads it too
+    refresh_names_cache = False
+    _deleted_names = None
+    _queue_mapping_timestamp = None
+
+    # with many vhosts or clusters, (cluster name, config) pairs
+    # and names of vhosts (None - the configured vhost, or all,
+    # if `all_vhosts` is True) of targets; each target is handled
+    # by a copy of the tool, logging messages with `_log_prefix`;
+    # at most `max_parallel_targets` targets are handled at once;
+    # `cluster_name` is the name of the cluster handled by the tool
+    # (None - the cluster of the main section of the config)
+    all_vhosts = False
+    max_parallel_targets = 8
+    cluster_name = None
+    _target_clusters = None
+    _target_vhosts = None
+    _log_prefix = ''
+
+    # backends, which can be chosen by the "backend" option
+    # of the config: names of methods building them on the first
+    # use; a method returns None, if the backend does not support
+    # the action of the tool, then the "http" backend is used
+    backends = {
+        'http': '_get_http_backend',
+        'amqp': '_get_amqp_backend',
+    }
+    _backend = None
+
+    # path of the file with names of queues (`--from-file`),
+    # "-" - the standard input
+    names_path = None
+
+    # selection of queues passed as the `--select` argument
+    _selector = None
+
+    # in the watch mode (the `--watch` argument), the action
+    # is applied to queues matching the selection every
+    # `watch_interval` seconds, until the tool is interrupted,
+    # or `max_polls` polls are done; stats of polls are merged
+    # into the stats of the run without records of queues
+    watch_interval = None
+    max_polls = None
+
+    # pages of the list of queues in the interactive mode,
+    # created on the first use
+    _picker = None
+
+    # timings of phases and operations (see the `OperationStats`
+    # class), written to the `--stats-json` file, if it is set
+    stats_json_path = None
+    _stats = None
+
+    # results of operations on queues are written to the
+    # `--json-lines` file by the `ResultWriter`, if it is set
+    json_lines_path = None
+    _result_writer = None
+
+    # queues, on which the action has been completed, are appended
+    # to the `Journal` (the `--journal` or `--resume` argument);
+    # queues found in the journal of a resumed run are skipped,
+    # they are counted in `skipped_count`
+    journal_path = None
+    resume = False
+    skipped_count = 0
+    _journal = None
+
     single_choice_regex = re.compile(r'^\d+$')
     range_choice_regex = re.compile(r'^(\d+)[ ]*-[ ]*(\d+)$')
     multi_choice_regex = re.compile(r'^((\d+)*[ ]*,?[ ]*){2,}$')
     multi_choice_inner_regex = re.compile(r'\b(\d+)\b')
 
-    def __init__(self):
-        try:
-            self.config = Config(self.config_section)
-        except ConfigFileMissingException:
-            sys.exit('Config file has not been found. Use the "rabbit_tools_config" command'
-                     ' to generate it.')
-        self._parsed_args = self._get_parsed_args()
+    def __init__(self, config=None, argv=None, cluster_configs=None):
+        """
+        By default, the config is read from the config file and
+        arguments are taken from the command line; `config` (dict)
+        and `argv` (list) can be passed to use the tool from code,
+        as well as `cluster_configs` - a dict of configs of clusters
+        chosen with the `--cluster` argument, by names.
+        """
+        self._parsed_args = self._get_parsed_args(argv)
+        if self._parsed_args.concurrency < 1:
+            sys.exit('Concurrency has to be a positive number.')
+        self.concurrency = self._parsed_args.concurrency
+        self._set_rate_control(self._parsed_args)
+        self._set_node_scheduling(self._parsed_args)
+        self._set_priority(self._parsed_args)
+        self.cache_ttl = self._parsed_args.cache_ttl
+        self.stats_json_path = self._parsed_args.stats_json
+        self.json_lines_path = self._parsed_args.json_lines
+        if self._parsed_args.journal and self._parsed_args.resume:
+            sys.exit('The journal of a resumed run is passed with the --resume argument only.')
+        self.journal_path = self._parsed_args.journal or self._parsed_args.resume
+        self.resume = bool(self._parsed_args.resume)
+        self._set_names_path(self._parsed_args)
+        if self._parsed_args.select:
+            if self._parsed_args.queue_name or self.names_path is not None:
+                sys.exit('Queue names cannot be passed together with a selection.')
+            try:
+                self._selector = Selector(self._parsed_args.select)
+            except SelectionError as e:
+                sys.exit(str(e))
+        self._set_watch(self._parsed_args)
+        self._set_action_args(self._parsed_args)
+        # the config is read, when arguments are valid
+        if config is None:
+            try:
+                config = Config(self.config_section)
+            except ConfigFileMissingException:
+                sys.exit('Config file has not been found. Use the "rabbit_tools_config" command'
+                         ' to generate it.')
+            self.refresh_names_cache = True
+        self.config = config
+        self._check_backend(self.config)
+        self._set_targets(self._parsed_args, cluster_configs)
         self._vhost = self.config['vhost']
-        self.client = self._get_client(**self.config)
-        self._method_to_call = getattr(self.client, self.client_method_name)
         self._chosen_numbers = set()
 
-    def _get_parsed_args(self):
+    @property
+    def client(self):
+        """
+        The client of the management API, built on the first use.
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._get_client(**self.config)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def _set_rate_control(self, parsed_args):
+        if parsed_args.adaptive:
+            self._limiter = AIMDLimiter(self.concurrency)
+        if parsed_args.max_rate is not None:
+            if parsed_args.max_rate <= 0:
+                sys.exit('Maximum rate has to be a positive number.')
+            self._rate_limiter = RateLimiter(parsed_args.max_rate)
+        if parsed_args.retries is not None:
+            if parsed_args.retries < 0:
+                sys.exit('Number of retries cannot be negative.')
+            self.retries = parsed_args.retries
+        elif parsed_args.adaptive:
+            self.retries = DEFAULT_RETRIES
+
+    def _set_node_scheduling(self, parsed_args):
+        if parsed_args.node_concurrency is not None:
+            if parsed_args.node_concurrency < 1:
+                sys.exit('Node concurrency has to be a positive number.')
+            self.node_concurrency = parsed_args.node_concurrency
+        self.use_node_endpoints = parsed_args.node_endpoints
+        if self.node_concurrency is not None or self.use_node_endpoints:
+            self._queue_nodes = {}
+        if self.use_node_endpoints:
+            self._node_clients = {}
+            self._node_clients_lock = threading.Lock()
+
+    def _set_priority(self, parsed_args):
+        if parsed_args.largest_first is not None:
+            self.priority_field = parsed_args.largest_first
+            self._queue_sizes = {}
+
+    @property
+    def priority_column(self):
+        return Predicate.fields[self.priority_field][0]
+
+    def _set_names_path(self, parsed_args):
+        if parsed_args.queue_name == ['-']:
+            parsed_args.queue_name = []
+            self.names_path = '-'
+        if parsed_args.from_file is not None:
+            if parsed_args.queue_name or self.names_path is not None:
+                sys.exit('Queue names cannot be passed together with a file of names.')
+            if parsed_args.from_file != '-' and not os.access(parsed_args.from_file, os.R_OK):
+                sys.exit('Cannot read the file {!r}.'.format(parsed_args.from_file))
+            self.names_path = parsed_args.from_file
+
+    def _set_watch(self, parsed_args):
+        if parsed_args.watch is None:
+            return
+        if parsed_args.watch <= 0:
+            sys.exit('Interval of polls has to be a positive number.')
+        if self._selector is None:
+            sys.exit('Queues are chosen by a selection (--select) in the watch mode.')
+        if self.journal_path:
+            sys.exit('The watch mode cannot be used together with a journal.')
+        self.watch_interval = parsed_args.watch
+
+    def _set_action_args(self, parsed_args):
+        """
+        Set arguments specific to the action of the tool (see
+        the `args` dict); called before the config is read.
+        """
+
+    def _set_targets(self, parsed_args, cluster_configs):
+        if parsed_args.vhost and parsed_args.all_vhosts:
+            sys.exit('Vhosts cannot be passed together with the --all-vhosts argument.')
+        if parsed_args.cluster:
+            clusters = [(name, self._get_cluster_config(name, cluster_configs))
+                        for name in parsed_args.cluster.split(',')]
+        else:
+            clusters = [(None, self.config)]
+        vhosts = parsed_args.vhost.split(',') if parsed_args.vhost else None
+        if len(clusters) == 1 and not parsed_args.all_vhosts and (
+                vhosts is None or len(vhosts) == 1):
+            self.cluster_name, self.config = clusters[0]
+            if vhosts:
+                self.config = dict(self.config, vhost=vhosts[0])
+            return
+        if not parsed_args.queue_name and not parsed_args.select and self.names_path is None:
+            sys.exit('Queues of many vhosts or clusters can be chosen only by names, '
+                     '"all" or a selection.')
+        if self.names_path == '-':
+            sys.exit('Names of queues of many vhosts or clusters cannot be read '
+                     'from the standard input.')
+        self.all_vhosts = parsed_args.all_vhosts
+        self._target_clusters = clusters
+        self._target_vhosts = vhosts
+
+    def _check_backend(self, config):
+        if config.get('backend', 'http') not in self.backends:
+            sys.exit('Backend has to be one of: {}.'.format(', '.join(sorted(self.backends))))
+
+    def _get_cluster_config(self, name, cluster_configs):
+        if cluster_configs is not None:
+            if name not in cluster_configs:
+                sys.exit('Cluster {!r} is not configured.'.format(name))
+            cluster_config = cluster_configs[name]
+        else:
+            try:
+                cluster_config = Config('{}:{}'.format(self.config_section, name))
+            except ConfigFileMissingException:
+                sys.exit('Cluster {!r} is not configured in the config file.'.format(name))
+        cluster_config = dict(self.config, **cluster_config)
+        self._check_backend(cluster_config)
+        return cluster_config
+
+    def reads_standard_input(self):
+        """
+        Check, whether the tool reads the standard input: queue
+        names ("-" instead of names), or queue numbers chosen
+        in the interactive mode.
+        """
+        if self.names_path is not None:
+            return self.names_path == '-'
+        return not self._parsed_args.queue_name and self._selector is None
+
+    def _get_parsed_args(self, argv=None):
         parser = argparse.ArgumentParser(description=self.description)
         for arg_name, arg_opts in self.args.iteritems():
             parser.add_argument(arg_name, **arg_opts)
-        return parser.parse_args()
+        return parser.parse_args(argv)
 
     def _get_client(self, host, port, user, password, **kwargs):
+        from rabbit_tools import transport
         api_url = self._get_api_url(host, port)
-        cl = Client(api_url, user, password)
+        cl = transport.ManagementClient(
+            api_url, user, password,
+            timeout=float(kwargs.get('timeout', transport.DEFAULT_TIMEOUT)),
+            pool_size=int(kwargs.get('pool_size', transport.DEFAULT_POOL_SIZE)),
+            connect_timeout=float(kwargs.get('connect_timeout',
+                                             transport.DEFAULT_CONNECT_TIMEOUT)),
+            page_size=int(kwargs.get('page_size', transport.DEFAULT_PAGE_SIZE)))
         return cl
 
     @staticmethod
     def _get_api_url(host, port):
         return '{0}:{1}'.format(host, str(port))
 
-    def _yield_queue_list(self):
-        return (x['name'] for x in self.client.get_queues(self._vhost))
+    def _get_node_client(self, node):
+        host = node.partition('@')[2]
+        if not host:
+            return self.client
+        with self._node_clients_lock:
+            if host not in self._node_clients:
+                self._node_clients[host] = self._get_client(**dict(self.config, host=host))
+            return self._node_clients[host]
+
+    def _get_method_to_call(self, queue_name):
+        """
+        Return the method of the client of the management API
+        on the home node of the queue, if the `--node-endpoints`
+        argument is set and the node is known; otherwise - the
+        method of the main client.
+        """
+        if self.use_node_endpoints:
+            node = self._queue_nodes.get(queue_name)
+            if node:
+                return getattr(self._get_node_client(node), self.client_method_name)
+        if self._method_to_call is None:
+            self._method_to_call = getattr(self.client, self.client_method_name)
+        return self._method_to_call
+
+    def _get_backend(self):
+        """
+        Return the backend chosen in the config (see `backends`),
+        applying the action with its `iter_results()` method.
+        """
+        if self._backend is None:
+            method_name = self.backends.get(self.config.get('backend'), self.backends['http'])
+            self._backend = getattr(self, method_name)() or self._get_http_backend()
+        return self._backend
+
+    def _get_http_backend(self):
+        from rabbit_tools.transport import HTTPBackend
+        get_node = self._get_node if self._queue_nodes is not None else None
+        return HTTPBackend(self._call_method, self.concurrency, self.node_concurrency, get_node)
+
+    def _get_amqp_backend(self):
+        from rabbit_tools.amqp import (
+            DEFAULT_AMQP_PORT,
+            AMQPBackend,
+        )
+        from rabbit_tools.transport import DEFAULT_TIMEOUT
+        if not AMQPBackend.supports(self.client_method_name):
+            return None
+        return AMQPBackend(self.config['host'],
+                           int(self.config.get('amqp_port', DEFAULT_AMQP_PORT)),
+                           self.config['user'],
+                           self.config['password'],
+                           self._vhost,
+                           timeout=float(self.config.get('timeout', DEFAULT_TIMEOUT)),
+                           pipeline_size=self.concurrency)
+
+    def _close_backend(self):
+        if self._backend is not None:
+            self._backend.close()
+            # the HTTP backend refers to the tool
+            self._backend = None
+
+    def _get_stats(self):
+        if self._stats is None:
+            self._stats = OperationStats(keep_queue_records=bool(self.stats_json_path))
+        return self._stats
+
+    def _yield_queue_list(self, selector=None):
+        columns = ['name'] if selector is None else list(selector.columns)
+        if self._queue_nodes is not None:
+            columns.append('node')
+        # sizes of queues are statistics, the cached lists have none
+        needs_stats = self._queue_sizes is not None
+        if needs_stats and self.priority_column not in columns:
+            columns.append(self.priority_column)
+        if selector is None and self.queue_list_cache is not None and not needs_stats:
+            queues = self.queue_list_cache.get(self.client, self._vhost, columns)
+        elif selector is None:
+            queues = self.client.iter_queues(self._vhost,
+                                             columns=columns,
+                                             disable_stats=not needs_stats)
+        else:
+            queues = self.client.iter_queues(self._vhost,
+                                             columns=columns,
+                                             disable_stats=not (selector.needs_stats
+                                                                or needs_stats),
+                                             name_regex=selector.name_regex)
+        queues = self._get_stats().timed_iter(queues, 'listing')
+        for queue in queues:
+            if selector is None or selector.matches(queue):
+                if self._queue_nodes is not None:
+                    self._queue_nodes[queue['name']] = queue.get('node')
+                if self._queue_sizes is not None:
+                    self._queue_sizes[queue['name']] = queue.get(self.priority_column)
+                yield queue['name']
+
+    def _is_queue_mapping_outdated(self):
+        if not self._queue_mapping:
+            return True
+        if self.cache_ttl is not None:
+            return time.time() - self._queue_mapping_timestamp > self.cache_ttl
+        return False
 
-    def _get_queue_mapping(self):
-        queue_names = list(self._yield_queue_list())
+    def _get_queue_mapping(self, refresh=False):
+        if refresh or self._is_queue_mapping_outdated():
+            self._queue_mapping = self._fetch_queue_mapping()
+            self._queue_mapping_timestamp = time.time()
+        return self._queue_mapping
+
+    def _update_queue_mapping(self, chosen_numbers):
+        """
+        Update the kept list of queues after an action, instead
+        of fetching it again.
+        """
+        if self.do_remove_chosen_numbers:
+            for queue_number in chosen_numbers:
+                if queue_number in self._queue_mapping:
+                    del self._queue_mapping[queue_number]
+
+    def _fetch_queue_mapping(self):
+        if self._queue_nodes is not None:
+            self._queue_nodes.clear()
+        if self._queue_sizes is not None:
+            self._queue_sizes.clear()
+        queue_names = sorted(self._yield_queue_list())
         if not queue_names:
             raise StopReceivingInput
-        full_range = range(1, len(queue_names) + len(self._chosen_numbers) + 1)
-        if self.do_remove_chosen_numbers:
-            output_range = set(full_range) - self._chosen_numbers
-        else:
-            output_range = full_range
-        return dict(zip(output_range, queue_names))
+        if self._queue_mapping is None:
+            if self.do_remove_chosen_numbers:
+                skipped_numbers = self._chosen_numbers
+            else:
+                skipped_numbers = ()
+            return QueueIndex(queue_names, skipped_numbers)
+        self._queue_mapping.sync(queue_names)
+        return self._queue_mapping
 
-    @staticmethod
-    def _get_user_input(mapping):
+    def _get_picker(self):
+        if self._picker is None:
+            self._picker = QueuePicker()
+        return self._picker
+
+    def _get_user_input(self, mapping):
+        # messages about the previous action are shown before the prompt
+        flush_background_logging()
         if mapping:
-            for nr, queue in mapping.iteritems():
-                print '[{}] {}'.format(nr, queue)
-            user_input = raw_input("Queue number ('all' to choose all / 'q' to quit'): ")
-            user_input = user_input.strip().lower()
+            user_input = self._get_picker().get_input(
+                mapping,
+                "Queue number ('all' to choose all / 'r' to refresh / 'q' to quit'): ")
             return user_input
         else:
             logger.info('No more queues to choose.')
             raise StopReceivingInput
 
     def _parse_input(self, user_input):
-        if user_input in self.quitting_commands:
+        command = user_input.lower()
+        if command in self.quitting_commands:
             raise StopReceivingInput
-        if user_input in self.choose_all_commands:
+        if command in self.choose_all_commands:
             return 'all'
+        if command in self.refresh_commands:
+            return 'refresh'
+        if Selector.is_selection(user_input):
+            try:
+                return Selector(user_input)
+            except SelectionError as e:
+                logger.error(str(e))
+                return None
         single_choice = self.single_choice_regex.search(user_input)
         if single_choice:
             return [int(single_choice.group(0))]
@@ -192,52 +837,256 @@ class RabbitToolBase(object):
         logger.error('Input could not be parsed.')
         return None
 
-    @staticmethod
-    def _get_selected_mapping(mapping, parsed_input):
-        if isinstance(parsed_input, Sequence):
-            selected_mapping = {nr: mapping[nr] for nr in parsed_input if nr in mapping}
-            if not selected_mapping:
-                logger.error('No queues were selected.')
-                return None
-            return selected_mapping
-        elif parsed_input == 'all':
+    def _get_selected_mapping(self, mapping, parsed_input):
+        if parsed_input == 'all':
             return mapping
-        return None
+        if isinstance(parsed_input, Selector):
+            selected_names = set(self._yield_queue_list(parsed_input))
+            selected_mapping = {nr: queue_name for nr, queue_name in mapping.iteritems()
+                                if queue_name in selected_names}
+        elif isinstance(parsed_input, Sequence):
+            selected_mapping = {nr: mapping[nr] for nr in parsed_input if nr in mapping}
+        else:
+            return None
+        if not selected_mapping:
+            logger.error('No queues were selected.')
+            return None
+        return selected_mapping
+
+    def _call_method(self, chosen_queue, before_send=None):
+        """
+        Apply the action to a queue from a (key, queue name) pair,
+        calling `before_send` (if passed) before each request.
+        Return the HTTPError raised by the action (or None, if it was
+        successful), the latency of the action and the number
+        of affected messages (always None, the management API
+        does not return it).
+
+        Transient errors (see `_is_transient_error()`) are retried
+        up to `retries` times, after a random, exponentially growing
+        delay; the returned latency includes all the attempts.
+        """
+        from pyrabbit.http import NetworkError
+        start = time.time()
+        attempt = 0
+        while True:
+            try:
+                error = self._call_method_once(chosen_queue[1], before_send)
+            except NetworkError:
+                if attempt >= self.retries:
+                    raise
+            else:
+                if (error is None or attempt >= self.retries
+                        or not self._is_transient_error(error)):
+                    return error, time.time() - start, None
+            self._get_stats().add_retry()
+            time.sleep(get_backoff_delay(attempt))
+            attempt += 1
+
+    def _call_method_once(self, queue_name, before_send=None):
+        from pyrabbit.http import HTTPError
+        if before_send is not None:
+            before_send()
+        if self._limiter is not None:
+            self._limiter.acquire()
+        start = time.time()
+        # if the call raises an exception other than HTTPError,
+        # the API is considered overloaded
+        overloaded = True
+        try:
+            self._get_method_to_call(queue_name)(self._vhost, queue_name)
+        except HTTPError as e:
+            overloaded = self._is_transient_error(e)
+            return e
+        else:
+            overloaded = False
+            return None
+        finally:
+            if self._limiter is not None:
+                self._limiter.release(time.time() - start, overloaded)
+
+    @staticmethod
+    def _is_transient_error(error):
+        """
+        Check, whether the HTTPError is caused by the state of the
+        server (an internal error or an overload), so the request
+        can succeed, if it is repeated later.
+        """
+        return error.status >= 500 or error.status == 429
+
+    def _iter_action_results(self, chosen_queues):
+        """
+        Apply the action to queues from an iterable of (key, queue
+        name) pairs. Yield (key, queue name, error) tuples, where
+        `error` is the HTTPError (or AMQPError) raised by the action,
+        or None if the action was successful. Other exceptions are
+        propagated.
+
+        The action is applied by the backend (see `backends`).
+        With the "http" one, if concurrency is greater than 1,
+        requests are sent by a pool of worker threads and the results
+        are yielded in the order of completion; in the node-aware
+        mode, queues are partitioned by their home nodes (see the
+        `PartitionedExecutor`). With the AMQP backend, up to
+        `concurrency` operations are pipelined over one channel
+        (the adaptive mode, retries and node-aware scheduling do not
+        apply then), and results are yielded in the order of queues.
+
+        With the `--largest-first` argument, queues are started
+        from the largest one (see `_iter_largest_first()`).
+        """
+        if self._journal is not None and self._journal.completed:
+            chosen_queues = self._skip_completed(chosen_queues)
+        if self._queue_sizes is not None:
+            chosen_queues = self._iter_largest_first(chosen_queues)
+        before_send = self._rate_limiter.wait if self._rate_limiter is not None else None
+        results = self._get_backend().iter_results(self.client_method_name, chosen_queues,
+                                                   before_send)
+        stats = self._get_stats()
+        try:
+            for (key, queue_name), error, latency, messages in results:
+                status = 'ok' if error is None else error.status
+                extra = {}
+                if self._queue_nodes is not None:
+                    extra['node'] = self._get_node(queue_name)
+                stats.record(queue_name, status, latency, **extra)
+                if error is None and self._queue_sizes is not None:
+                    self._add_freed(stats, queue_name, messages)
+                if self._result_writer is not None:
+                    self._write_result(queue_name, status, latency, messages)
+                if self._journal is not None and (error is None or error.status == 404):
+                    self._journal.add(self._get_journal_key(queue_name))
+                if self._deleted_names is not None and (error is None or error.status == 404):
+                    self._deleted_names.setdefault(self._get_names_cache_target(),
+                                                   set()).add(queue_name)
+                yield key, queue_name, error
+        finally:
+            # workers stop taking queues, when the consumer stops early
+            results.close()
+
+    def _iter_largest_first(self, chosen_queues):
+        """
+        Yield (key, queue name) pairs of the iterable, from the queue
+        with the largest size in the listing; queues missing in it
+        are the last ones. The iterable is consumed first (a listing
+        records sizes of queues, while it is consumed), then pairs
+        are popped from a heap, so the action starts without sorting
+        all of them.
+        """
+        heap = [(-(self._queue_sizes.get(queue_name) or 0), index, key, queue_name)
+                for index, (key, queue_name) in enumerate(chosen_queues)]
+        heapq.heapify(heap)
+        while heap:
+            _, _, key, queue_name = heapq.heappop(heap)
+            yield key, queue_name
+
+    def _add_freed(self, stats, queue_name, messages):
+        # the number of messages is taken from the result
+        # of the action, if it is known (the AMQP backend)
+        if self.priority_field == 'messages' and messages is not None:
+            size = messages
+        else:
+            size = self._queue_sizes.get(queue_name)
+        if size:
+            stats.add_freed(size, self.priority_field)
+
+    def _get_journal_key(self, queue_name):
+        return Journal.get_key(self.cluster_name, self._vhost, queue_name)
+
+    def _skip_completed(self, chosen_queues):
+        for chosen_queue in chosen_queues:
+            if self._journal.is_completed(self._get_journal_key(chosen_queue[1])):
+                self.skipped_count += 1
+            else:
+                yield chosen_queue
+
+    def _write_result(self, queue_name, status, latency, messages):
+        result = {
+            'queue': queue_name,
+            'vhost': self._vhost,
+            'status': status,
+            'latency': latency,
+            'messages': messages,
+        }
+        if self.cluster_name is not None:
+            result['cluster'] = self.cluster_name
+        self._result_writer.write(**result)
+
+    def _get_node(self, queue_name):
+        return self._queue_nodes.get(queue_name)
 
     def make_action_from_args(self, all_queues, queue_names):
         if len(queue_names) == 1 and queue_names[0] in self.choose_all_commands:
             chosen_queues = all_queues
         else:
             chosen_queues = queue_names
+            if self._queue_nodes is not None or self._queue_sizes is not None:
+                # home nodes and sizes of the queues are found
+                # in the listing
+                deque(all_queues, maxlen=0)
+        self.make_action_on_queues(chosen_queues)
+
+    def make_action_on_named_queues(self, queue_names):
+        """
+        Apply the action to queues of the names; unlike names passed
+        as arguments, "all" is only the name of a queue here.
+        """
+        if self._queue_nodes is not None or self._queue_sizes is not None:
+            # home nodes and sizes of the queues are found
+            # in the listing
+            deque(self._yield_queue_list(), maxlen=0)
+        self.make_action_on_queues(queue_names)
+
+    def make_action_on_queues(self, chosen_queues):
+        with self._get_stats().phase('action'):
+            self._make_action_on_queues(chosen_queues)
+
+    def _make_action_on_queues(self, chosen_queues):
+        # with the `--json-lines` output, affected queues are
+        # only counted, so the memory usage does not grow
         affected_queues = []
-        for queue in chosen_queues:
-            try:
-                self._method_to_call(self._vhost, queue)
-            except HTTPError as e:
-                if e.status == 404:
-                    logger.error("Queue %r does not exist.", queue)
-                else:
-                    logger.warning("%s: %r.", self.queue_not_affected_msg, queue)
+        affected_count = 0
+        results = self._iter_action_results((queue, queue) for queue in chosen_queues)
+        for _, queue, error in results:
+            if error is None:
+                affected_count += 1
+                if self._result_writer is None:
+                    affected_queues.append(queue)
+            elif error.status == 404:
+                logger.error("%sQueue %r does not exist.", self._log_prefix, queue,
+                             extra=PER_QUEUE)
             else:
-                affected_queues.append(queue)
+                logger.warning("%s%s: %r.", self._log_prefix, self.queue_not_affected_msg,
+                               queue, extra=PER_QUEUE)
         else:
-            logger.info("%s: %s", self.queues_affected_msg, ', '.join(affected_queues))
+            if not affected_count and self.watch_interval is not None:
+                # polls, which have not affected any queue, are not logged
+                return
+            if self._result_writer is None:
+                logger.info("%s%s: %s", self._log_prefix, self.queues_affected_msg,
+                            ', '.join(affected_queues))
+            else:
+                logger.info("%s%s: %d queues.", self._log_prefix, self.queues_affected_msg,
+                            affected_count)
 
     def make_action(self, chosen_queues):
+        with self._get_stats().phase('action'):
+            return self._make_action(chosen_queues)
+
+    def _make_action(self, chosen_queues):
         affected_queues = []
         chosen_numbers = []
-        for queue_number, queue_name in chosen_queues.iteritems():
-            try:
-                self._method_to_call(self._vhost, queue_name)
-            except HTTPError as e:
-                if e.status == 404:
-                    logger.error("Queue %r does not exist.", queue_name)
-                    chosen_numbers.append(queue_number)
-                else:
-                    logger.warning("%s: %r.", self.queue_not_affected_msg, queue_name)
-            else:
+        results = self._iter_action_results(chosen_queues.iteritems())
+        for queue_number, queue_name, error in results:
+            if error is None:
                 affected_queues.append(queue_name)
                 chosen_numbers.append(queue_number)
+            elif error.status == 404:
+                logger.error("Queue %r does not exist.", queue_name, extra=PER_QUEUE)
+                chosen_numbers.append(queue_number)
+            else:
+                logger.warning("%s: %r.", self.queue_not_affected_msg, queue_name,
+                               extra=PER_QUEUE)
         if affected_queues:
             logger.info("%s: %s.", self.queues_affected_msg, ', '.join(affected_queues))
         else:
@@ -245,20 +1094,244 @@ class RabbitToolBase(object):
         return chosen_numbers
 
     def run(self):
+        with self.running():
+            if self.watch_interval is not None:
+                self._watch()
+            elif self._target_clusters is not None:
+                self._run_targets()
+            else:
+                self._run()
+
+    @contextmanager
+    def running(self):
+        """
+        Open outputs of the run (results, the journal) and close
+        them, log statistics and refresh the names cache after it.
+        """
+        if (self.refresh_names_cache and self.do_remove_chosen_numbers
+                and self._get_names_cache_ttl() > 0):
+            self._deleted_names = {}
+        if self.json_lines_path:
+            try:
+                self._result_writer = ResultWriter(self.json_lines_path)
+            except IOError as e:
+                sys.exit('Cannot open the file of results: {}'.format(e))
+        if self.journal_path:
+            try:
+                self._journal = Journal(self.journal_path, resume=self.resume)
+            except IOError as e:
+                sys.exit('Cannot open the journal: {}'.format(e))
+        try:
+            with self._get_stats().phase('total'):
+                yield
+        finally:
+            self._close_backend()
+            if self._result_writer is not None:
+                self._result_writer.close()
+            if self._journal is not None:
+                self._journal.close()
+                if self.skipped_count:
+                    logger.info("Skipped %d queues completed in the resumed run.",
+                                self.skipped_count)
+            stats = self._get_stats()
+            logger.debug(stats.get_summary())
+            if self.stats_json_path:
+                stats.write_json(self.stats_json_path)
+            if self.refresh_names_cache:
+                self._refresh_names_cache()
+
+    def _watch(self):
+        """
+        Apply the action to queues matching the selection every
+        `watch_interval` seconds (counted from starts of polls).
+        A failed poll does not stop next ones.
+        """
+        stats = self._get_stats()
+        stats.keep_queue_records = False
+        poll_count = 0
+        while self.max_polls is None or poll_count < self.max_polls:
+            if poll_count:
+                time.sleep(max(poll_start + self.watch_interval - time.time(), 0))
+            poll_start = time.time()
+            poll_count += 1
+            self._stats = poll_stats = OperationStats()
+            if self._queue_nodes is not None:
+                self._queue_nodes = {}
+            if self._queue_sizes is not None:
+                self._queue_sizes = {}
+            try:
+                if self._target_clusters is not None:
+                    self._run_targets()
+                else:
+                    self._run()
+            except Exception as e:
+                logger.error("Poll %d has failed: %s", poll_count, e)
+                poll_stats.count('failed_polls')
+            finally:
+                self._stats = stats
+                poll_stats.count('polls')
+                poll_stats.add_phase_time('polls', time.time() - poll_start)
+                stats.merge(poll_stats)
+            if poll_stats.latencies.count:
+                logger.info("Poll %d: %s", poll_count, poll_stats.get_summary())
+            if self.stats_json_path:
+                stats.write_json(self.stats_json_path)
+            # names are not kept until the end of the run
+            self._remove_deleted_names()
+
+    def _get_names_cache_targets(self):
+        """
+        Return (cluster name, vhost) pairs of vhosts handled by the run,
+        except vhosts listed with the `--all-vhosts` argument.
+        """
+        if self._target_clusters is None:
+            return [(self.cluster_name, self._vhost)]
+        if self.all_vhosts:
+            return []
+        return [(cluster_name, vhost)
+                for cluster_name, config in self._target_clusters
+                for vhost in self._target_vhosts or [config['vhost']]]
+
+    def _get_names_cache_target(self):
+        return self.cluster_name, self._vhost
+
+    def _get_names_cache_ttl(self):
+        from rabbit_tools.names_cache import DEFAULT_NAMES_CACHE_TTL
+        return float(self.config.get('names_cache_ttl', DEFAULT_NAMES_CACHE_TTL))
+
+    def _remove_deleted_names(self):
+        from rabbit_tools.names_cache import remove_names
+        if not self._deleted_names:
+            return
+        try:
+            remove_names(self._deleted_names)
+        except (IOError, OSError) as e:
+            logger.debug("Cannot remove names from the cache of queue names: %s", e)
+        # the dict is shared by copies of the tool, so it is cleared
+        self._deleted_names.clear()
+
+    def _refresh_names_cache(self):
+        from rabbit_tools.names_cache import refresh_in_background
+        ttl = self._get_names_cache_ttl()
+        if ttl <= 0:
+            return
+        self._remove_deleted_names()
+        try:
+            refresh_in_background(self._get_names_cache_targets(), ttl)
+        except (IOError, OSError) as e:
+            logger.debug("Cannot refresh the cache of queue names: %s", e)
+
+    def _iter_targets(self):
+        """
+        Yield copies of the tool, one for each pair of a cluster
+        and a vhost.
+        """
+        from pyrabbit.http import (
+            HTTPError,
+            NetworkError,
+        )
+        for cluster_name, config in self._target_clusters:
+            client = self.client if cluster_name is None else self._get_client(**config)
+            vhosts = self._target_vhosts
+            if vhosts is None and self.all_vhosts:
+                try:
+                    vhosts = client.get_vhost_names()
+                except (HTTPError, NetworkError) as e:
+                    logger.error("Cannot list vhosts of the cluster %r: %s",
+                                 cluster_name or config['host'], e)
+                    continue
+            for vhost in vhosts or [config['vhost']]:
+                yield self._get_target_tool(cluster_name, config, client, vhost)
+
+    def _get_target_tool(self, cluster_name, config, client, vhost):
+        tool = copy.copy(self)
+        tool.config = config
+        tool.client = client
+        tool._vhost = vhost
+        tool._method_to_call = None
+        tool._target_clusters = None
+        tool._chosen_numbers = set()
+        tool._stats = None
+        tool._backend = None
+        tool.queue_list_cache = None
+        tool.skipped_count = 0
+        if self._limiter is not None:
+            tool._limiter = AIMDLimiter(self.concurrency)
+        if self._queue_nodes is not None:
+            tool._queue_nodes = {}
+        if self._queue_sizes is not None:
+            tool._queue_sizes = {}
+        if self._node_clients is not None:
+            tool._node_clients = {}
+            tool._node_clients_lock = threading.Lock()
+        label = 'vhost={}'.format(vhost)
+        if cluster_name is not None:
+            label = 'cluster={} {}'.format(cluster_name, label)
+        tool._log_prefix = '[{}] '.format(label)
+        tool.cluster_name = cluster_name
+        return tool
+
+    @staticmethod
+    def _run_target(tool):
+        try:
+            tool._run()
+        finally:
+            tool._close_backend()
+
+    def _run_targets(self):
+        """
+        Run the action on queues of all targets in parallel
+        and merge their statistics. A failure of a target
+        does not stop others.
+        """
+        executor = BoundedExecutor(self.max_parallel_targets)
+        stats = self._get_stats()
+        # summaries of polls are logged by `_watch()`
+        summary_level = logging.INFO if self.watch_interval is None else logging.DEBUG
+        for tool, _, exc_info in executor.map_unordered(self._run_target, self._iter_targets()):
+            if exc_info is not None:
+                logger.error("%sFailed: %s", tool._log_prefix, exc_info[1])
+            tool_stats = tool._get_stats()
+            logger.log(summary_level, "%s%s", tool._log_prefix, tool_stats.get_summary())
+            stats.merge(tool_stats, cluster=tool.cluster_name, vhost=tool._vhost)
+            self.skipped_count += tool.skipped_count
+        logger.log(summary_level, "Total: %s", stats.get_summary())
+
+    def _run(self):
         queue_names = self._parsed_args.queue_name
-        if queue_names:
+        if self._selector is not None:
+            self.make_action_on_queues(self._yield_queue_list(self._selector))
+        elif self.names_path is not None:
+            if self._queue_sizes is not None:
+                # sizes of the queues are found in the listing
+                deque(self._yield_queue_list(), maxlen=0)
+            names_file = sys.stdin if self.names_path == '-' else open(self.names_path)
+            try:
+                self.make_action_on_queues(iter_unique_lines(names_file))
+            finally:
+                if names_file is not sys.stdin:
+                    names_file.close()
+        elif queue_names:
             all_queues = self._yield_queue_list()
             self.make_action_from_args(all_queues, queue_names)
         else:
+            refresh = False
             while True:
                 try:
-                    mapping = self._get_queue_mapping()
-                    user_input = self._get_user_input(mapping)
+                    mapping = self._get_queue_mapping(refresh)
+                    with self._get_stats().phase('input'):
+                        user_input = self._get_user_input(mapping)
                     parsed_input = self._parse_input(user_input)
                 except StopReceivingInput:
                     print 'bye'
                     break
-                if parsed_input:
+                refresh = parsed_input == 'refresh'
+                if refresh:
+                    self._get_picker().reset()
+                elif parsed_input:
+                    mapping = self._get_picker().filter_mapping(mapping)
                     selected_mapping = self._get_selected_mapping(mapping, parsed_input)
                     if selected_mapping:
-                        self._chosen_numbers.update(self.make_action(selected_mapping))
+                        chosen_numbers = self.make_action(selected_mapping)
+                        self._chosen_numbers.update(chosen_numbers)
+                        self._update_queue_mapping(chosen_numbers)
@@ -20,6 +20,9 @@ from rabbit_tools.lib import (
 
 
 CONFIG_FILENAME = 'rabbit_tools.conf'
+# paths of config files, read in this order, so options
+# of the user's file override system-wide ones
+CONFIG_PATHS = [os.path.join(conf_dir, CONFIG_FILENAME) for conf_dir in (ETC_DIR, HOME_DIR)]
 logger = logging.getLogger(__name__)
 
 
@@ -31,7 +34,9 @@ class ConfigCreator(object):
 
     description = ('Create a config file for Rabbit Tools to make the tool faster and easier '
                    'to use.')
-    rabbit_tools_section = ['host', 'port', 'user', 'password', 'vhost']
+    rabbit_tools_section = ['host', 'port', 'user', 'password', 'vhost', 'pool_size', 'timeout',
+                            'connect_timeout', 'page_size', 'backend', 'amqp_port',
+                            'names_cache_ttl']
     handler_simple = {
         'level': 'NOTSET',
         'class': 'StreamHandler',
@@ -69,6 +74,32 @@ class ConfigCreator(object):
         parser.add_argument('-u', '--user', help='Username', default='guest')
         parser.add_argument('-s', '--password', help='Password', default='guest')
         parser.add_argument('-v', '--vhost', help='Vhost', default='/')
+        parser.add_argument('--pool-size',
+                            help='Number of persistent connections to the API kept open',
+                            default='10')
+        parser.add_argument('--timeout',
+                            help='Timeout of a single API request (in seconds)',
+                            default='5')
+        parser.add_argument('--connect-timeout',
+                            help='Timeout of connecting to the API (in seconds)',
+                            default='5')
+        parser.add_argument('--page-size',
+                            help='Number of queues fetched from the API in one request',
+                            default='500')
+        parser.add_argument('--backend',
+                            help='Protocol used to purge and delete queues: requests to '
+                                 'the management API, or AMQP methods, pipelined over '
+                                 'one connection',
+                            choices=['http', 'amqp'],
+                            default='http')
+        parser.add_argument('--amqp-port',
+                            help='Port number of RabbitMQ AMQP listener',
+                            default='5672')
+        parser.add_argument('--names-cache-ttl',
+                            help='Number of seconds, after which tools refresh the local '
+                                 'cache of queue names, used to complete them in the shell '
+                                 '(0 disables the cache)',
+                            default='300')
         parser.add_argument('--no-syslog', help='Disable logging to syslog', action='store_true')
         parser.add_argument('--stream-log-format',
                             help='Format of stream logs',
@@ -172,12 +203,7 @@ class Config(object):
     def __init__(self, config_section):
         self._config_section = config_section
         self._config_parser = SafeConfigParser()
-        config_dirs = [
-            ETC_DIR,
-            HOME_DIR,
-        ]
-        config_paths = [os.path.join(conf_dir, CONFIG_FILENAME) for conf_dir in config_dirs]
-        for config_path in config_paths:
+        for config_path in CONFIG_PATHS:
             self._config_parser.read(config_path)
         self.config = self._get_config()
 
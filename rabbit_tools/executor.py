@@ -0,0 +1,294 @@
+import random
+import sys
+import threading
+import time
+from collections import deque
+from Queue import (
+    Empty,
+    Queue,
+)
+
+
+_STOP = object()
+
+
+class BoundedExecutor(object):
+
+    """
+    Runs a function over items in a bounded pool of worker threads.
+
+    Items are taken lazily from the passed iterable, so no more than
+    a few items per worker are kept in memory at once. Results are
+    yielded in the order of completion, as tuples:
+        (item, result, exc_info)
+    where `exc_info` is None if the call succeeded, otherwise it is
+    a value returned by `sys.exc_info()` inside of the worker.
+
+    Results are handled in the calling thread, so the code consuming
+    them (logging, bookkeeping) does not have to be thread-safe.
+
+    If the consumer stops early (an exception, closing the generator),
+    no more items are taken, and queued ones are not started; calls
+    in progress are finished in the background.
+    """
+
+    def __init__(self, concurrency):
+        if concurrency < 1:
+            raise ValueError('Concurrency has to be a positive number.')
+        self.concurrency = concurrency
+
+    def map_unordered(self, func, items):
+        tasks = Queue(maxsize=self.concurrency * 2)
+        results = Queue()
+        stopped = threading.Event()
+        workers = [threading.Thread(target=self._work, args=(func, tasks, results, stopped))
+                   for _ in xrange(self.concurrency)]
+        feeder = threading.Thread(target=self._feed, args=(items, tasks, results, stopped))
+        for thread in workers + [feeder]:
+            thread.daemon = True
+            thread.start()
+        try:
+            running = self.concurrency
+            while running:
+                result = results.get()
+                if result is _STOP:
+                    running -= 1
+                elif result[0] is _STOP:
+                    # the iterable of items has raised an exception
+                    raise result[2][0], result[2][1], result[2][2]
+                else:
+                    yield result
+        finally:
+            # queued items are skipped by workers
+            stopped.set()
+
+    def _feed(self, items, tasks, results, stopped):
+        try:
+            for item in items:
+                if stopped.is_set():
+                    break
+                tasks.put(item)
+        except Exception:
+            results.put((_STOP, None, sys.exc_info()))
+        finally:
+            for _ in xrange(self.concurrency):
+                tasks.put(_STOP)
+
+    def _work(self, func, tasks, results, stopped):
+        while True:
+            item = tasks.get()
+            if item is _STOP:
+                results.put(_STOP)
+                return
+            if not stopped.is_set():
+                results.put(self._call(func, item))
+
+    @staticmethod
+    def _call(func, item):
+        try:
+            return item, func(item), None
+        except Exception:
+            return item, None, sys.exc_info()
+
+
+def _drain(tasks):
+    # remove tasks, which have not been started
+    while True:
+        try:
+            tasks.get_nowait()
+        except Empty:
+            return
+
+
+class PartitionedExecutor(object):
+
+    """
+    Runs a function over items in a bounded pool of worker threads,
+    like the `BoundedExecutor`, but items are divided into partitions
+    (e.g. queues hosted by the same node of a cluster), and no more
+    than `partition_concurrency` items of a partition are processed
+    at once. Next started item is taken from the partition with
+    the fewest items in progress, so the work is spread evenly
+    across partitions.
+
+    Items are taken lazily from the passed iterable: up to
+    `concurrency` not started items are kept to choose from,
+    more - only if none of them can be started. If items
+    of the partitions, which can be started, are not found among
+    the first `max_pending` not started items, it waits for some
+    of the started ones to finish.
+
+    Items are taken from the iterable in the calling thread,
+    so exceptions raised by the iterable are propagated directly.
+    """
+
+    def __init__(self, concurrency, partition_concurrency, max_pending=10000):
+        if concurrency < 1 or partition_concurrency < 1:
+            raise ValueError('Concurrency has to be a positive number.')
+        self.concurrency = concurrency
+        self.partition_concurrency = partition_concurrency
+        self.max_pending = max_pending
+
+    def map_unordered(self, func, items, get_partition):
+        tasks = Queue()
+        results = Queue()
+        workers = [threading.Thread(target=self._work, args=(func, tasks, results))
+                   for _ in xrange(self.concurrency)]
+        for thread in workers:
+            thread.daemon = True
+            thread.start()
+        try:
+            for result in self._dispatch(iter(items), get_partition, tasks, results):
+                yield result
+        finally:
+            _drain(tasks)
+            for _ in xrange(self.concurrency):
+                tasks.put(_STOP)
+
+    def _dispatch(self, items, get_partition, tasks, results):
+        pending = {}
+        in_flight = {}
+        running = 0
+        lookahead = min(self.concurrency, self.max_pending)
+        while True:
+            while running < self.concurrency:
+                while sum(map(len, pending.itervalues())) < lookahead:
+                    if not self._take_item(items, get_partition, pending):
+                        break
+                partition = self._choose_partition(pending, in_flight)
+                if partition is not None:
+                    tasks.put((partition, pending[partition].popleft()))
+                    if not pending[partition]:
+                        del pending[partition]
+                    in_flight[partition] = in_flight.get(partition, 0) + 1
+                    running += 1
+                elif (sum(map(len, pending.itervalues())) >= self.max_pending
+                        or not self._take_item(items, get_partition, pending)):
+                    break
+            if not running:
+                return
+            partition, result = results.get()
+            in_flight[partition] -= 1
+            running -= 1
+            yield result
+
+    @staticmethod
+    def _take_item(items, get_partition, pending):
+        try:
+            item = next(items)
+        except StopIteration:
+            return False
+        pending.setdefault(get_partition(item), deque()).append(item)
+        return True
+
+    def _choose_partition(self, pending, in_flight):
+        chosen = None
+        for partition in pending:
+            count = in_flight.get(partition, 0)
+            if count < self.partition_concurrency and (
+                    chosen is None or count < in_flight.get(chosen, 0)):
+                chosen = partition
+        return chosen
+
+    @staticmethod
+    def _work(func, tasks, results):
+        while True:
+            task = tasks.get()
+            if task is _STOP:
+                return
+            partition, item = task
+            results.put((partition, BoundedExecutor._call(func, item)))
+
+
+class AIMDLimiter(object):
+
+    """
+    Limit of operations in progress at the same time, adapted
+    to the latency of the operations, AIMD-style:
+      * after an operation with a low latency the limit grows
+        (by 1 - until the first slowdown, later - by 1 / limit,
+        so about 1 per the current limit of operations);
+      * if the latency is higher than `latency_tolerance` times
+        the lowest seen latency (or than `latency_target`, if set),
+        or the operation has overloaded the server, the limit
+        is multiplied by `decrease_factor`, but not more often
+        than once per the latency of the operation.
+
+    Latencies below `min_latency_target` (in seconds) are always
+    considered low.
+    """
+
+    def __init__(self, max_limit, min_limit=1, latency_target=None, latency_tolerance=2.0,
+                 min_latency_target=0.01, decrease_factor=0.5):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(min_limit)
+        self.latency_target = latency_target
+        self.latency_tolerance = latency_tolerance
+        self.min_latency_target = min_latency_target
+        self.decrease_factor = decrease_factor
+        self._in_flight = 0
+        self._min_latency = None
+        self._slow_start = True
+        self._last_decrease = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def _is_slow(self, latency):
+        target = self.latency_target
+        if target is None:
+            target = self._min_latency * self.latency_tolerance
+        return latency > max(target, self.min_latency_target)
+
+    def release(self, latency, overloaded=False):
+        with self._condition:
+            self._in_flight -= 1
+            if not overloaded and (self._min_latency is None or latency < self._min_latency):
+                self._min_latency = latency
+            if overloaded or self._is_slow(latency):
+                now = time.time()
+                if now - self._last_decrease > latency:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                    self._slow_start = False
+            elif self._slow_start:
+                self.limit = min(self.max_limit, self.limit + 1)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+
+class RateLimiter(object):
+
+    """
+    Spreads operations evenly, so no more than `rate` of them
+    start per second.
+    """
+
+    def __init__(self, rate):
+        if rate <= 0:
+            raise ValueError('Rate has to be a positive number.')
+        self.rate = rate
+        self._next_time = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.time()
+            start_time = max(self._next_time, now)
+            self._next_time = start_time + 1.0 / self.rate
+        if start_time > now:
+            time.sleep(start_time - now)
+
+
+def get_backoff_delay(attempt, base=0.1, max_delay=10):
+    """
+    Return a random delay before the next attempt of an operation
+    ("full jitter" exponential backoff).
+    """
+    return random.uniform(0, min(max_delay, base * 2 ** attempt))
@@ -0,0 +1,114 @@
+from collections import MutableMapping
+
+
+class QueueIndex(MutableMapping):
+
+    """
+    Mapping of queue numbers to queue names, used to choose
+    queues in the interactive mode.
+
+    Each queue name gets a number once and keeps it for the whole
+    session. Numbers of removed queues are never assigned again,
+    so a number cannot point to other queue than the one, which
+    was shown to the user.
+
+    Names are kept in a list, where the item at index `n - 1`
+    is the name of the queue number `n` (or None, if the queue
+    has been removed), so the lookup of a name by its number,
+    as well as the removal, are O(1) and do not need to rebuild
+    the index. A dict maps names back to their numbers.
+
+    Numbers from `skipped_numbers` are not assigned to any queue.
+    """
+
+    def __init__(self, queue_names=(), skipped_numbers=()):
+        self._names = []
+        self._numbers = {}
+        self._skipped_numbers = frozenset(skipped_numbers)
+        for name in queue_names:
+            self.add(name)
+
+    def __getitem__(self, number):
+        if 0 < number <= len(self._names):
+            name = self._names[number - 1]
+            if name is not None:
+                return name
+        raise KeyError(number)
+
+    def __setitem__(self, number, name):
+        if number < 1:
+            raise KeyError(number)
+        if name in self._numbers and self._numbers[name] != number:
+            raise ValueError('Queue {!r} has already got a number.'.format(name))
+        if number in self:
+            del self[number]
+        if number > len(self._names):
+            self._names.extend([None] * (number - len(self._names)))
+        self._names[number - 1] = name
+        self._numbers[name] = number
+
+    def __delitem__(self, number):
+        name = self[number]
+        self._names[number - 1] = None
+        del self._numbers[name]
+
+    def __contains__(self, number):
+        return 0 < number <= len(self._names) and self._names[number - 1] is not None
+
+    def __iter__(self):
+        for number, name in enumerate(self._names, 1):
+            if name is not None:
+                yield number
+
+    def __len__(self):
+        return len(self._numbers)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, dict(self.iteritems()))
+
+    def iteritems(self):
+        return self.iteritems_from(1)
+
+    def iteritems_from(self, number):
+        """
+        Yield (number, name) pairs of queues with numbers greater
+        than or equal to the given one.
+        """
+        for i in xrange(max(number, 1) - 1, len(self._names)):
+            name = self._names[i]
+            if name is not None:
+                yield i + 1, name
+
+    def get_number(self, name):
+        return self._numbers.get(name)
+
+    def add(self, name):
+        """
+        Assign the next free number to the queue name and return it.
+        If the name has already got a number, return it.
+        """
+        if name in self._numbers:
+            return self._numbers[name]
+        number = len(self._names) + 1
+        while number in self._skipped_numbers:
+            self._names.append(None)
+            number += 1
+        self._names.append(name)
+        self._numbers[name] = number
+        return number
+
+    def remove_name(self, name):
+        del self[self._numbers[name]]
+
+    def sync(self, queue_names):
+        """
+        Update the index with a current list of queue names: add
+        new names and remove the ones, which are not on the list.
+        Numbers of the other names stay the same.
+        """
+        current_names = set()
+        for name in queue_names:
+            current_names.add(name)
+            self.add(name)
+        for name in [name for name in self._numbers if name not in current_names]:
+            self.remove_name(name)
@@ -0,0 +1,59 @@
+import threading
+from urllib import quote
+
+
+class Journal(object):
+
+    """
+    Append-only journal of queues, on which an action has been
+    completed, so an interrupted run can be resumed, skipping
+    them.
+
+    Each line of the journal file is a key of a queue: the name
+    of its cluster (empty for the default one) and its vhost,
+    both URL-quoted, and the name of the queue, separated by tabs.
+    Lines are flushed right away, so the journal is up to date,
+    even if the tool is killed. When a run is resumed, keys are
+    loaded into a set, without parsing; the last line is removed,
+    if it has not been written entirely.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self._file = open(path, 'a+')
+        self._file.seek(0)
+        lines = self._file.read().split('\n')
+        # the last item is an empty string, or a partially written
+        # line, which is removed, so next lines are not appended to it
+        if lines[-1]:
+            self._file.truncate(self._file.tell() - len(lines[-1]))
+        self._file.seek(0, 2)
+        self.completed = set(lines[:-1]) if resume else set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, unicode):
+            return value.encode('utf-8')
+        return value
+
+    @classmethod
+    def get_key(cls, cluster_name, vhost, queue_name):
+        return '{}\t{}\t{}'.format(quote(cls._encode(cluster_name or ''), ''),
+                                   quote(cls._encode(vhost), ''),
+                                   cls._encode(queue_name))
+
+    def is_completed(self, key):
+        return key in self.completed
+
+    def add(self, key):
+        # names with line breaks cannot be stored, so such queues
+        # will be manipulated again
+        if '\n' in key or '\r' in key:
+            return
+        with self._lock:
+            self._file.write(key + '\n')
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
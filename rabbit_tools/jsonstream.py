@@ -0,0 +1,130 @@
+import codecs
+import json
+import re
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class JSONArrayStream(object):
+
+    """
+    Incremental decoder of a JSON array, read from an iterable
+    of chunks of bytes (e.g. parts of an HTTP response body).
+
+    Elements of the array are yielded as soon as they are fully
+    received, so only one element (and one chunk) is kept
+    in memory at once, not the whole document.
+
+    The decoded document can be:
+      * an array - its elements are yielded;
+      * an object - elements of the array under the `key` key
+        are yielded, other values of the object are available
+        in the `attributes` dict after the iteration (like
+        "page_count" of a paginated response of the management
+        API).
+
+    If `fields` is set, only these keys of yielded objects
+    are kept.
+    """
+
+    def __init__(self, chunks, key='items', fields=None):
+        self.attributes = {}
+        self.is_list = None
+        self._chunks = iter(chunks)
+        self._key = key
+        self._fields = fields
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buf = u''
+        self._pos = 0
+        self._eof = False
+
+    def __iter__(self):
+        if self._expect('[{') == '[':
+            self.is_list = True
+            items = self._iter_array()
+        else:
+            self.is_list = False
+            items = self._iter_object()
+        for item in items:
+            yield item
+        # consume the rest of the data, so its source is exhausted
+        for _ in self._chunks:
+            pass
+
+    def _fill(self):
+        if self._eof:
+            return False
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._eof = True
+            self._buf += self._decoder.decode('', final=True)
+            return False
+        # drop the already decoded part of the buffer
+        self._buf = self._buf[self._pos:] + self._decoder.decode(chunk)
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of JSON data.')
+
+    def _expect(self, expected_chars):
+        char = self._peek()
+        if char not in expected_chars:
+            raise ValueError('Expected one of {!r}, got {!r} in JSON data.'.format(
+                expected_chars, char))
+        self._pos += 1
+        return char
+
+    def _decode_value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                if self._fill():
+                    continue
+                raise
+            # a number at the end of the buffer may be cut in the middle,
+            # so the value is accepted only if something follows it
+            if self._eof or _WHITESPACE.match(self._buf, end).end() < len(self._buf):
+                self._pos = end
+                return value
+            self._fill()
+
+    def _select_fields(self, item):
+        if self._fields is None or not isinstance(item, dict):
+            return item
+        return {field: item[field] for field in self._fields if field in item}
+
+    def _iter_array(self):
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._select_fields(self._decode_value())
+            if self._expect(',]') == ']':
+                return
+
+    def _iter_object(self):
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._decode_value()
+            self._expect(':')
+            if key == self._key and self._peek() == '[':
+                self._pos += 1
+                for item in self._iter_array():
+                    yield item
+            else:
+                self.attributes[key] = self._decode_value()
+            if self._expect(',}') == '}':
+                return
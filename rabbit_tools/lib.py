@@ -1,14 +1,18 @@
 # -*- coding: utf-8 -*-
 
-import logging.config
+import logging
 import os
 import sys
+from collections import deque
 from contextlib import contextmanager
 
 
 ETC_DIR = '/etc/rabbit_tools'
 HOME_DIR = os.path.expanduser('~/.rabbit_tools')
 
+# number of last distinct lines remembered to skip repeated ones
+DEFAULT_DEDUPLICATION_WINDOW = 100000
+
 
 def answer_yes_no(msg):
     positive_answers = ['y', 't', 'yes', 'ok']
@@ -24,14 +28,31 @@ def answer_yes_no(msg):
 
 @contextmanager
 def log_exceptions():
+    """
+    Configure logging from config files read by `Config` (or log
+    to the standard error, if they do not configure it), passing
+    records to handlers in the background (see the `logs` module),
+    and log exceptions raised in the block.
+    """
+    # slow to import, so only entry points of tools import it
+    import logging.config
+    from ConfigParser import Error as ConfigParserError
+    from rabbit_tools import config
+    from rabbit_tools.logs import BackgroundLogWriter
     logger = logging.getLogger(__name__)
-    logging.config.fileConfig('/home/andrzej/.rabbit_tools/rabbit_tools.conf',
-                              disable_existing_loggers=False)
+    try:
+        logging.config.fileConfig(config.CONFIG_PATHS, disable_existing_loggers=False)
+    except (ConfigParserError, EnvironmentError):
+        logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    log_writer = BackgroundLogWriter()
+    log_writer.start()
     try:
         yield
     except Exception:
         logger.exception('Exception was raised.')
         raise
+    finally:
+        log_writer.stop()
 
 
 @contextmanager
@@ -44,3 +65,24 @@ def simple_logger():
         yield
     except Exception:
         logger.exception('Exception was raised when creating config file.')
+
+
+def iter_unique_lines(stream, window=DEFAULT_DEDUPLICATION_WINDOW):
+    """
+    Yield stripped, non-empty lines of the file-like object,
+    as soon as each of them is read, skipping repeated lines.
+    Only the last `window` distinct lines are remembered,
+    so lines repeated further apart are yielded again.
+    """
+    seen = set()
+    order = deque()
+    # iterating over a file reads ahead, delaying lines from pipes
+    for line in iter(stream.readline, ''):
+        line = line.strip()
+        if not line or line in seen:
+            continue
+        seen.add(line)
+        order.append(line)
+        if len(order) > window:
+            seen.discard(order.popleft())
+        yield line
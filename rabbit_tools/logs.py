@@ -0,0 +1,177 @@
+"""
+Logging pipeline of tools: records are handed to a background
+thread through a queue, so actions on queues do not wait for
+handlers (e.g. writing to syslog), and repetitive messages about
+single queues are coalesced into periodic summaries.
+"""
+
+import logging
+import threading
+import time
+from Queue import (
+    Empty,
+    Queue,
+)
+
+
+# the `extra` argument of logging calls about single queues,
+# which are coalesced, when they are repeated
+PER_QUEUE = {'per_queue': True}
+
+# number of seconds, after which numbers of coalesced messages
+# are logged
+DEFAULT_SUMMARY_INTERVAL = 5
+# number of messages of the same kind passed in each interval,
+# before next ones are coalesced
+DEFAULT_BURST = 10
+# number of seconds to wait for handlers, when the pipeline
+# is stopped
+STOP_TIMEOUT = 5
+
+
+class QueueHandler(logging.Handler):
+
+    """
+    Puts records into the queue. Arguments are merged into
+    the message and the traceback is formatted right away,
+    as they can change before the record is handled.
+    """
+
+    def __init__(self, queue):
+        logging.Handler.__init__(self)
+        self.queue = queue
+
+    def prepare(self, record):
+        record.message_template = record.msg
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+
+class BackgroundLogWriter(object):
+
+    """
+    Thread passing records to handlers of the logger (by default,
+    the root logger), which are replaced with a `QueueHandler`,
+    while the writer is started.
+
+    Records of messages about single queues (logged with the
+    `PER_QUEUE` extra argument) are grouped by the logger,
+    the level and the message before merging arguments. Only
+    `burst` records of each group are passed in an interval
+    of `interval` seconds; the number of next ones is logged
+    at the end of the interval, with an example of them.
+    """
+
+    _stop_record = object()
+
+    def __init__(self, logger=None, interval=DEFAULT_SUMMARY_INTERVAL, burst=DEFAULT_BURST):
+        self.logger = logging.getLogger() if logger is None else logger
+        self.interval = interval
+        self.burst = burst
+        self.queue = Queue()
+        self.handlers = []
+        self._queue_handler = QueueHandler(self.queue)
+        # group: [number of passed records, number of coalesced
+        # records, the last coalesced record]
+        self._groups = {}
+        self._interval_end = None
+        self._thread = None
+
+    def start(self):
+        self.handlers = list(self.logger.handlers)
+        for handler in self.handlers:
+            self.logger.removeHandler(handler)
+        self.logger.addHandler(self._queue_handler)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Handle records logged so far, log numbers of coalesced
+        records and give handlers back to the logger.
+        """
+        self.logger.removeHandler(self._queue_handler)
+        self.queue.put(self._stop_record)
+        self._thread.join(STOP_TIMEOUT)
+        for handler in self.handlers:
+            self.logger.addHandler(handler)
+
+    def flush(self):
+        """
+        Wait, until records logged so far are handled.
+        """
+        self.queue.join()
+
+    def _run(self):
+        while True:
+            timeout = None
+            if self._interval_end is not None:
+                timeout = max(self._interval_end - time.time(), 0)
+            try:
+                record = self.queue.get(timeout=timeout)
+            except Empty:
+                record = None
+            try:
+                if record is self._stop_record:
+                    self._log_summaries()
+                    return
+                if record is not None:
+                    self._handle(record)
+                if self._interval_end is not None and time.time() >= self._interval_end:
+                    self._log_summaries()
+            finally:
+                if record is not None:
+                    self.queue.task_done()
+
+    def _handle(self, record):
+        if getattr(record, 'per_queue', False):
+            if self._interval_end is None:
+                self._interval_end = time.time() + self.interval
+            key = (record.name, record.levelno, getattr(record, 'message_template', record.msg))
+            group = self._groups.setdefault(key, [0, 0, None])
+            if group[0] >= self.burst:
+                group[1] += 1
+                group[2] = record
+                return
+            group[0] += 1
+        self._emit(record)
+
+    def _log_summaries(self):
+        for _, coalesced_count, example in self._groups.itervalues():
+            if coalesced_count:
+                summary = logging.makeLogRecord(example.__dict__)
+                summary.msg = '{} more similar messages, e.g.: {}'.format(coalesced_count,
+                                                                          example.msg)
+                summary.per_queue = False
+                self._emit(summary)
+        self._groups.clear()
+        self._interval_end = None
+
+    def _emit(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def flush_background_logging(logger=None):
+    """
+    Wait, until records passed to handlers of the logger (by default,
+    the root logger) in the background are handled, e.g. before
+    prompting the user.
+    """
+    if logger is None:
+        logger = logging.getLogger()
+    for handler in logger.handlers:
+        if isinstance(handler, QueueHandler):
+            handler.queue.join()
@@ -0,0 +1,175 @@
+import logging
+import sys
+import time
+
+from rabbit_tools.base import RabbitToolBase
+from rabbit_tools.lib import log_exceptions
+from rabbit_tools.logs import PER_QUEUE
+
+
+logger = logging.getLogger(__name__)
+
+# number of messages of a queue delivered to the tool and not
+# confirmed by the target yet
+DEFAULT_PREFETCH_COUNT = 1000
+
+
+class MoveMessagesTool(RabbitToolBase):
+
+    """
+    Moves messages of chosen queues to another queue, or to
+    an exchange, over AMQP (see the `MessageMover` class), whatever
+    the backend of the config is. Queues are chosen like in other
+    tools; messages of `concurrency` queues are moved in parallel,
+    each queue over its own connection.
+
+    Moves are not requests of the management API: `--max-rate`
+    limits the number of moves started per second, while arguments
+    tuning requests (`--adaptive`, `--retries`, `--node-endpoints`)
+    are rejected.
+    """
+
+    description = ('Move messages of AMQP queues to another queue or to an exchange. Do not '
+                   'pass a queue\'s name as an argument, if you want to choose it from '
+                   'the list.')
+
+    client_method_name = 'move_messages'
+
+    args = dict(RabbitToolBase.args, **{
+        '--to-queue': {
+            'help': 'Move messages to the queue.',
+            'metavar': 'QUEUE',
+        },
+        '--to-exchange': {
+            'help': 'Move messages to the exchange, with their routing keys (or the one '
+                    'passed with --routing-key).',
+            'metavar': 'EXCHANGE',
+        },
+        '--routing-key': {
+            'help': 'Routing key of messages moved to the exchange.',
+        },
+        '--drain': {
+            'help': 'Move also messages published to queues while they are moved, until '
+                    'queues are empty (by default, only messages which are in a queue, '
+                    'when its move starts, are moved).',
+            'action': 'store_true',
+        },
+        '--prefetch': {
+            'help': 'Number of messages of a queue delivered to the tool and not confirmed '
+                    'by the target yet (default: {}).'.format(DEFAULT_PREFETCH_COUNT),
+            'type': int,
+            'default': DEFAULT_PREFETCH_COUNT,
+            'metavar': 'N',
+        },
+    })
+
+    queue_not_affected_msg = "Cannot move messages of the queue"
+    queues_affected_msg = "Moved messages of queues"
+    no_queues_affected_msg = "No messages have been moved."
+
+    # messages are published to the exchange (the default one,
+    # if it is empty) with the routing key (the original one,
+    # if it is None)
+    exchange = ''
+    routing_key = None
+    drain = False
+    prefetch_count = DEFAULT_PREFETCH_COUNT
+
+    def _set_action_args(self, parsed_args):
+        if bool(parsed_args.to_queue) == bool(parsed_args.to_exchange):
+            sys.exit('Messages are moved either to a queue (--to-queue), or to an exchange '
+                     '(--to-exchange).')
+        if parsed_args.routing_key is not None and not parsed_args.to_exchange:
+            sys.exit('The routing key can be passed only together with an exchange.')
+        if parsed_args.prefetch < 1:
+            sys.exit('Prefetch count has to be a positive number.')
+        if parsed_args.adaptive or parsed_args.retries is not None or parsed_args.node_endpoints:
+            sys.exit('Moves of messages cannot be used together with the --adaptive, --retries '
+                     'or --node-endpoints arguments.')
+        if parsed_args.to_queue:
+            self.routing_key = parsed_args.to_queue
+        else:
+            self.exchange = parsed_args.to_exchange
+            self.routing_key = parsed_args.routing_key
+        self.drain = parsed_args.drain
+        self.prefetch_count = parsed_args.prefetch
+
+    def _get_mover(self):
+        from rabbit_tools.amqp import (
+            DEFAULT_AMQP_PORT,
+            MessageMover,
+        )
+        from rabbit_tools.transport import DEFAULT_TIMEOUT
+        return MessageMover(self.config['host'],
+                            int(self.config.get('amqp_port', DEFAULT_AMQP_PORT)),
+                            self.config['user'],
+                            self.config['password'],
+                            self._vhost,
+                            timeout=float(self.config.get('timeout', DEFAULT_TIMEOUT)),
+                            prefetch_count=self.prefetch_count,
+                            exchange=self.exchange,
+                            routing_key=self.routing_key)
+
+    def _call_method(self, chosen_queue, before_send=None):
+        """
+        Move messages of a queue from a (key, queue name) pair.
+        Return the AMQPError raised by the move (or None, if it was
+        successful), its duration and the number of moved messages.
+        """
+        from rabbit_tools.amqp import (
+            PRECONDITION_FAILED,
+            AMQPError,
+        )
+        queue_name = chosen_queue[1]
+        if not self.exchange and queue_name == self.routing_key:
+            error = AMQPError(PRECONDITION_FAILED, 'messages cannot be moved to their queue')
+            return error, 0, None
+        if before_send is not None:
+            before_send()
+        start = time.time()
+        mover = self._get_mover()
+        try:
+            moved_count = mover.move(queue_name, self.drain)
+        except AMQPError as e:
+            return e, time.time() - start, None
+        finally:
+            mover.close()
+        duration = time.time() - start
+        self._get_stats().count('moved_messages', moved_count)
+        logger.info("%sMoved %d messages of the queue %r (%.0f messages/s).", self._log_prefix,
+                    moved_count, queue_name, moved_count / duration if duration else 0,
+                    extra=PER_QUEUE)
+        return None, duration, moved_count
+
+    def _run(self):
+        # fail before moving messages, if the target does not exist
+        mover = self._get_mover()
+        try:
+            mover.check_target()
+        finally:
+            mover.close()
+        super(MoveMessagesTool, self)._run()
+
+    def run(self):
+        start = time.time()
+        try:
+            super(MoveMessagesTool, self).run()
+        finally:
+            duration = time.time() - start
+            moved_count = self._get_stats().counters.get('moved_messages', 0)
+            if moved_count:
+                logger.info("Moved %d messages in %.1f s (%.0f messages/s).", moved_count,
+                            duration, moved_count / duration)
+
+
+def main():
+    with log_exceptions():
+        move_messages_tool = MoveMessagesTool()
+        try:
+            move_messages_tool.run()
+        except KeyboardInterrupt:
+            print "Bye"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""
+Local cache of queue names, used to complete names in the shell
+without requests to the management API.
+
+Names of queues of each vhost of each cluster are kept in a file:
+sorted, unique names, one per line, so names starting with a prefix
+are found by a binary search in the file, without reading all of it.
+Tools refresh the cache in a background process after a run (see
+`refresh_in_background()`), if it is older than the TTL.
+
+Names of queues deleted by a tool are removed from the cache
+right away (see `remove_names()`), without listing queues again.
+
+The module is run by completion hooks of the shell, so it imports
+modules of tools only to refresh the cache. Run with:
+    rabbit_tools_complete -h
+"""
+
+import argparse
+import errno
+import mmap
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from urllib import quote
+
+from rabbit_tools.lib import HOME_DIR
+
+
+CACHE_DIR = os.path.join(HOME_DIR, 'cache')
+# number of seconds, after which the cache of a vhost is refreshed
+DEFAULT_NAMES_CACHE_TTL = 300
+
+BASH_SCRIPT = r'''_rabbit_tools_complete() {
+    local cur="${COMP_WORDS[COMP_CWORD]}" prev="${COMP_WORDS[COMP_CWORD-1]}" i
+    local -a args
+    case "$cur" in -*) return;; esac
+    case "$prev" in --vhost|--cluster|--from-file|--journal|--resume|--json-lines|\
+--stats-json|--select|--concurrency|--node-concurrency|--max-rate|--retries|\
+--cache-ttl|--watch|--to-exchange|--routing-key|--prefetch|--largest-first) return;; esac
+    for ((i = 1; i < COMP_CWORD - 1; i++)); do
+        case "${COMP_WORDS[i]}" in
+            --vhost|--cluster) args+=("${COMP_WORDS[i]}" "${COMP_WORDS[i+1]%%,*}");;
+        esac
+    done
+    local IFS=$'\n'
+    COMPREPLY=($(rabbit_tools_complete "${args[@]}" -- "$cur" 2>/dev/null))
+}
+complete -F _rabbit_tools_complete rabdel rabpurge rabmove
+'''
+
+ZSH_SCRIPT = 'autoload -U +X bashcompinit && bashcompinit\n' + BASH_SCRIPT
+
+
+class NamesCache(object):
+
+    """
+    The cache file of queue names of a vhost; `cluster_name`
+    is None for the cluster of the main section of the config.
+    """
+
+    def __init__(self, cluster_name, vhost, directory=CACHE_DIR):
+        self.path = os.path.join(directory, '{}@{}.names'.format(quote(cluster_name or '', ''),
+                                                                 quote(vhost, '')))
+
+    @staticmethod
+    def _encode(name):
+        if isinstance(name, unicode):
+            return name.encode('utf-8')
+        return name
+
+    def get_age(self):
+        """
+        Return the number of seconds since the cache was written,
+        or None, if it does not exist.
+        """
+        try:
+            return time.time() - os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def is_fresh(self, ttl):
+        age = self.get_age()
+        return age is not None and age < ttl
+
+    def write(self, names):
+        """
+        Replace the cache with names from an iterable; names with
+        line breaks are skipped. The file is replaced at once,
+        so names are never read from a partially written file.
+        """
+        names = sorted({self._encode(name) for name in names
+                        if '\n' not in name and '\r' not in name})
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, 0700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.names')
+        try:
+            with os.fdopen(fd, 'w') as temp_file:
+                temp_file.writelines(name + '\n' for name in names)
+            os.rename(temp_path, self.path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def remove(self, names):
+        """
+        Remove names (e.g. of deleted queues) from the cache, if it
+        exists. The time of writing the cache is kept, so it is
+        refreshed when it would be without the removal.
+        """
+        names = {self._encode(name) for name in names}
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        self.write(name for name in self.iter_names() if name not in names)
+        os.utime(self.path, (time.time(), mtime))
+
+    def iter_names(self, prefix=''):
+        """
+        Yield cached names starting with the prefix, in order.
+        """
+        prefix = self._encode(prefix)
+        try:
+            with open(self.path, 'rb') as cache_file:
+                size = os.fstat(cache_file.fileno()).st_size
+                if not size:
+                    return
+                names = mmap.mmap(cache_file.fileno(), size, access=mmap.ACCESS_READ)
+        except (IOError, OSError):
+            return
+        try:
+            start = self._find_first_line(names, size, prefix)
+            while start < size:
+                end = names.find('\n', start)
+                if end < 0:
+                    end = size
+                name = names[start:end]
+                if not name.startswith(prefix):
+                    break
+                yield name
+                start = end + 1
+        finally:
+            names.close()
+
+    @staticmethod
+    def _find_first_line(names, size, prefix):
+        """
+        Return the offset of the first line not less than the prefix
+        (or the size of the file, if there is no such line).
+        """
+        low, high = 0, size
+        while low < high:
+            # the start of the line containing the middle offset
+            start = names.rfind('\n', low, (low + high) // 2) + 1 or low
+            end = names.find('\n', start)
+            if end < 0:
+                end = size
+            if names[start:end] < prefix:
+                low = end + 1
+            else:
+                high = start
+        return low
+
+
+def refresh_in_background(targets, max_age, directory=CACHE_DIR):
+    """
+    Refresh caches of (cluster name, vhost) pairs older than
+    `max_age` seconds in a new process, which is not waited for.
+    """
+    argv = []
+    for cluster_name, vhost in targets:
+        if not NamesCache(cluster_name, vhost, directory).is_fresh(max_age):
+            argv.extend(['--target', cluster_name or '', vhost])
+    if not argv:
+        return
+    with open(os.devnull, 'r+') as devnull:
+        subprocess.Popen([sys.executable, '-m', 'rabbit_tools.names_cache', '--refresh',
+                          '--cache-dir', directory] + argv,
+                         stdin=devnull, stdout=devnull, stderr=devnull, close_fds=True,
+                         preexec_fn=os.setsid)
+
+
+def remove_names(deleted_names, directory=CACHE_DIR):
+    """
+    Remove names from caches of vhosts; `deleted_names` is a dict
+    of (cluster name, vhost) pairs and iterables of names.
+    """
+    for (cluster_name, vhost), names in deleted_names.iteritems():
+        NamesCache(cluster_name, vhost, directory).remove(names)
+
+
+def refresh(targets, directory=CACHE_DIR, config=None, cluster_configs=None):
+    """
+    List queues of (cluster name, vhost) pairs and write their names
+    to the cache. The config is read from the config file, unless
+    it is passed, like to tools.
+    """
+    from rabbit_tools.purge import PurgeQueueTool
+    for cluster_name, vhost in targets:
+        argv = ['--vhost', vhost]
+        if cluster_name:
+            argv.extend(['--cluster', cluster_name])
+        tool = PurgeQueueTool(config=config, argv=argv, cluster_configs=cluster_configs)
+        NamesCache(cluster_name, vhost, directory).write(tool._yield_queue_list())
+
+
+def _get_default_vhost(cluster_name):
+    from rabbit_tools.base import RabbitToolBase
+    from rabbit_tools.config import (
+        Config,
+        ConfigFileMissingException,
+    )
+    try:
+        config = Config(RabbitToolBase.config_section)
+        if cluster_name:
+            config.update(Config('{}:{}'.format(RabbitToolBase.config_section, cluster_name)))
+    except ConfigFileMissingException:
+        return None
+    return config.get('vhost')
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Print cached names of queues starting with the prefix, to complete '
+                    'them in the shell. To enable completion of names for rabdel, '
+                    'rabpurge and rabmove, add \'eval "$(rabbit_tools_complete --script bash)"\' '
+                    '(or "zsh") to the config of the shell.')
+    parser.add_argument('prefix', nargs='?', default='', help='Prefix of names')
+    parser.add_argument('--cluster', help='Cluster configured in the config file')
+    parser.add_argument('--vhost', help='Vhost (by default, the one of the config)')
+    parser.add_argument('--script', choices=['bash', 'zsh'],
+                        help='Print the completion hook of the shell')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Refresh caches of targets, instead of printing names')
+    parser.add_argument('--target', nargs=2, action='append', default=[],
+                        metavar=('CLUSTER', 'VHOST'),
+                        help='Cluster ("" - the default one) and vhost, whose cache '
+                             'is refreshed')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    if args.script:
+        sys.stdout.write(BASH_SCRIPT if args.script == 'bash' else ZSH_SCRIPT)
+    elif args.refresh:
+        refresh([(cluster_name or None, vhost) for cluster_name, vhost in args.target],
+                args.cache_dir)
+    else:
+        vhost = args.vhost or _get_default_vhost(args.cluster)
+        if vhost is None:
+            return
+        for name in NamesCache(args.cluster, vhost, args.cache_dir).iter_names(args.prefix):
+            sys.stdout.write(name + '\n')
+
+
+if __name__ == '__main__':
+    main()
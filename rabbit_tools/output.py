@@ -0,0 +1,34 @@
+import json
+import sys
+import threading
+
+
+class ResultWriter(object):
+
+    """
+    Writes results of operations on queues as JSON lines, one
+    object per queue, flushing each of them right away, so they
+    can be consumed by another program while the tool runs.
+    Results are not kept in memory.
+
+    The writer is thread-safe, so it can be shared by tools
+    handling many vhosts in parallel.
+    """
+
+    def __init__(self, path):
+        """
+        Open the file of results ("-" - the standard output).
+        """
+        self.path = path
+        self._stream = sys.stdout if path == '-' else open(path, 'w')
+        self._lock = threading.Lock()
+
+    def write(self, **result):
+        line = json.dumps(result, sort_keys=True) + '\n'
+        with self._lock:
+            self._stream.write(line)
+            self._stream.flush()
+
+    def close(self):
+        if self._stream is not sys.stdout:
+            self._stream.close()
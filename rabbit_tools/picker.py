@@ -0,0 +1,154 @@
+import fcntl
+import os
+import struct
+import sys
+import termios
+
+
+DEFAULT_TERMINAL_HEIGHT = 24
+
+
+def get_terminal_height():
+    try:
+        return int(os.environ['LINES'])
+    except (KeyError, ValueError):
+        pass
+    try:
+        size = fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, '\0' * 4)
+        height = struct.unpack('hh', size)[0]
+    except (AttributeError, IOError, ValueError):
+        return DEFAULT_TERMINAL_HEIGHT
+    return height or DEFAULT_TERMINAL_HEIGHT
+
+
+class QueuePicker(object):
+
+    """
+    Shows a mapping of queue numbers to names one page at a time,
+    and reads user's input.
+
+    Only queues from the current page are printed, so rendering
+    does not depend on the total number of queues. Navigation
+    commands are handled by the picker itself:
+        n / next - show the next page;
+        p / prev - show the previous page;
+        /TEXT - show only queues with names containing TEXT;
+        / - show all queues again.
+    Other inputs are returned to the caller.
+
+    A search extending the previous one (e.g. "/tmp.load" after
+    "/tmp") filters only the previous results.
+    """
+
+    next_page_commands = ['n', 'next']
+    previous_page_commands = ['p', 'prev']
+    search_prefix = '/'
+
+    def __init__(self, page_size=None):
+        if page_size is None:
+            # leave space for the header and the prompt
+            page_size = max(get_terminal_height() - 3, 1)
+        self.page_size = page_size
+        self.reset()
+
+    def reset(self):
+        # without a search - numbers of the first queues of the current
+        # and previous pages; with a search - numbers of found queues
+        # and the offset of the current page
+        self._page_starts = [1]
+        self._next_page_start = None
+        self._search_text = None
+        self._found_numbers = None
+        self._offset = 0
+
+    @property
+    def search_text(self):
+        return self._search_text
+
+    def filter_mapping(self, mapping):
+        """
+        Return the part of the mapping matching the current search.
+        """
+        if self._search_text is None:
+            return mapping
+        return {nr: mapping[nr] for nr in self._found_numbers if nr in mapping}
+
+    def get_input(self, mapping, prompt):
+        while True:
+            self._render(mapping)
+            user_input = raw_input(prompt).strip()
+            command = user_input.lower()
+            if command in self.next_page_commands:
+                self._go_to_next_page()
+            elif command in self.previous_page_commands:
+                self._go_to_previous_page()
+            elif user_input.startswith(self.search_prefix):
+                self._search(mapping, user_input[len(self.search_prefix):])
+            else:
+                return user_input
+
+    def _search(self, mapping, text):
+        text = text.strip().lower()
+        if not text:
+            self.reset()
+            return
+        if self._search_text is not None and self._search_text in text:
+            candidates = ((nr, mapping[nr]) for nr in self._found_numbers if nr in mapping)
+        else:
+            candidates = mapping.iteritems()
+        self._found_numbers = [nr for nr, queue in candidates if text in queue.lower()]
+        self._search_text = text
+        self._offset = 0
+
+    def _go_to_next_page(self):
+        if self._search_text is not None:
+            if self._offset + self.page_size < len(self._found_numbers):
+                self._offset += self.page_size
+        elif self._next_page_start is not None:
+            self._page_starts.append(self._next_page_start)
+
+    def _go_to_previous_page(self):
+        if self._search_text is not None:
+            self._offset = max(self._offset - self.page_size, 0)
+        elif len(self._page_starts) > 1:
+            self._page_starts.pop()
+
+    def _iter_page(self, mapping):
+        if self._search_text is not None:
+            numbers = self._found_numbers[self._offset:self._offset + self.page_size]
+            return ((nr, mapping[nr]) for nr in numbers if nr in mapping)
+        if hasattr(mapping, 'iteritems_from'):
+            items = mapping.iteritems_from(self._page_starts[-1])
+        else:
+            items = ((nr, mapping[nr]) for nr in sorted(mapping) if nr >= self._page_starts[-1])
+        return self._take_page(items)
+
+    def _take_page(self, items):
+        self._next_page_start = None
+        for i, (nr, queue) in enumerate(items):
+            if i == self.page_size:
+                self._next_page_start = nr
+                return
+            yield nr, queue
+
+    def _render(self, mapping):
+        page = list(self._iter_page(mapping))
+        if not page and len(self._page_starts) > 1:
+            # queues from the end of the list have been removed
+            self.reset()
+            page = list(self._iter_page(mapping))
+        for nr, queue in page:
+            print '[{}] {}'.format(nr, queue)
+        print self._get_status_line(len(mapping))
+
+    def _get_status_line(self, queues_count):
+        if self._search_text is not None:
+            found = len(self._found_numbers)
+            first = min(self._offset + 1, found)
+            last = min(self._offset + self.page_size, found)
+            status = '{}-{} of {} queues matching {!r} (/ to clear)'.format(
+                first, last, found, self._search_text)
+        else:
+            status = 'page {} of about {} ({} queues)'.format(
+                len(self._page_starts), -(-queues_count // self.page_size), queues_count)
+        return "-- {}; 'n'/'p' next/previous page, '/text' to search --".format(status)
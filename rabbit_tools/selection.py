@@ -0,0 +1,172 @@
+import operator
+import re
+import time
+from calendar import timegm
+
+
+class SelectionError(ValueError):
+    """Raised when a selection expression cannot be parsed."""
+
+
+def _glob_to_regex(pattern):
+    return '^{}$'.format(''.join(
+        '.*' if char == '*' else '.' if char == '?' else re.escape(char)
+        for char in pattern))
+
+
+def _parse_number(value):
+    return _parse_with_suffix(value, {'k': 10 ** 3, 'm': 10 ** 6, 'g': 10 ** 9})
+
+
+def _parse_seconds(value):
+    return _parse_with_suffix(value, {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60})
+
+
+def _parse_with_suffix(value, multipliers):
+    value = value.lower()
+    multiplier = 1
+    if value and value[-1] in multipliers:
+        multiplier = multipliers[value[-1]]
+        value = value[:-1]
+    try:
+        return float(value) * multiplier
+    except ValueError:
+        raise SelectionError('Wrong value: {!r}.'.format(value))
+
+
+def _parse_timestamp(value):
+    # older versions of the API return "2017-01-01 12:00:00",
+    # newer ones - ISO 8601 format with milliseconds and time zone
+    value = value.replace('T', ' ')[:19]
+    return timegm(time.strptime(value, '%Y-%m-%d %H:%M:%S'))
+
+
+def _get_idle_time(queue):
+    idle_since = queue.get('idle_since')
+    if not idle_since:
+        return 0
+    return time.time() - _parse_timestamp(idle_since)
+
+
+class Predicate(object):
+
+    """
+    Comparison of a queue's statistic with a value, like:
+        messages>1M
+    """
+
+    operators = [
+        ('>=', operator.ge),
+        ('<=', operator.le),
+        ('!=', operator.ne),
+        ('>', operator.gt),
+        ('<', operator.lt),
+        ('=', operator.eq),
+    ]
+    # name of a field: (column of the API, function getting the value
+    # from a queue, function parsing a value from an expression)
+    fields = {
+        'messages': ('messages', operator.itemgetter('messages'), _parse_number),
+        'ready': ('messages_ready', operator.itemgetter('messages_ready'), _parse_number),
+        'unacked': ('messages_unacknowledged',
+                    operator.itemgetter('messages_unacknowledged'),
+                    _parse_number),
+        'consumers': ('consumers', operator.itemgetter('consumers'), _parse_number),
+        'memory': ('memory', operator.itemgetter('memory'), _parse_number),
+        'bytes': ('message_bytes', operator.itemgetter('message_bytes'), _parse_number),
+        'idle': ('idle_since', _get_idle_time, _parse_seconds),
+    }
+    regex = re.compile(r'^(\w+)({})(.+)$'.format('|'.join(re.escape(op) for op, _ in operators)))
+
+    def __init__(self, expression):
+        match = self.regex.search(expression)
+        if not match:
+            raise SelectionError('Wrong condition: {!r}.'.format(expression))
+        field, op, value = match.groups()
+        if field not in self.fields:
+            raise SelectionError('Unknown field {!r}, choose from: {}.'.format(
+                field, ', '.join(sorted(self.fields))))
+        self.column, self._get_value, parse_value = self.fields[field]
+        self._operator = dict(self.operators)[op]
+        self._value = parse_value(value)
+
+    def __call__(self, queue):
+        try:
+            value = self._get_value(queue)
+        except (KeyError, ValueError):
+            # statistics are not available, e.g. the queue is down
+            return False
+        return value is not None and self._operator(value, self._value)
+
+
+class Selector(object):
+
+    """
+    Chooses queues by their names and statistics.
+
+    An expression consists of terms separated by spaces; a queue
+    is selected, if it matches all of them. A term can be:
+      * glob:PATTERN - the name matches the shell-style pattern;
+      * re:PATTERN - the name matches the regular expression;
+      * FIELD OPERATOR VALUE (without spaces) - a condition
+        on the queue's statistic, e.g.: messages>1M, consumers=0,
+        idle>=2h. Fields: messages, ready, unacked, consumers,
+        memory, bytes (of messages) and idle (time since the queue
+        has been idle). Operators: >, >=, <, <=, =, !=. Numbers
+        can have a k/M/G suffix, the idle time - s/m/h/d.
+
+    The first name pattern is passed to the management API,
+    so the broker filters queues by names.
+    """
+
+    name_prefixes = ('glob:', 're:')
+
+    def __init__(self, expression):
+        terms = expression.split()
+        if not terms:
+            raise SelectionError('Empty selection.')
+        self._name_regexes = []
+        self._predicates = []
+        for term in terms:
+            if term.startswith('glob:'):
+                self._add_name_regex(_glob_to_regex(term[len('glob:'):]))
+            elif term.startswith('re:'):
+                self._add_name_regex(term[len('re:'):])
+            else:
+                self._predicates.append(Predicate(term))
+
+    @classmethod
+    def is_selection(cls, expression):
+        """Check, if the expression looks like a selection."""
+        terms = expression.split()
+        return bool(terms) and (terms[0].startswith(cls.name_prefixes) or
+                                bool(Predicate.regex.search(terms[0])))
+
+    def _add_name_regex(self, pattern):
+        try:
+            self._name_regexes.append(re.compile(pattern))
+        except re.error as e:
+            raise SelectionError('Wrong regular expression {!r}: {}.'.format(pattern, e))
+
+    @property
+    def columns(self):
+        columns = ['name']
+        for predicate in self._predicates:
+            if predicate.column not in columns:
+                columns.append(predicate.column)
+        return columns
+
+    @property
+    def needs_stats(self):
+        return bool(self._predicates)
+
+    @property
+    def name_regex(self):
+        if self._name_regexes:
+            return self._name_regexes[0].pattern
+        return None
+
+    def matches(self, queue):
+        name = queue['name']
+        return (all(regex.search(name) for regex in self._name_regexes) and
+                all(predicate(queue) for predicate in self._predicates))
@@ -0,0 +1,313 @@
+"""
+Long-lived session running tools on behalf of thin clients (see
+the `shell` module), so a short command takes about one round trip
+to the management API: modules are imported and the config is
+read once, connections of the client of the management API are
+kept open, and lists of queues are cached.
+
+Commands are run one at a time: output of a command and its
+working directory are those of the client.
+"""
+
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from SocketServer import (
+    StreamRequestHandler,
+    ThreadingMixIn,
+    UnixStreamServer,
+)
+
+from rabbit_tools.base import RabbitToolBase
+from rabbit_tools.config import (
+    Config,
+    ConfigFileMissingException,
+)
+from rabbit_tools.delete import DelQueueTool
+from rabbit_tools.purge import PurgeQueueTool
+from rabbit_tools.shell import (
+    DEFAULT_CACHE_TTL,
+    DEFAULT_SOCKET_PATH,
+    encode_message,
+)
+
+
+logger = logging.getLogger(__name__)
+
+TOOLS = {
+    'del': DelQueueTool,
+    'purge': PurgeQueueTool,
+}
+
+
+class SessionError(Exception):
+    """Raised, when the session cannot be started."""
+
+
+class QueueListCache(object):
+
+    """
+    Lists of queues of vhosts (dicts with chosen columns), fetched
+    from the management API and kept for `ttl` seconds, so tools
+    run in a session do not list queues on each command.
+    """
+
+    def __init__(self, ttl=DEFAULT_CACHE_TTL):
+        self.ttl = ttl
+        self._lists = {}
+        self._lock = threading.Lock()
+
+    def get(self, client, vhost, columns):
+        # clients of the session are kept per API, so lists of vhosts
+        # of different clusters are kept apart
+        key = client, vhost, tuple(columns)
+        with self._lock:
+            timestamp, queues = self._lists.get(key, (None, None))
+            if timestamp is not None and time.time() - timestamp <= self.ttl:
+                return queues
+        timestamp = time.time()
+        queues = list(client.iter_queues(vhost, columns=columns))
+        with self._lock:
+            self._lists[key] = timestamp, queues
+        return queues
+
+    def clear(self):
+        with self._lock:
+            self._lists.clear()
+
+
+class _Response(object):
+
+    """
+    Sends responses to a client; if the client has disconnected,
+    they are dropped, so the command is not interrupted.
+    """
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+        self._lock = threading.Lock()
+
+    def send(self, **message):
+        with self._lock:
+            if self._wfile is None:
+                return
+            try:
+                self._wfile.write(encode_message(**message))
+                self._wfile.flush()
+            except socket.error:
+                self._wfile = None
+
+
+class _ResponseStream(object):
+
+    """
+    File-like object replacing the standard output or error
+    during a command.
+    """
+
+    def __init__(self, response, name):
+        self._response = response
+        self._name = name
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.decode('utf-8', 'replace')
+        self._response.send(**{self._name: data})
+
+    def flush(self):
+        pass
+
+
+class _ResponseLogHandler(logging.Handler):
+
+    def __init__(self, response):
+        logging.Handler.__init__(self)
+        self.setFormatter(logging.Formatter('%(levelname)s - %(message)s'))
+        self._response = response
+
+    def emit(self, record):
+        self._response.send(stderr=self.format(record) + '\n')
+
+
+class _SessionHandler(StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if line:
+            self.server.session.handle_request(line, _Response(self.wfile))
+
+
+class _Server(ThreadingMixIn, UnixStreamServer):
+
+    daemon_threads = True
+
+
+class Session(object):
+
+    """
+    The session, listening on the Unix socket; it can be used
+    as a context manager, serving in a thread:
+        with Session(config, socket_path) as session:
+            shell.run_in_session(socket_path, 'purge', ['queue1'])
+    Configs of clusters chosen with the `--cluster` argument are read
+    from the config file, unless `cluster_configs` are passed (see
+    `RabbitToolBase`). A client is kept for each management API
+    (host, port and user of the config of a command).
+    """
+
+    def __init__(self, config, socket_path=DEFAULT_SOCKET_PATH, cache_ttl=DEFAULT_CACHE_TTL,
+                 cluster_configs=None):
+        self.config = config
+        self.socket_path = socket_path
+        self.queue_list_cache = QueueListCache(cache_ttl)
+        self.cluster_configs = cluster_configs
+        self._clients = {}
+        self._command_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def bind(self):
+        """
+        Listen on the socket, readable and writable by the user only,
+        removing the socket of a session, which is not running.
+        """
+        directory = os.path.dirname(self.socket_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0700)
+        if os.path.exists(self.socket_path):
+            if self._is_socket_active():
+                raise SessionError('The session at {!r} is already running.'.format(
+                    self.socket_path))
+            os.remove(self.socket_path)
+        umask = os.umask(0077)
+        try:
+            self._server = _Server(self.socket_path, _SessionHandler)
+        finally:
+            os.umask(umask)
+        self._server.session = self
+
+    def _is_socket_active(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except socket.error:
+            return False
+        finally:
+            sock.close()
+        return True
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever(poll_interval=0.1)
+        finally:
+            self._close()
+
+    def start(self):
+        self.bind()
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._thread.join()
+
+    def _close(self):
+        self._server.server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def handle_request(self, line, response):
+        """
+        Run the command of the request; the standard output and error,
+        messages logged by tools and the working directory are replaced
+        for the time of the command, so commands are run one at a time.
+        """
+        with self._command_lock:
+            log_handler = _ResponseLogHandler(response)
+            tools_logger = logging.getLogger('rabbit_tools')
+            tools_logger.addHandler(log_handler)
+            stdout, stderr = sys.stdout, sys.stderr
+            sys.stdout = _ResponseStream(response, 'stdout')
+            sys.stderr = _ResponseStream(response, 'stderr')
+            cwd = os.getcwd()
+            try:
+                status = self._run_command(line)
+            except SystemExit as e:
+                status = self._get_exit_status(e.code)
+            except Exception:
+                logger.exception('The command has failed.')
+                status = 1
+            finally:
+                os.chdir(cwd)
+                sys.stdout, sys.stderr = stdout, stderr
+                tools_logger.removeHandler(log_handler)
+        response.send(exit=status)
+
+    @staticmethod
+    def _get_exit_status(code):
+        # like exiting the interpreter with the code
+        if code is None:
+            return 0
+        if isinstance(code, int):
+            return code
+        sys.stderr.write('{}\n'.format(code))
+        return 1
+
+    def _run_command(self, line):
+        request = json.loads(line)
+        tool_class = TOOLS.get(request.get('tool'))
+        if tool_class is None:
+            sys.exit('Unknown tool: {!r}.'.format(request.get('tool')))
+        os.chdir(request.get('cwd', '/'))
+        tool = tool_class(config=self.config, argv=request.get('argv', []),
+                          cluster_configs=self.cluster_configs)
+        if tool.reads_standard_input():
+            sys.exit('The session cannot read the standard input; pass queue names, '
+                     'a selection, or a file of names.')
+        if tool.watch_interval is not None:
+            sys.exit('The session cannot run tools in the watch mode.')
+        client_key = tuple(tool.config.get(option) for option in ('host', 'port', 'user'))
+        if client_key in self._clients:
+            tool.client = self._clients[client_key]
+        else:
+            self._clients[client_key] = tool.client
+        tool.queue_list_cache = self.queue_list_cache
+        try:
+            tool.run()
+        finally:
+            # deleted queues have to be removed from lists
+            if tool.do_remove_chosen_numbers:
+                self.queue_list_cache.clear()
+        return 0
+
+
+def serve(socket_path=DEFAULT_SOCKET_PATH, cache_ttl=DEFAULT_CACHE_TTL):
+    logging.basicConfig(stream=sys.stderr, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.getLogger('rabbit_tools').setLevel(logging.INFO)
+    try:
+        config = Config(RabbitToolBase.config_section)
+    except ConfigFileMissingException:
+        sys.exit('Config file has not been found. Use the "rabbit_tools_config" command'
+                 ' to generate it.')
+    session = Session(config, socket_path, cache_ttl)
+    try:
+        session.bind()
+    except SessionError as e:
+        sys.exit(str(e))
+    logger.info('The session is listening on %r.', socket_path)
+    try:
+        session.serve_forever()
+    except KeyboardInterrupt:
+        pass
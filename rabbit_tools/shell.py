@@ -0,0 +1,102 @@
+"""
+Thin client of a session (see the `session` module): sends
+a command of a tool to the session process over a Unix socket
+and writes its output, so short commands do not pay for starting
+a tool and connecting to the management API.
+
+The client imports no module of tools, or of the HTTP stack.
+Messages of the protocol are JSON objects, one per line.
+The request:
+    {"tool": "purge", "argv": ["queue1"], "cwd": "/home/user"}
+is followed by responses:
+    {"stdout": "..."}, {"stderr": "..."} - the output of the tool,
+    {"exit": 0} - the exit status, the last response.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+from rabbit_tools.lib import HOME_DIR
+
+
+DEFAULT_SOCKET_PATH = os.path.join(HOME_DIR, 'session.sock')
+# number of seconds, for which the session keeps lists of queues
+DEFAULT_CACHE_TTL = 30
+TOOL_NAMES = ('del', 'purge')
+
+
+def encode_message(**message):
+    return json.dumps(message) + '\n'
+
+
+def run_in_session(socket_path, tool_name, argv, stdout=None, stderr=None):
+    """
+    Run the tool with arguments in the session, writing its output
+    to file-like objects (by default, the standard output and error);
+    return the exit status.
+    """
+    if stdout is None:
+        stdout = sys.stdout
+    if stderr is None:
+        stderr = sys.stderr
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error as e:
+        sys.exit('Cannot connect to the session at {!r}: {}. Start it with '
+                 '"rabshell --serve".'.format(socket_path, e))
+    try:
+        sock.sendall(encode_message(tool=tool_name, argv=argv, cwd=os.getcwd()))
+        responses = sock.makefile('rb')
+        for line in iter(responses.readline, ''):
+            response = json.loads(line)
+            if 'exit' in response:
+                return response['exit']
+            if 'stdout' in response:
+                stdout.write(response['stdout'].encode('utf-8'))
+                stdout.flush()
+            if 'stderr' in response:
+                stderr.write(response['stderr'].encode('utf-8'))
+    finally:
+        sock.close()
+    stderr.write('The session has closed the connection.\n')
+    return 1
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run a tool in a long-lived session, which keeps connections to '
+                    'the management API open and lists of queues cached. Start '
+                    'the session with --serve, then pass the name of a tool and its '
+                    'arguments, e.g. "rabshell purge queue1".')
+    parser.add_argument('--serve', action='store_true',
+                        help='Run the session, until it is interrupted')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET_PATH,
+                        help='Path of the Unix socket of the session')
+    parser.add_argument('--cache-ttl', type=float, default=DEFAULT_CACHE_TTL,
+                        help='Number of seconds, for which the session keeps lists '
+                             'of queues (with --serve)')
+    parser.add_argument('tool', nargs='?', choices=TOOL_NAMES,
+                        help='Tool to run in the session')
+    parser.add_argument('tool_args', nargs=argparse.REMAINDER,
+                        help='Arguments of the tool')
+    args = parser.parse_args(argv)
+    if not args.serve and args.tool is None:
+        parser.error('a tool has to be chosen, unless the session is run with --serve')
+    return args
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    if args.serve:
+        from rabbit_tools.session import serve
+        serve(args.socket, args.cache_ttl)
+    else:
+        sys.exit(run_in_session(args.socket, args.tool, args.tool_args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class LatencyHistogram(object):
+
+    """
+    Histogram of latencies with logarithmic buckets. Each bucket
+    is about 9% wider than the previous one, so percentiles are
+    estimated with that precision, using constant memory.
+    """
+
+    buckets_per_doubling = 8
+    # the lower bound of the first bucket - 10 microseconds
+    min_latency = 1e-5
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._buckets = {}
+
+    def _get_bucket(self, latency):
+        if latency <= self.min_latency:
+            return 0
+        return int(math.log(latency / self.min_latency, 2) * self.buckets_per_doubling) + 1
+
+    def _get_upper_bound(self, bucket):
+        return self.min_latency * 2 ** (float(bucket) / self.buckets_per_doubling)
+
+    def add(self, latency):
+        self.count += 1
+        self.sum += latency
+        self.min = latency if self.min is None else min(self.min, latency)
+        self.max = latency if self.max is None else max(self.max, latency)
+        bucket = self._get_bucket(latency)
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+
+    def merge(self, other):
+        if not other.count:
+            return
+        self.count += other.count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        for bucket, count in other._buckets.iteritems():
+            self._buckets[bucket] = self._buckets.get(bucket, 0) + count
+
+    def percentile(self, percent):
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * percent / 100.0)
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                return min(self._get_upper_bound(bucket), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'histogram': [
+                {'le': self._get_upper_bound(bucket), 'count': self._buckets[bucket]}
+                for bucket in sorted(self._buckets)
+            ],
+        }
+
+
+class OperationStats(object):
+
+    """
+    Timings of phases of a tool's run (like listing queues,
+    or applying an action to them) and of the operations
+    on single queues.
+
+    Results of operations on single queues are kept only
+    if `keep_queue_records` is True; otherwise only counters
+    and the latency histogram are updated.
+
+    Stats of many targets (e.g. vhosts) can be merged into one
+    report, see the `merge()` method. Named counters (e.g. of polls
+    in the watch mode) are kept in the `counters` dict.
+
+    The amount freed by operations (e.g. purged messages, with
+    the `--largest-first` argument) is added to the second of the
+    run, in which it has been freed, so the report shows how fast
+    it has been freed, in memory growing with the duration only.
+    """
+
+    # percentages of the freed amount, times of which are reported
+    freed_percents = (50, 90, 100)
+
+    def __init__(self, keep_queue_records=False):
+        self.keep_queue_records = keep_queue_records
+        self.phases = {}
+        self.status_counts = {}
+        self.retries = 0
+        self.latencies = LatencyHistogram()
+        self.queue_records = []
+        self.targets = []
+        self.counters = {}
+        # second since `start_time`: the amount freed in that second
+        self.freed = {}
+        self.freed_field = None
+        self.start_time = time.time()
+        self._lock = threading.Lock()
+
+    def add_phase_time(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+    @contextmanager
+    def phase(self, phase):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_phase_time(phase, time.time() - start)
+
+    def timed_iter(self, iterable, phase):
+        """
+        Yield items of the iterable, adding the time of getting
+        each of them to the phase.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_phase_time(phase, time.time() - start)
+                return
+            self.add_phase_time(phase, time.time() - start)
+            yield item
+
+    def record(self, queue_name, status, latency, **extra):
+        """
+        Record an operation on the queue; `status` is the HTTP
+        status code of a failed request, or "ok".
+        """
+        with self._lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            self.latencies.add(latency)
+            if self.keep_queue_records:
+                record = {'queue': queue_name, 'status': status, 'latency': latency}
+                record.update(extra)
+                self.queue_records.append(record)
+
+    def add_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_freed(self, amount, field):
+        """
+        Add the amount (of the field, e.g. "messages") freed
+        by an operation finished now.
+        """
+        second = int(time.time() - self.start_time)
+        with self._lock:
+            self.freed_field = field
+            self.freed[second] = self.freed.get(second, 0) + amount
+
+    def _merge_freed(self, other):
+        if not other.freed:
+            return
+        self.freed_field = other.freed_field
+        # seconds of `other` are counted from its own start
+        offset = int(round(other.start_time - self.start_time))
+        for second, amount in other.freed.iteritems():
+            second = max(second + offset, 0)
+            self.freed[second] = self.freed.get(second, 0) + amount
+
+    def get_freed_times(self):
+        """
+        Return (percent, seconds) pairs: the number of seconds since
+        the start, after which each of `freed_percents` of the freed
+        amount had been freed.
+        """
+        total = sum(self.freed.itervalues())
+        times = []
+        freed_so_far = 0
+        percents = list(self.freed_percents)
+        for second in sorted(self.freed):
+            freed_so_far += self.freed[second]
+            while percents and freed_so_far * 100 >= total * percents[0]:
+                times.append((percents.pop(0), second + 1))
+        return times
+
+    def merge(self, other, **target):
+        """
+        Add operations recorded by `other` to these stats. Fields
+        of `target` (like the name of a vhost) are added to records
+        of queues and to the summary of `other`, which is kept
+        in the `targets` list. Without `target`, phases of `other`
+        are added to these phases instead, and no summary is kept,
+        so stats of repeated runs are merged in constant memory.
+        """
+        with self._lock:
+            for status, count in other.status_counts.iteritems():
+                self.status_counts[status] = self.status_counts.get(status, 0) + count
+            self.retries += other.retries
+            self.latencies.merge(other.latencies)
+            for name, value in other.counters.iteritems():
+                self.counters[name] = self.counters.get(name, 0) + value
+            self._merge_freed(other)
+            if self.keep_queue_records:
+                for record in other.queue_records:
+                    self.queue_records.append(dict(record, **target))
+            if target:
+                target_summary = dict(target)
+                target_summary.update(phases=other.phases,
+                                      operations=other._get_operations_dict())
+                self.targets.append(target_summary)
+            else:
+                for phase, seconds in other.phases.iteritems():
+                    self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+    def get_summary(self):
+        latencies = self.latencies
+        if not latencies.count:
+            return 'No operations.'
+        summary = ('{} operations ({}), {} retries, latency p50: {:.1f} ms, '
+                   'p95: {:.1f} ms, p99: {:.1f} ms.'.format(
+                       latencies.count,
+                       ', '.join('{}: {}'.format(status, count)
+                                 for status, count in sorted(self.status_counts.iteritems())),
+                       self.retries,
+                       latencies.percentile(50) * 1000,
+                       latencies.percentile(95) * 1000,
+                       latencies.percentile(99) * 1000))
+        if self.freed:
+            summary += ' Freed {} ({}): {}.'.format(
+                sum(self.freed.itervalues()), self.freed_field,
+                ', '.join('{}% in {} s'.format(percent, seconds)
+                          for percent, seconds in self.get_freed_times()))
+        return summary
+
+    def _get_operations_dict(self):
+        return {
+            'count': self.latencies.count,
+            'retries': self.retries,
+            'statuses': {str(status): count
+                         for status, count in self.status_counts.iteritems()},
+            'latency': self.latencies.to_dict(),
+        }
+
+    def to_dict(self):
+        result = {
+            'phases': self.phases,
+            'operations': self._get_operations_dict(),
+        }
+        if self.targets:
+            result['targets'] = self.targets
+        if self.counters:
+            result['counters'] = self.counters
+        if self.freed:
+            freed_so_far = 0
+            timeline = []
+            for second in sorted(self.freed):
+                freed_so_far += self.freed[second]
+                timeline.append({'seconds': second + 1, 'freed': freed_so_far})
+            result['freed'] = {
+                'field': self.freed_field,
+                'total': freed_so_far,
+                'times': {'p{}'.format(percent): seconds
+                          for percent, seconds in self.get_freed_times()},
+                'timeline': timeline,
+            }
+        if self.keep_queue_records:
+            result['queues'] = self.queue_records
+        return result
+
+    def write_json(self, path):
+        """
+        Write the stats to the file, replacing it at once, so it
+        can be read, while it is rewritten (e.g. after each poll).
+        """
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as stats_file:
+            json.dump(self.to_dict(), stats_file, indent=2)
+        os.rename(temp_path, path)
@@ -0,0 +1,156 @@
+"""
+Benchmarks of Rabbit Tools, run against the local fake management
+API (see the `fake_api` module).
+
+Each scenario is run in a separate process, so the peak memory
+usage is measured for the scenario only, and not for the fake
+server. Run with:
+    python -m rabbit_tools.tests.benchmark -h
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import resource
+import sys
+import time
+
+from rabbit_tools.delete import DelQueueTool
+from rabbit_tools.purge import PurgeQueueTool
+from rabbit_tools.tests.fake_amqp import FakeAMQPServer
+from rabbit_tools.tests.fake_api import FakeManagementAPI
+
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def _list_queues(tool):
+    return sum(1 for _ in tool._yield_queue_list())
+
+
+def _get_queue_mapping(tool):
+    return len(tool._get_queue_mapping())
+
+
+def _make_action(tool):
+    tool.make_action_on_queues(tool._yield_queue_list())
+
+
+# name: (class of the tool, function running the scenario)
+SCENARIOS = {
+    'listing': (DelQueueTool, _list_queues),
+    'mapping': (DelQueueTool, _get_queue_mapping),
+    'delete': (DelQueueTool, _make_action),
+    'purge': (PurgeQueueTool, _make_action),
+}
+
+
+def _get_peak_memory():
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run_scenario(name, config, argv, results):
+    logging.disable(logging.CRITICAL)
+    tool_class, scenario = SCENARIOS[name]
+    start_memory = _get_peak_memory()
+    start = time.time()
+    tool = tool_class(config=config, argv=argv)
+    scenario(tool)
+    results.put({
+        'wall_time': time.time() - start,
+        'peak_memory_kb': _get_peak_memory() - start_memory,
+    })
+
+
+def run_benchmark(name, size, concurrency=1, latency=0, error_rate=0, capacity=None,
+                  adaptive=False, max_rate=None, node_count=1, node_concurrency=None,
+                  backend='http'):
+    with FakeManagementAPI(queue_count=size, latency=latency, error_rate=error_rate,
+                           capacity=capacity, node_count=node_count, seed=size) as api, \
+            FakeAMQPServer(api, latency=latency, error_rate=error_rate) as amqp:
+        config = amqp.get_config() if backend == 'amqp' else api.get_config()
+        results = multiprocessing.Queue()
+        argv = ['--concurrency', str(concurrency)]
+        if adaptive:
+            argv.append('--adaptive')
+        if max_rate is not None:
+            argv.extend(['--max-rate', str(max_rate)])
+        if node_concurrency is not None:
+            argv.extend(['--node-concurrency', str(node_concurrency)])
+        process = multiprocessing.Process(target=_run_scenario,
+                                          args=(name, config, argv, results))
+        process.start()
+        result = results.get()
+        process.join()
+        # AMQP operations are counted as requests
+        requests = api.request_count + amqp.operations
+        result.update(
+            scenario=name,
+            queues=size,
+            concurrency=concurrency,
+            backend=backend,
+            requests=requests,
+            rejected_requests=api.rejected_count,
+            requests_per_second=requests / result['wall_time'],
+            node_max_in_flight=dict(api.node_max_in_flight),
+        )
+        return result
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark Rabbit Tools against a fake '
+                                                 'RabbitMQ management API.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Numbers of queues')
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS),
+                        default=sorted(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Latency of each API request (in seconds)')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='Probability of a failed API request')
+    parser.add_argument('--capacity', type=int,
+                        help='Maximum number of requests in progress; the fake API '
+                             'rejects other requests with the 429 status')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='Run tools with the --adaptive argument')
+    parser.add_argument('--max-rate', type=float,
+                        help='Run tools with the --max-rate argument')
+    parser.add_argument('--node-count', type=int, default=1,
+                        help='Number of nodes hosting queues of the fake API')
+    parser.add_argument('--node-concurrency', type=int,
+                        help='Run tools with the --node-concurrency argument')
+    parser.add_argument('--backend', choices=['http', 'amqp'], default='http',
+                        help='Backend of tools; with "amqp", queues are purged and deleted '
+                             'through the fake AMQP listener')
+    parser.add_argument('--json', metavar='FILE', help='Write results to the JSON file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    row_format = '{:<10} {:>8} {:>11} {:>10} {:>10} {:>12} {:>14}'
+    print row_format.format('scenario', 'queues', 'wall time', 'requests', 'rejected',
+                            'requests/s', 'peak mem (MB)')
+    results = []
+    for size in args.sizes:
+        for name in args.scenarios:
+            result = run_benchmark(name, size, args.concurrency, args.latency,
+                                   args.error_rate, args.capacity, args.adaptive,
+                                   args.max_rate, args.node_count, args.node_concurrency,
+                                   args.backend)
+            results.append(result)
+            print row_format.format(name, size, '{:.3f}s'.format(result['wall_time']),
+                                    result['requests'], result['rejected_requests'],
+                                    '{:.1f}'.format(result['requests_per_second']),
+                                    '{:.1f}'.format(result['peak_memory_kb'] / 1024.))
+            sys.stdout.flush()
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
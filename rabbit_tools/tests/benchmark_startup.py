@@ -0,0 +1,132 @@
+"""
+Benchmark of the startup of Rabbit Tools: importing the tools,
+printing the help, rejecting invalid arguments and initializing
+a tool, before any request is sent.
+
+Each scenario is run in a new interpreter, like a tool run from
+cron or CI, so modules imported by previous runs are not reused.
+The wall time of the whole process is reported, together with
+the time of the scenario itself and whether the HTTP stack
+(pyrabbit) has been imported. Run with:
+    python -m rabbit_tools.tests.benchmark_startup -h
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+
+DEFAULT_REPEAT = 20
+
+# config of tools, so no config file is read
+CONFIG = {
+    'host': '127.0.0.1',
+    'port': '15672',
+    'user': 'guest',
+    'password': 'guest',
+    'vhost': '/',
+}
+
+# name: code of the scenario
+SCENARIOS = {
+    'import': 'import rabbit_tools.delete',
+    'help': ('from rabbit_tools.delete import DelQueueTool\n'
+             'DelQueueTool(config=CONFIG, argv=["-h"])'),
+    'invalid-args': ('from rabbit_tools.delete import DelQueueTool\n'
+                     'DelQueueTool(config=CONFIG, argv=["--concurrency", "0"])'),
+    'init': ('from rabbit_tools.delete import DelQueueTool\n'
+             'DelQueueTool(config=CONFIG, argv=["queue"])'),
+    # the cost deferred until the first request
+    'client': ('from rabbit_tools.delete import DelQueueTool\n'
+               'DelQueueTool(config=CONFIG, argv=["queue"]).client'),
+    'config-help': ('sys.argv = ["rabbit_tools_config", "-h"]\n'
+                    'from rabbit_tools.config import ConfigCreator\n'
+                    'ConfigCreator()'),
+}
+
+# run by the new interpreter; the help and errors are not shown,
+# the result is written to the standard output as JSON
+SCENARIO_TEMPLATE = '''
+import json, os, sys, time
+CONFIG = {config!r}
+start = time.time()
+stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+stderr, sys.stderr = sys.stderr, sys.stdout
+try:
+{code}
+except SystemExit:
+    pass
+finally:
+    sys.stdout, sys.stderr = stdout, stderr
+stdout.write(json.dumps({{
+    'scenario_time': time.time() - start,
+    'http_stack_imported': 'pyrabbit' in sys.modules,
+}}))
+'''
+
+
+def _get_scenario_script(name):
+    code = '\n'.join('    ' + line for line in SCENARIOS[name].splitlines())
+    return SCENARIO_TEMPLATE.format(config=CONFIG, code=code)
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.
+
+
+def run_benchmark(name, repeat=DEFAULT_REPEAT):
+    script = _get_scenario_script(name)
+    wall_times = []
+    scenario_times = []
+    http_stack_imported = False
+    for _ in xrange(repeat):
+        start = time.time()
+        output = subprocess.check_output([sys.executable, '-c', script])
+        wall_times.append(time.time() - start)
+        result = json.loads(output)
+        scenario_times.append(result['scenario_time'])
+        http_stack_imported = http_stack_imported or result['http_stack_imported']
+    return {
+        'scenario': name,
+        'repeat': repeat,
+        'wall_time': _median(wall_times),
+        'scenario_time': _median(scenario_times),
+        'http_stack_imported': http_stack_imported,
+    }
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the startup of Rabbit Tools.')
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS),
+                        default=sorted(SCENARIOS))
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='Number of runs of each scenario; medians are reported')
+    parser.add_argument('--json', metavar='FILE', help='Write results to the JSON file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    row_format = '{:<13} {:>14} {:>15} {:>10}'
+    print row_format.format('scenario', 'process (ms)', 'scenario (ms)', 'pyrabbit')
+    results = []
+    for name in args.scenarios:
+        result = run_benchmark(name, args.repeat)
+        results.append(result)
+        print row_format.format(name, '{:.1f}'.format(result['wall_time'] * 1000),
+                                '{:.1f}'.format(result['scenario_time'] * 1000),
+                                'yes' if result['http_stack_imported'] else 'no')
+        sys.stdout.flush()
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
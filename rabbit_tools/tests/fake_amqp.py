@@ -0,0 +1,484 @@
+"""
+Local stand-in for the AMQP listener of RabbitMQ, used by tests
+and benchmarks together with the fake management API (see the
+`fake_api` module), sharing its queues.
+
+It implements the part of AMQP 0-9-1 used by Rabbit Tools:
+opening connections and channels, queue.purge and queue.delete.
+Like in RabbitMQ, purging a missing queue closes the channel
+with the 404 reply code, deleting it succeeds. Operations can
+be delayed (`latency`, in seconds) and can fail, closing
+the channel with the 541 reply code (`error_rate`).
+
+To move messages, it implements passive declarations, consuming
+with a prefetch window, publishing in the confirm mode (to the
+default exchange, or to fanout exchanges added with
+`add_exchange()`), and acknowledgements. Messages of a queue
+are made up, when it is consumed for the first time, according
+to its number of messages in the fake management API.
+"""
+
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from SocketServer import (
+    StreamRequestHandler,
+    ThreadingMixIn,
+    TCPServer,
+)
+
+from rabbit_tools.amqp import (
+    BASIC_ACK,
+    BASIC_CANCEL,
+    BASIC_CANCEL_OK,
+    BASIC_CONSUME,
+    BASIC_CONSUME_OK,
+    BASIC_DELIVER,
+    BASIC_PUBLISH,
+    BASIC_QOS,
+    BASIC_QOS_OK,
+    BASIC_RETURN,
+    CHANNEL_CLOSE,
+    CHANNEL_CLOSE_OK,
+    CHANNEL_OPEN,
+    CHANNEL_OPEN_OK,
+    CONNECTION_CLOSE,
+    CONNECTION_CLOSE_OK,
+    CONNECTION_OPEN,
+    CONNECTION_OPEN_OK,
+    CONNECTION_START,
+    CONNECTION_START_OK,
+    CONNECTION_TUNE,
+    CONFIRM_SELECT,
+    CONFIRM_SELECT_OK,
+    EXCHANGE_DECLARE,
+    EXCHANGE_DECLARE_OK,
+    FRAME_CONTENT_BODY,
+    FRAME_CONTENT_HEADER,
+    FRAME_METHOD,
+    NO_ROUTE,
+    NOT_FOUND,
+    PROTOCOL_HEADER,
+    QUEUE_DECLARE,
+    QUEUE_DECLARE_OK,
+    QUEUE_DELETE,
+    QUEUE_DELETE_OK,
+    QUEUE_PURGE,
+    QUEUE_PURGE_OK,
+    decode_method,
+    encode_close,
+    encode_frame,
+    encode_longstr,
+    encode_method_frame,
+    encode_shortstr,
+    get_body_size,
+    read_frame,
+)
+
+
+NOT_ALLOWED = 530
+INTERNAL_ERROR = 541
+
+FRAME_MAX = 131072
+
+
+def encode_message(body):
+    """
+    Return a message (the payload of its content header frame
+    without properties, and its body).
+    """
+    return struct.pack('>HHQH', 60, 0, len(body), 0), body
+
+
+class _FakeChannel(object):
+
+    def __init__(self):
+        self.prefetch_count = 0
+        # (queue name, consumer tag) of the consumer of the channel
+        self.consumer = None
+        self.last_delivery_tag = 0
+        # (delivery tag, queue name, message) of unacknowledged messages
+        self.unacked = deque()
+        # the sequence number of the last published message,
+        # None - the channel is not in the confirm mode
+        self.publish_number = None
+        # [exchange, routing key, mandatory, header, body parts]
+        # of the message being published
+        self.publish = None
+
+
+class FakeAMQPHandler(StreamRequestHandler):
+
+    def setup(self):
+        StreamRequestHandler.setup(self)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.channels = {}
+        self.vhost = None
+
+    def _send(self, channel, method, arguments=''):
+        self.wfile.write(encode_method_frame(channel, method, arguments))
+        self.wfile.flush()
+
+    def handle(self):
+        try:
+            self._handle()
+        except socket.error:
+            # the client has closed the connection
+            pass
+        finally:
+            for channel in self.channels.keys():
+                self._close_channel(channel)
+
+    def finish(self):
+        try:
+            StreamRequestHandler.finish(self)
+        except socket.error:
+            pass
+
+    def _close_channel(self, channel):
+        fake_channel = self.channels.pop(channel, None)
+        if fake_channel is not None:
+            self.server.amqp_server.requeue(self.vhost, fake_channel.unacked)
+
+    def _handle(self):
+        server = self.server.amqp_server
+        if self.rfile.read(len(PROTOCOL_HEADER)) != PROTOCOL_HEADER:
+            return
+        server.count_connection()
+        self._send(0, CONNECTION_START,
+                   struct.pack('>BB', 0, 9) + encode_longstr('') + encode_longstr('PLAIN')
+                   + encode_longstr('en_US'))
+        vhost = None
+        # channels closed by the server, which have not been
+        # confirmed by the client yet
+        closing_channels = set()
+        while True:
+            frame = read_frame(self.rfile)
+            if frame is None:
+                return
+            frame_type, channel, payload = frame
+            if channel in closing_channels and frame_type != FRAME_METHOD:
+                continue
+            if frame_type == FRAME_CONTENT_HEADER:
+                self.channels[channel].publish.append(payload)
+                if not get_body_size(payload):
+                    self._complete_publish(channel, closing_channels)
+                continue
+            if frame_type == FRAME_CONTENT_BODY:
+                publish = self.channels[channel].publish
+                publish.append(payload)
+                if sum(len(part) for part in publish[4:]) == get_body_size(publish[3]):
+                    self._complete_publish(channel, closing_channels)
+                continue
+            if frame_type != FRAME_METHOD:
+                continue
+            method, arguments = decode_method(payload)
+            if method == CONNECTION_START_OK:
+                self._send(0, CONNECTION_TUNE, struct.pack('>HIH', 2047, 131072, 0))
+            elif method == CONNECTION_OPEN:
+                vhost = self.vhost = arguments.read_shortstr()
+                if vhost not in server.api.vhosts:
+                    self._send(0, CONNECTION_CLOSE,
+                               encode_close(NOT_ALLOWED, "NOT_ALLOWED - vhost not found",
+                                            CONNECTION_OPEN))
+                    return
+                self._send(0, CONNECTION_OPEN_OK, encode_shortstr(''))
+            elif method == CONNECTION_CLOSE:
+                self._send(0, CONNECTION_CLOSE_OK)
+                return
+            elif method == CHANNEL_OPEN:
+                self.channels[channel] = _FakeChannel()
+                self._send(channel, CHANNEL_OPEN_OK, encode_longstr(''))
+            elif method == CHANNEL_CLOSE:
+                self._close_channel(channel)
+                closing_channels.discard(channel)
+                self._send(channel, CHANNEL_CLOSE_OK)
+            elif method == CHANNEL_CLOSE_OK:
+                closing_channels.discard(channel)
+            elif channel in closing_channels:
+                continue
+            elif method in (QUEUE_PURGE, QUEUE_DELETE):
+                arguments.read_short()
+                name = arguments.read_shortstr()
+                reply_code, reply, messages = server.handle(method, vhost, name)
+                if reply_code is None:
+                    self._send(channel, reply, struct.pack('>I', messages))
+                else:
+                    self._fail(channel, reply_code, reply, method, closing_channels)
+            elif method in (QUEUE_DECLARE, EXCHANGE_DECLARE):
+                self._declare(channel, method, arguments, closing_channels)
+            elif method == BASIC_QOS:
+                arguments.read_long()
+                self.channels[channel].prefetch_count = arguments.read_short()
+                self._send(channel, BASIC_QOS_OK)
+            elif method == CONFIRM_SELECT:
+                self.channels[channel].publish_number = 0
+                self._send(channel, CONFIRM_SELECT_OK)
+            elif method == BASIC_CONSUME:
+                arguments.read_short()
+                name = arguments.read_shortstr()
+                consumer_tag = 'ctag-{}'.format(channel)
+                self.channels[channel].consumer = name, consumer_tag
+                self._send(channel, BASIC_CONSUME_OK, encode_shortstr(consumer_tag))
+                self._deliver(channel)
+            elif method == BASIC_CANCEL:
+                consumer_tag = self.channels[channel].consumer[1]
+                self.channels[channel].consumer = None
+                self._send(channel, BASIC_CANCEL_OK, encode_shortstr(consumer_tag))
+            elif method == BASIC_ACK:
+                self._ack(channel, arguments.read_longlong(), arguments.read_octet() & 1)
+                self._deliver(channel)
+            elif method == BASIC_PUBLISH:
+                arguments.read_short()
+                self.channels[channel].publish = [arguments.read_shortstr(),
+                                                  arguments.read_shortstr(),
+                                                  arguments.read_octet() & 1]
+
+    def _fail(self, channel, reply_code, reply, method, closing_channels):
+        self._close_channel(channel)
+        closing_channels.add(channel)
+        self._send(channel, CHANNEL_CLOSE, encode_close(reply_code, reply, method))
+
+    def _declare(self, channel, method, arguments, closing_channels):
+        # only passive declarations are supported
+        server = self.server.amqp_server
+        arguments.read_short()
+        name = arguments.read_shortstr()
+        if method == EXCHANGE_DECLARE:
+            if server.has_exchange(name):
+                self._send(channel, EXCHANGE_DECLARE_OK)
+            else:
+                self._fail(channel, NOT_FOUND, "NOT_FOUND - no exchange '{}' in vhost '{}'".format(
+                    name, self.vhost), method, closing_channels)
+            return
+        message_count = server.count_ready(self.vhost, name)
+        if message_count is None:
+            self._fail(channel, NOT_FOUND, "NOT_FOUND - no queue '{}' in vhost '{}'".format(
+                name, self.vhost), method, closing_channels)
+        else:
+            self._send(channel, QUEUE_DECLARE_OK,
+                       encode_shortstr(name) + struct.pack('>II', message_count, 0))
+
+    def _deliver(self, channel):
+        fake_channel = self.channels[channel]
+        if fake_channel.consumer is None:
+            return
+        name, consumer_tag = fake_channel.consumer
+        frames = []
+        while (not fake_channel.prefetch_count
+               or len(fake_channel.unacked) < fake_channel.prefetch_count):
+            message = self.server.amqp_server.get(self.vhost, name)
+            if message is None:
+                break
+            fake_channel.last_delivery_tag += 1
+            fake_channel.unacked.append((fake_channel.last_delivery_tag, name, message))
+            frames.append(encode_method_frame(
+                channel, BASIC_DELIVER,
+                encode_shortstr(consumer_tag)
+                + struct.pack('>QB', fake_channel.last_delivery_tag, 0)
+                + encode_shortstr('') + encode_shortstr(name)))
+            frames.extend(self._encode_content(channel, message))
+        if frames:
+            self.wfile.write(''.join(frames))
+            self.wfile.flush()
+
+    @staticmethod
+    def _encode_content(channel, message):
+        header, body = message
+        frames = [encode_frame(FRAME_CONTENT_HEADER, channel, header)]
+        for offset in xrange(0, len(body), FRAME_MAX - 8):
+            frames.append(encode_frame(FRAME_CONTENT_BODY, channel,
+                                       body[offset:offset + FRAME_MAX - 8]))
+        return frames
+
+    def _ack(self, channel, delivery_tag, multiple):
+        unacked = self.channels[channel].unacked
+        acked = [item for item in unacked
+                 if item[0] == delivery_tag or (multiple and item[0] < delivery_tag)]
+        for item in acked:
+            unacked.remove(item)
+        self.server.amqp_server.ack(self.vhost, [name for _, name, _ in acked])
+
+    def _complete_publish(self, channel, closing_channels):
+        server = self.server.amqp_server
+        fake_channel = self.channels[channel]
+        exchange, routing_key, mandatory, header = fake_channel.publish[:4]
+        message = header, ''.join(fake_channel.publish[4:])
+        fake_channel.publish = None
+        if not server.has_exchange(exchange):
+            self._fail(channel, NOT_FOUND, "NOT_FOUND - no exchange '{}' in vhost '{}'".format(
+                exchange, self.vhost), BASIC_PUBLISH, closing_channels)
+            return
+        frames = []
+        if not server.publish(self.vhost, exchange, routing_key, message) and mandatory:
+            frames.append(encode_method_frame(channel, BASIC_RETURN,
+                                              struct.pack('>H', NO_ROUTE)
+                                              + encode_shortstr('NO_ROUTE')
+                                              + encode_shortstr(exchange)
+                                              + encode_shortstr(routing_key)))
+            frames.extend(self._encode_content(channel, message))
+        if fake_channel.publish_number is not None:
+            fake_channel.publish_number += 1
+            frames.append(encode_method_frame(channel, BASIC_ACK,
+                                              struct.pack('>QB', fake_channel.publish_number,
+                                                          server.confirm_multiple)))
+        self.wfile.write(''.join(frames))
+        self.wfile.flush()
+
+
+class _Server(ThreadingMixIn, TCPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeAMQPServer(object):
+
+    """
+    The fake AMQP listener, operating on queues of the fake
+    management API; it can be used as a context manager:
+        with FakeManagementAPI(queue_count=1000) as api, FakeAMQPServer(api) as amqp:
+            tool = DelQueueTool(config=amqp.get_config(), argv=['all'])
+    """
+
+    def __init__(self, api, latency=0, error_rate=0, confirm_multiple=False):
+        self.api = api
+        self.latency = latency
+        self.error_rate = error_rate
+        # whether publishing is confirmed with the "multiple" flag
+        self.confirm_multiple = confirm_multiple
+        self.connections = 0
+        self.operations = 0
+        # fanout exchanges: name: names of bound queues
+        self.exchanges = {}
+        # (vhost, queue name): ready messages
+        self._messages = {}
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        self._server = _Server(('127.0.0.1', 0), FakeAMQPHandler)
+        self._server.amqp_server = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def get_config(self, vhost='/'):
+        """
+        Return the config of tools using the fake management API
+        and the AMQP backend.
+        """
+        config = self.api.get_config(vhost)
+        config.update(backend='amqp', amqp_port=str(self._server.server_address[1]))
+        return config
+
+    def count_connection(self):
+        with self.api.lock:
+            self.connections += 1
+
+    def handle(self, method, vhost, name):
+        """
+        Apply the operation; return (None, reply method, number
+        of messages), if it was successful, otherwise - the reply
+        code and text of closing the channel, and None.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        with self.api.lock:
+            self.operations += 1
+            if self.error_rate and self.api.random.random() < self.error_rate:
+                return INTERNAL_ERROR, 'INTERNAL_ERROR - fake error', None
+            queues = self.api.get_queues(vhost)
+            messages = queues.get(name)['messages'] if name in queues else 0
+            self._messages.pop((vhost, name), None)
+            if method == QUEUE_DELETE:
+                if name in queues:
+                    queues.delete(name)
+                return None, QUEUE_DELETE_OK, messages
+            if name not in queues:
+                return (NOT_FOUND, "NOT_FOUND - no queue '{}' in vhost '{}'".format(name, vhost),
+                        None)
+            queues.purge(name)
+            return None, QUEUE_PURGE_OK, messages
+
+    def add_exchange(self, name, queue_names):
+        with self.api.lock:
+            self.exchanges[name] = list(queue_names)
+
+    def has_exchange(self, name):
+        return not name or name in self.exchanges
+
+    def _get_messages(self, vhost, name):
+        """
+        Return ready messages of the queue (None, if it does not
+        exist); they are made up on the first call, the number
+        of messages in the management API includes also
+        unacknowledged ones.
+        """
+        queues = self.api.get_queues(vhost)
+        if name not in queues:
+            return None
+        key = vhost, name
+        if key not in self._messages:
+            self._messages[key] = deque(
+                encode_message('{}:{}'.format(name, i))
+                for i in xrange(queues.get(name)['messages']))
+        return self._messages[key]
+
+    def get_bodies(self, vhost, name):
+        with self.api.lock:
+            return [body for _, body in self._get_messages(vhost, name)]
+
+    def count_ready(self, vhost, name):
+        with self.api.lock:
+            messages = self._get_messages(vhost, name)
+            return None if messages is None else len(messages)
+
+    def get(self, vhost, name):
+        with self.api.lock:
+            messages = self._get_messages(vhost, name)
+            return messages.popleft() if messages else None
+
+    def ack(self, vhost, names):
+        with self.api.lock:
+            queues = self.api.get_queues(vhost)
+            for name in names:
+                if name in queues:
+                    queues.get(name)['messages'] -= 1
+
+    def requeue(self, vhost, unacked):
+        with self.api.lock:
+            for _, name, message in reversed(unacked):
+                messages = self._get_messages(vhost, name)
+                if messages is not None:
+                    messages.appendleft(message)
+
+    def publish(self, vhost, exchange, routing_key, message):
+        """
+        Route the message to queues; return whether it has been
+        routed to any queue.
+        """
+        with self.api.lock:
+            names = self.exchanges[exchange] if exchange else [routing_key]
+            routed = False
+            for name in names:
+                messages = self._get_messages(vhost, name)
+                if messages is not None:
+                    messages.append(message)
+                    self.api.get_queues(vhost).get(name)['messages'] += 1
+                    routed = True
+            return routed
@@ -0,0 +1,337 @@
+"""
+Local stand-in for the RabbitMQ management API, used by tests
+and benchmarks.
+
+It implements the part of the API used by Rabbit Tools:
+    GET /api/vhosts
+    GET /api/queues/VHOST (with pagination, `columns`, `name`
+        and `use_regex` parameters)
+    DELETE /api/queues/VHOST/NAME
+    DELETE /api/queues/VHOST/NAME/contents
+Each request can be delayed (`latency`, in seconds) and can fail
+with the 500 status (`error_rate` - probability of a failure).
+If `capacity` is set, requests exceeding that number of requests
+in progress are rejected with the 429 status.
+Generated queues are spread across `node_count` nodes, named
+"rabbit@nodeN" (or hosted by "rabbit@localhost", if there is
+only one node); the numbers of requests in progress concerning
+queues of each node are tracked, to check how the work is spread.
+"""
+
+import bisect
+import json
+import random
+import re
+import socket
+import threading
+import time
+from BaseHTTPServer import (
+    BaseHTTPRequestHandler,
+    HTTPServer,
+)
+from SocketServer import ThreadingMixIn
+from urllib import unquote
+from urlparse import (
+    parse_qs,
+    urlparse,
+)
+
+
+MAX_PAGE_SIZE = 500
+
+
+class FakeQueues(object):
+
+    """
+    Queues of a vhost, sorted by names. Deleted names are removed
+    from the sorted list lazily, before the next listing.
+    """
+
+    def __init__(self):
+        self._names = []
+        self._deleted = set()
+        self._stats = {}
+
+    def __len__(self):
+        return len(self._stats)
+
+    def __contains__(self, name):
+        return name in self._stats
+
+    def add(self, name, messages=0, consumers=0, node='rabbit@localhost', **stats):
+        if name not in self._stats:
+            self._compact()
+            bisect.insort(self._names, name)
+        stats.update(name=name, messages=messages, consumers=consumers, node=node)
+        self._stats[name] = stats
+
+    def delete(self, name):
+        del self._stats[name]
+        self._deleted.add(name)
+
+    def purge(self, name):
+        self._stats[name]['messages'] = 0
+
+    def get(self, name):
+        return self._stats[name]
+
+    def names(self):
+        self._compact()
+        return self._names
+
+    def _compact(self):
+        if self._deleted:
+            self._names = [name for name in self._names if name not in self._deleted]
+            self._deleted = set()
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # buffer the response, so it is sent in one packet
+    wbufsize = -1
+    queues_path_regex = re.compile(r'^/api/queues/([^/]+)(?:/([^/]+)(/contents)?)?$')
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, status, content=None):
+        body = json.dumps(content) if content is not None else ''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self):
+        self._respond(404, {'error': 'Object Not Found', 'reason': 'Not Found'})
+
+    def _handle(self, method):
+        api = self.server.api
+        url = urlparse(self.path)
+        match = self.queues_path_regex.search(url.path)
+        api.count_request(method, self.headers.get('Authorization'))
+        if not api.enter():
+            self._respond(429, {'error': 'Too Many Requests', 'reason': 'Overloaded'})
+            return
+        try:
+            self._handle_admitted(method, api, url, match)
+        finally:
+            api.leave()
+
+    def _handle_admitted(self, method, api, url, match):
+        if match:
+            vhost, name, contents = [unquote(x) if x else x for x in match.groups()]
+            node = api.enter_node(vhost, name) if name else None
+        else:
+            node = None
+        try:
+            if api.latency:
+                time.sleep(api.latency)
+            if api.error_rate and api.random.random() < api.error_rate:
+                self._respond(500, {'error': 'Internal Server Error', 'reason': 'Fake error'})
+                return
+            if method == 'GET' and url.path == '/api/vhosts':
+                with api.lock:
+                    content = [{'name': vhost} for vhost in sorted(api.vhosts)]
+                self._respond(200, content)
+                return
+            if not match:
+                self._not_found()
+                return
+            with api.lock:
+                status, content = api.handle(method, vhost, name, bool(contents),
+                                             parse_qs(url.query))
+        finally:
+            if node is not None:
+                api.leave_node(node)
+        self._respond(status, content)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def process_request(self, request, client_address):
+        self.api.count_connection()
+        return ThreadingMixIn.process_request(self, request, client_address)
+
+
+class FakeManagementAPI(object):
+
+    """
+    The fake API server; it can be used as a context manager:
+        with FakeManagementAPI(queue_count=1000) as api:
+            tool = DelQueueTool(config=api.get_config(), argv=['all'])
+    """
+
+    def __init__(self, queue_count=0, vhost='/', latency=0, error_rate=0,
+                 paginated=True, seed=None, capacity=None, node_count=1):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.in_flight = 0
+        self.rejected_count = 0
+        self.node_in_flight = {}
+        self.node_max_in_flight = {}
+        # the largest number of nodes handling requests at once
+        self.max_busy_nodes = 0
+        self.paginated = paginated
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.vhosts = {}
+        self.requests = {}
+        self.connections = 0
+        self.requested_queries = []
+        self.auth_headers = set()
+        self._server = None
+        self._thread = None
+        for i in xrange(queue_count):
+            kwargs = {}
+            if node_count > 1:
+                kwargs['node'] = 'rabbit@node{}'.format(i % node_count)
+            self.add_queue(vhost, 'queue{:07d}'.format(i),
+                           messages=self.random.randint(0, 10000), **kwargs)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        self._server = _Server(('127.0.0.1', 0), FakeAPIHandler)
+        self._server.api = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def api_url(self):
+        return '127.0.0.1:{}'.format(self._server.server_address[1])
+
+    def get_config(self, vhost='/'):
+        host, port = self._server.server_address
+        return {
+            'host': host,
+            'port': str(port),
+            'user': 'guest',
+            'password': 'guest',
+            'vhost': vhost,
+        }
+
+    def add_queue(self, vhost, name, **stats):
+        self.vhosts.setdefault(vhost, FakeQueues()).add(name, **stats)
+
+    def get_queues(self, vhost='/'):
+        return self.vhosts.setdefault(vhost, FakeQueues())
+
+    def count_request(self, method, auth_header):
+        with self.lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+            self.auth_headers.add(auth_header)
+
+    def enter(self):
+        with self.lock:
+            if self.capacity is not None and self.in_flight >= self.capacity:
+                self.rejected_count += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def enter_node(self, vhost, name):
+        with self.lock:
+            queues = self.vhosts.get(vhost)
+            if queues is None or name not in queues:
+                return None
+            node = queues.get(name)['node']
+            count = self.node_in_flight.get(node, 0) + 1
+            self.node_in_flight[node] = count
+            self.node_max_in_flight[node] = max(self.node_max_in_flight.get(node, 0), count)
+            busy_nodes = sum(1 for count in self.node_in_flight.itervalues() if count)
+            self.max_busy_nodes = max(self.max_busy_nodes, busy_nodes)
+            return node
+
+    def leave_node(self, node):
+        with self.lock:
+            self.node_in_flight[node] -= 1
+
+    def count_connection(self):
+        with self.lock:
+            self.connections += 1
+
+    @property
+    def request_count(self):
+        return sum(self.requests.itervalues())
+
+    def handle(self, method, vhost, name, contents, query):
+        queues = self.vhosts.get(vhost)
+        if queues is None:
+            return 404, {'error': 'Object Not Found', 'reason': 'Not Found'}
+        if method == 'GET' and name is None:
+            return 200, self._list(queues, query)
+        if method == 'DELETE' and name in queues:
+            if contents:
+                queues.purge(name)
+            else:
+                queues.delete(name)
+            return 204, None
+        return 404, {'error': 'Object Not Found', 'reason': 'Not Found'}
+
+    def _list(self, queues, query):
+        self.requested_queries.append(query)
+        names = queues.names()
+        if 'name' in query:
+            regex = re.compile(query['name'][0])
+            names = [name for name in names if regex.search(name)]
+        if 'page' not in query or not self.paginated:
+            return [self._get_columns(queues.get(name), query) for name in names]
+        page = int(query['page'][0])
+        page_size = min(int(query['page_size'][0]), MAX_PAGE_SIZE)
+        page_names = names[(page - 1) * page_size:page * page_size]
+        return {
+            'filtered_count': len(names),
+            'item_count': len(page_names),
+            'items': [self._get_columns(queues.get(name), query) for name in page_names],
+            'page': page,
+            'page_count': max(1, -(-len(names) // page_size)),
+            'page_size': page_size,
+            'total_count': len(queues),
+        }
+
+    @staticmethod
+    def _get_columns(queue, query):
+        # like the API, "object.field" columns choose fields of nested objects
+        if 'columns' not in query:
+            return queue
+        result = {}
+        for column in query['columns'][0].split(','):
+            name, _, field = column.partition('.')
+            if name not in queue:
+                continue
+            if not field:
+                result[name] = queue[name]
+            elif field in queue[name]:
+                result.setdefault(name, {})[field] = queue[name][field]
+        return result
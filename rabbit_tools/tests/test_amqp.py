@@ -0,0 +1,209 @@
+import unittest
+
+from pyrabbit.http import NetworkError
+
+from rabbit_tools.amqp import (
+    AMQPBackend,
+    AMQPError,
+    MessageMover,
+)
+from rabbit_tools.tests.fake_amqp import (
+    FakeAMQPServer,
+    encode_message,
+)
+from rabbit_tools.tests.fake_api import FakeManagementAPI
+
+
+class TestAMQPBackend(unittest.TestCase):
+
+    def setUp(self):
+        self._api = FakeManagementAPI(queue_count=20)
+        for i in xrange(1, 4):
+            self._api.get_queues('/').get('queue{:07d}'.format(i))['messages'] = i + 4
+        self._api.start()
+        self._amqp = FakeAMQPServer(self._api)
+        self._amqp.start()
+        self._queues = self._api.get_queues('/')
+
+    def tearDown(self):
+        self._amqp.stop()
+        self._api.stop()
+
+    def _get_backend(self, vhost='/', pipeline_size=8):
+        config = self._amqp.get_config()
+        return AMQPBackend(config['host'], int(config['amqp_port']), 'guest', 'guest', vhost,
+                           timeout=5, pipeline_size=pipeline_size)
+
+    def _get_chosen_queues(self, *names):
+        return [(i, name) for i, name in enumerate(names)]
+
+    def test_delete(self):
+        backend = self._get_backend()
+        chosen_queues = self._get_chosen_queues(*self._queues.names()[:15])
+        results = list(backend.iter_results('delete_queue', chosen_queues))
+        self.assertEqual(chosen_queues, [result[0] for result in results])
+        self.assertTrue(all(result[1] is None for result in results))
+        self.assertEqual(5, len(self._queues))
+        # the connection is reused
+        list(backend.iter_results('delete_queue', self._get_chosen_queues('queue0000019')))
+        self.assertEqual(1, self._amqp.connections)
+        backend.close()
+
+    def test_purge_missing_queue(self):
+        backend = self._get_backend()
+        chosen_queues = self._get_chosen_queues('queue0000001', 'missing', 'queue0000002',
+                                                'queue0000003')
+        results = list(backend.iter_results('purge_queue', chosen_queues))
+        self.assertEqual(chosen_queues, [result[0] for result in results])
+        self.assertEqual([None, 404, None, None],
+                         [result[1] and result[1].status for result in results])
+        self.assertEqual([5, None, 6, 7], [result[3] for result in results])
+        self.assertIsInstance(results[1][1], AMQPError)
+        for name in ['queue0000001', 'queue0000002', 'queue0000003']:
+            self.assertEqual(0, self._queues.get(name)['messages'])
+
+    def test_delete_missing_queue(self):
+        # the broker deletes missing queues successfully, they are
+        # found by passive declarations
+        backend = self._get_backend()
+        chosen_queues = self._get_chosen_queues('queue0000001', 'missing', 'queue0000002',
+                                                'missing2', 'queue0000003')
+        results = list(backend.iter_results('delete_queue', chosen_queues))
+        self.assertEqual(chosen_queues, [result[0] for result in results])
+        self.assertEqual([None, 404, None, 404, None],
+                         [result[1] and result[1].status for result in results])
+        self.assertEqual([5, None, 6, None, 7], [result[3] for result in results])
+        self.assertEqual(17, len(self._queues))
+        backend.close()
+
+    def test_server_errors(self):
+        self._amqp.error_rate = 0.5
+        backend = self._get_backend()
+        chosen_queues = self._get_chosen_queues(*self._queues.names())
+        results = list(backend.iter_results('purge_queue', chosen_queues))
+        self.assertEqual(20, len(results))
+        failed = [result[0][1] for result in results if result[1] is not None]
+        self.assertTrue(failed)
+        self.assertEqual(20, self._amqp.operations)
+        self.assertTrue(all(self._queues.get(name)['messages'] == 0
+                            for name in self._queues.names() if name not in failed))
+
+    def test_missing_vhost(self):
+        backend = self._get_backend(vhost='missing')
+        with self.assertRaises(AMQPError) as context:
+            list(backend.iter_results('delete_queue', self._get_chosen_queues('queue')))
+        self.assertEqual(530, context.exception.status)
+
+    def test_connection_refused(self):
+        backend = self._get_backend()
+        self._amqp.stop()
+        with self.assertRaises(NetworkError):
+            list(backend.iter_results('delete_queue', self._get_chosen_queues('queue')))
+        self._amqp.start()
+
+    def test_interrupted_iteration(self):
+        backend = self._get_backend(pipeline_size=4)
+        results = backend.iter_results('delete_queue',
+                                       self._get_chosen_queues(*self._queues.names()[:10]))
+        next(results)
+        results.close()
+        results = list(backend.iter_results('delete_queue',
+                                            self._get_chosen_queues('queue0000019')))
+        self.assertEqual([((0, 'queue0000019'), None)], [result[:2] for result in results])
+
+
+class TestMessageMover(unittest.TestCase):
+
+    def setUp(self):
+        self._api = FakeManagementAPI()
+        self._api.add_queue('/', 'source', messages=50)
+        self._api.add_queue('/', 'target', messages=2)
+        self._api.start()
+        self._amqp = FakeAMQPServer(self._api)
+        self._amqp.start()
+        self._queues = self._api.get_queues('/')
+
+    def tearDown(self):
+        self._amqp.stop()
+        self._api.stop()
+
+    def _get_mover(self, prefetch_count=8, **kwargs):
+        config = self._amqp.get_config()
+        return MessageMover(config['host'], int(config['amqp_port']), 'guest', 'guest', '/',
+                            timeout=5, prefetch_count=prefetch_count, **kwargs)
+
+    def _get_bodies(self, name):
+        return self._amqp.get_bodies('/', name)
+
+    def _move(self, mover, *args, **kwargs):
+        try:
+            return mover.move(*args, **kwargs)
+        finally:
+            mover.close()
+
+    def test_move_to_queue(self):
+        self._api.add_queue('/', 'source2', messages=50)
+        for source, confirm_multiple in [('source', False), ('source2', True)]:
+            self._amqp.confirm_multiple = confirm_multiple
+            expected_bodies = self._get_bodies('target') + self._get_bodies(source)
+            mover = self._get_mover(routing_key='target')
+            mover.check_target()
+            self.assertEqual(50, self._move(mover, source))
+            self.assertEqual(expected_bodies, self._get_bodies('target'))
+            self.assertEqual(0, self._queues.get(source)['messages'])
+            self.assertEqual(len(expected_bodies), self._queues.get('target')['messages'])
+
+    def test_large_messages(self):
+        self._api.add_queue('/', 'large')
+        bodies = ['a' * 300000, '', 'b' * 10]
+        for body in bodies:
+            self._amqp.publish('/', '', 'large', encode_message(body))
+        self.assertEqual(3, self._move(self._get_mover(prefetch_count=1, routing_key='target'),
+                                       'large'))
+        self.assertEqual(bodies, self._get_bodies('target')[2:])
+
+    def test_move_to_exchange(self):
+        self._api.add_queue('/', 'other')
+        self._amqp.add_exchange('fanout', ['target', 'other'])
+        self.assertEqual(50, self._move(self._get_mover(exchange='fanout'), 'source'))
+        self.assertEqual(50, len(self._get_bodies('other')))
+        self.assertEqual(52, len(self._get_bodies('target')))
+
+    def test_only_messages_in_queue_at_start(self):
+        mover = self._get_mover(routing_key='source')
+        self.assertEqual(50, self._move(mover, 'source'))
+        self.assertEqual(50, self._queues.get('source')['messages'])
+
+    def test_drain(self):
+        self._amqp.add_exchange('loop', ['source'])
+        self._api.add_queue('/', 'empty')
+        mover = self._get_mover(exchange='loop', routing_key='target')
+        self.assertEqual(0, self._move(mover, 'empty', drain=True))
+        mover = self._get_mover(routing_key='target')
+        self.assertEqual(50, self._move(mover, 'source', drain=True))
+        self.assertEqual(0, self._amqp.count_ready('/', 'source'))
+
+    def test_missing_queues(self):
+        with self.assertRaises(AMQPError) as context:
+            self._get_mover(routing_key='missing').check_target()
+        self.assertEqual(404, context.exception.status)
+        with self.assertRaises(AMQPError) as context:
+            self._get_mover(exchange='missing').check_target()
+        self.assertEqual(404, context.exception.status)
+        with self.assertRaises(AMQPError) as context:
+            self._move(self._get_mover(routing_key='target'), 'missing')
+        self.assertEqual(404, context.exception.status)
+
+    def test_unroutable_messages(self):
+        self._amqp.add_exchange('unbound', [])
+        mover = self._get_mover(exchange='unbound')
+        with self.assertRaises(AMQPError) as context:
+            mover.move('source')
+        self.assertEqual(312, context.exception.status)
+        # the connection can be used after the failure
+        mover.routing_key = 'target'
+        mover.exchange = ''
+        self._move(mover, 'source')
+        # messages are never lost
+        self.assertEqual(52, len(self._get_bodies('target')))
+        self.assertEqual(0, self._amqp.count_ready('/', 'source'))
@@ -1,11 +1,14 @@
+import time
 import unittest
 from collections import MutableMapping, MutableSequence
 
-from mock import MagicMock, Mock, patch, sentinel
+from mock import MagicMock, Mock, call, patch, sentinel
+from pyrabbit.http import HTTPError
 from unittest_expander import expand, foreach, param
 
 from rabbit_tools.delete import DelQueueTool
 from rabbit_tools.purge import PurgeQueueTool
+from rabbit_tools.selection import Selector
 
 
 tested_tools = [
@@ -121,7 +124,7 @@ class TestRabbitTools(unittest.TestCase):
         self._tested_tool = self.tool.__new__(self.tool)
         self._tested_tool.config = MagicMock()
         self._tested_tool.client = Mock()
-        self._tested_tool.client.get_queues.return_value = self.sample_get_queues_result
+        self._tested_tool.client.iter_queues.return_value = self.sample_get_queues_result
         self._tested_tool._parsed_args = Mock()
         self._tested_tool._vhost = sentinel.vhost
         self._tested_tool._method_to_call = Mock()
@@ -194,3 +197,75 @@ class TestRabbitTools(unittest.TestCase):
         with patch('__builtin__.raw_input', side_effect=['2', 'q']):
             self._tested_tool.run()
         self.assertFalse(self._tested_tool._method_to_call.called)
+
+    @foreach([1, 4])
+    def test_make_action_concurrency(self, concurrency):
+        self._tested_tool.concurrency = concurrency
+        client = Mock()
+        client.delete_queue.side_effect = client.purge_queue.side_effect = [
+            None, HTTPError({}, status=404), HTTPError({}, status=500), None]
+        self._tested_tool._method_to_call = getattr(client, self.tool.client_method_name)
+        with self.logger_patch:
+            result = self._tested_tool.make_action(self.sample_mapping)
+        self.assertEqual(4, getattr(client, self.tool.client_method_name).call_count)
+        self.assertEqual(3, len(result))
+        self.assertTrue(set(result).issubset(self.sample_mapping))
+
+    def test_queue_mapping_is_kept_between_choices(self):
+        self._tested_tool._parsed_args.queue_name = None
+        with patch('__builtin__.raw_input', side_effect=['1', '3', 'q']),\
+                self.logger_patch:
+            self._tested_tool.run()
+        self.assertEqual(1, self._tested_tool.client.iter_queues.call_count)
+        self.assertEqual(2, self._tested_tool._method_to_call.call_count)
+
+    def test_queue_mapping_refresh_command(self):
+        self._tested_tool._parsed_args.queue_name = None
+        with patch('__builtin__.raw_input', side_effect=['r', 'q']):
+            self._tested_tool.run()
+        self.assertEqual(2, self._tested_tool.client.iter_queues.call_count)
+        self.assertFalse(self._tested_tool._method_to_call.called)
+
+    def test_queue_mapping_outdated(self):
+        self._tested_tool.cache_ttl = 10
+        self._tested_tool._get_queue_mapping()
+        with patch('rabbit_tools.base.time.time', return_value=time.time() + 11):
+            self._tested_tool._get_queue_mapping()
+        self.assertEqual(2, self._tested_tool.client.iter_queues.call_count)
+
+    def test_queue_mapping_updated_after_action(self):
+        self._tested_tool._get_queue_mapping()
+        self._tested_tool._update_queue_mapping([1, 3])
+        mapping = self._tested_tool._get_queue_mapping()
+        if self.tool.do_remove_chosen_numbers:
+            self.assertEqual({2: 'queue2'}, mapping)
+        else:
+            self.assertEqual({1: 'queue1', 2: 'queue2', 3: 'queue3'}, mapping)
+        self.assertEqual(1, self._tested_tool.client.iter_queues.call_count)
+
+    def test_queue_numbers_stable_after_refresh(self):
+        self._tested_tool._get_queue_mapping()
+        self._tested_tool.client.iter_queues.return_value = [
+            {'name': 'queue0'},
+            {'name': 'queue3'},
+        ]
+        mapping = self._tested_tool._get_queue_mapping(refresh=True)
+        self.assertEqual({3: 'queue3', 4: 'queue0'}, dict(mapping))
+
+    def test_selection_from_args(self):
+        self._tested_tool._parsed_args.queue_name = []
+        self._tested_tool._selector = Selector('re:^queue[13]$')
+        with self.logger_patch:
+            self._tested_tool.run()
+        self._tested_tool.client.iter_queues.assert_called_once_with(
+            sentinel.vhost, columns=['name'], disable_stats=True, name_regex='^queue[13]$')
+        self.assertItemsEqual([call(sentinel.vhost, 'queue1'), call(sentinel.vhost, 'queue3')],
+                              self._tested_tool._method_to_call.call_args_list)
+
+    def test_selection_chosen_by_user(self):
+        self._tested_tool._parsed_args.queue_name = None
+        with patch('__builtin__.raw_input', side_effect=['re:[23]$', 'q']),\
+                self.logger_patch:
+            self._tested_tool.run()
+        self.assertItemsEqual([call(sentinel.vhost, 'queue2'), call(sentinel.vhost, 'queue3')],
+                              self._tested_tool._method_to_call.call_args_list)
@@ -0,0 +1,179 @@
+import threading
+import time
+import unittest
+
+from mock import patch
+
+from rabbit_tools.executor import (
+    AIMDLimiter,
+    BoundedExecutor,
+    PartitionedExecutor,
+    RateLimiter,
+    get_backoff_delay,
+)
+
+
+class TestBoundedExecutor(unittest.TestCase):
+
+    def test_map_unordered(self):
+        results = BoundedExecutor(4).map_unordered(lambda x: x * 2, xrange(20))
+        self.assertItemsEqual([(i, i * 2, None) for i in xrange(20)], list(results))
+
+    def test_exception_in_func(self):
+        results = list(BoundedExecutor(2).map_unordered(lambda x: 1 / x, [0, 1]))
+        failed = [result for result in results if result[2] is not None]
+        self.assertEqual(1, len(failed))
+        self.assertIs(ZeroDivisionError, failed[0][2][0])
+
+    def test_stop_after_failure(self):
+        calls = []
+        consumer_stopped = threading.Event()
+
+        def items():
+            yield 0
+            # the next items are available, when the consumer has stopped
+            consumer_stopped.wait()
+            for i in xrange(1, 100):
+                yield i
+
+        def func(item):
+            calls.append(item)
+            raise IOError('network error')
+
+        results = BoundedExecutor(4).map_unordered(func, items())
+        for _, _, exc_info in results:
+            if exc_info is not None:
+                results.close()
+                break
+        consumer_stopped.set()
+        time.sleep(0.1)
+        self.assertEqual([0], calls)
+
+
+class TestPartitionedExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._max_in_flight = {}
+
+    def _func(self, item):
+        partition = item[0]
+        with self._lock:
+            count = self._in_flight[partition] = self._in_flight.get(partition, 0) + 1
+            self._max_in_flight[partition] = max(self._max_in_flight.get(partition, 0), count)
+        time.sleep(0.001)
+        with self._lock:
+            self._in_flight[partition] -= 1
+        return item
+
+    def test_partition_concurrency(self):
+        # most of the items belong to the partition "a"
+        items = [('a', i) for i in xrange(40)] + [('b', i) for i in xrange(10)]
+        executor = PartitionedExecutor(6, 2, max_pending=100)
+        results = list(executor.map_unordered(self._func, items, lambda item: item[0]))
+        self.assertItemsEqual([(item, item, None) for item in items], results)
+        self.assertEqual({'a': 2, 'b': 2}, self._max_in_flight)
+
+    def test_least_busy_partition_first(self):
+        items = [('a', 1), ('a', 2), ('b', 1), ('c', 1)]
+        executor = PartitionedExecutor(3, 3)
+        started = []
+        results = executor.map_unordered(lambda item: started.append(item) or item, items,
+                                         lambda item: item[0])
+        self.assertEqual(4, len(list(results)))
+        self.assertEqual([('a', 1), ('b', 1), ('c', 1)], sorted(started[:3]))
+
+    def test_max_pending(self):
+        taken = []
+
+        def iter_items():
+            for i in xrange(10):
+                taken.append(i)
+                yield ('a', i)
+
+        executor = PartitionedExecutor(4, 1, max_pending=2)
+        results = executor.map_unordered(lambda item: item, iter_items(), lambda item: item[0])
+        next(results)
+        self.assertLessEqual(len(taken), 4)
+        self.assertEqual(9, len(list(results)))
+
+    def test_exception_in_items(self):
+        def iter_items():
+            yield ('a', 1)
+            raise ValueError
+
+        executor = PartitionedExecutor(2, 1)
+        with self.assertRaises(ValueError):
+            list(executor.map_unordered(lambda item: item, iter_items(), lambda item: item[0]))
+
+
+class TestAIMDLimiter(unittest.TestCase):
+
+    def _run(self, limiter, latency, overloaded=False):
+        limiter.acquire()
+        limiter.release(latency, overloaded)
+
+    def test_slow_start(self):
+        limiter = AIMDLimiter(8)
+        self.assertEqual(1, limiter.limit)
+        for _ in xrange(3):
+            self._run(limiter, 0.001)
+        self.assertEqual(4, limiter.limit)
+        for _ in xrange(10):
+            self._run(limiter, 0.001)
+        self.assertEqual(8, limiter.limit)
+
+    @patch('rabbit_tools.executor.time.time', return_value=100)
+    def test_decrease_on_overload(self, time_mock):
+        limiter = AIMDLimiter(16)
+        for _ in xrange(7):
+            self._run(limiter, 0.001)
+        self._run(limiter, 0.001, overloaded=True)
+        self.assertEqual(4, limiter.limit)
+        # no second decrease within the latency of the operation
+        self._run(limiter, 0.001, overloaded=True)
+        self.assertEqual(4, limiter.limit)
+        # additive increase after the first decrease
+        self._run(limiter, 0.001)
+        self.assertEqual(4.25, limiter.limit)
+
+    @patch('rabbit_tools.executor.time.time', return_value=100)
+    def test_decrease_on_high_latency(self, time_mock):
+        limiter = AIMDLimiter(16)
+        for _ in xrange(3):
+            self._run(limiter, 0.02)
+        self.assertEqual(4, limiter.limit)
+        self._run(limiter, 0.03)
+        self.assertEqual(5, limiter.limit)
+        self._run(limiter, 0.05)
+        self.assertEqual(2.5, limiter.limit)
+
+    def test_min_limit(self):
+        limiter = AIMDLimiter(16, min_limit=2)
+        self._run(limiter, 0.001, overloaded=True)
+        self.assertEqual(2, limiter.limit)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    @patch('rabbit_tools.executor.time.sleep')
+    @patch('rabbit_tools.executor.time.time', return_value=100)
+    def test_wait(self, time_mock, sleep_mock):
+        limiter = RateLimiter(4)
+        for _ in xrange(3):
+            limiter.wait()
+        self.assertEqual([((0.25,),), ((0.5,),)], sleep_mock.call_args_list)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            RateLimiter(0)
+
+
+class TestBackoff(unittest.TestCase):
+
+    def test_get_backoff_delay(self):
+        for attempt in xrange(10):
+            delay = get_backoff_delay(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(10, 0.1 * 2 ** attempt))
@@ -0,0 +1,52 @@
+import unittest
+from collections import MutableMapping
+
+from rabbit_tools.index import QueueIndex
+
+
+class TestQueueIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._index = QueueIndex(['queue1', 'queue2', 'queue3'])
+
+    def test_numbers(self):
+        self.assertIsInstance(self._index, MutableMapping)
+        self.assertEqual({1: 'queue1', 2: 'queue2', 3: 'queue3'}, dict(self._index))
+        self.assertEqual(2, self._index.get_number('queue2'))
+        self.assertIsNone(self._index.get_number('queue4'))
+
+    def test_skipped_numbers(self):
+        index = QueueIndex(['queue1', 'queue2', 'queue3'], skipped_numbers={2, 4})
+        self.assertEqual({1: 'queue1', 3: 'queue2', 5: 'queue3'}, dict(index))
+        self.assertEqual(6, index.add('queue4'))
+
+    def test_removed_number_is_not_reused(self):
+        del self._index[2]
+        self.assertNotIn(2, self._index)
+        self.assertEqual(2, len(self._index))
+        self.assertEqual(4, self._index.add('queue2'))
+        with self.assertRaises(KeyError):
+            self._index[2]
+
+    def test_add_existing_name(self):
+        self.assertEqual(3, self._index.add('queue3'))
+        self.assertEqual(3, len(self._index))
+
+    def test_sync(self):
+        self._index.sync(['queue0', 'queue3', 'queue1'])
+        self.assertEqual({1: 'queue1', 3: 'queue3', 4: 'queue0'}, dict(self._index))
+        self.assertIsNone(self._index.get_number('queue2'))
+
+    def test_setitem(self):
+        self._index[7] = 'queue7'
+        self.assertEqual('queue7', self._index[7])
+        self.assertEqual([1, 2, 3, 7], list(self._index))
+        self.assertEqual(8, self._index.add('queue8'))
+        with self.assertRaises(ValueError):
+            self._index[9] = 'queue1'
+
+    def test_wrong_numbers(self):
+        for number in [0, -1, 4]:
+            self.assertNotIn(number, self._index)
+            with self.assertRaises(KeyError):
+                self._index[number]
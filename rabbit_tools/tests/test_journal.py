@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from rabbit_tools.journal import Journal
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._temp_dir, 'journal')
+
+    def tearDown(self):
+        shutil.rmtree(self._temp_dir)
+
+    def test_resume(self):
+        journal = Journal(self._path)
+        keys = [Journal.get_key(None, '/', 'queue1'),
+                Journal.get_key('eu', 'a/b', u'kolejka ł'),
+                Journal.get_key(None, '/', 'queue\nwith a line break')]
+        for key in keys:
+            journal.add(key)
+        journal.close()
+        journal = Journal(self._path, resume=True)
+        self.assertEqual(set(keys[:2]), journal.completed)
+        self.assertTrue(journal.is_completed(Journal.get_key(None, '/', 'queue1')))
+        self.assertFalse(journal.is_completed(Journal.get_key('eu', '/', 'queue1')))
+        journal.add(Journal.get_key(None, '/', 'queue2'))
+        journal.close()
+        self.assertEqual(3, len(Journal(self._path, resume=True).completed))
+
+    def test_partially_written_line(self):
+        with open(self._path, 'w') as journal_file:
+            journal_file.write('\t%2F\tqueue1\n\t%2F\tque')
+        journal = Journal(self._path, resume=True)
+        self.assertEqual({'\t%2F\tqueue1'}, journal.completed)
+        journal.add('\t%2F\tqueue2')
+        journal.close()
+        self.assertEqual({'\t%2F\tqueue1', '\t%2F\tqueue2'},
+                         Journal(self._path, resume=True).completed)
+
+    def test_missing_journal(self):
+        self.assertEqual(set(), Journal(self._path, resume=True).completed)
+        self.assertTrue(os.path.exists(self._path))
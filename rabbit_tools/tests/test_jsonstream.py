@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+
+from unittest_expander import expand, foreach
+
+from rabbit_tools.jsonstream import JSONArrayStream
+
+
+def _split(data, chunk_size):
+    return [data[i:i + chunk_size] for i in xrange(0, len(data), chunk_size)]
+
+
+@expand
+class TestJSONArrayStream(unittest.TestCase):
+
+    sample_queues = [
+        {'name': 'queue1', 'messages': 12, 'node': 'rabbit@node1'},
+        {'name': u'kolejka ąę', 'messages': 1234567, 'node': 'rabbit@node2'},
+        {'name': 'queue "3"', 'messages': 0, 'arguments': {'x-max-length': [1, 2]}},
+    ]
+
+    @foreach([1, 2, 3, 7, 64, 100000])
+    def test_array(self, chunk_size):
+        data = json.dumps(self.sample_queues, ensure_ascii=False).encode('utf-8')
+        stream = JSONArrayStream(_split(data, chunk_size))
+        self.assertEqual(self.sample_queues, list(stream))
+        self.assertTrue(stream.is_list)
+
+    @foreach([1, 2, 3, 7, 64, 100000])
+    def test_paginated_object(self, chunk_size):
+        data = json.dumps({
+            'filtered_count': 3,
+            'items': self.sample_queues,
+            'page': 1,
+            'page_count': 12345,
+        }, indent=2)
+        stream = JSONArrayStream(_split(data, chunk_size), fields=['name', 'node'])
+        self.assertEqual([
+            {'name': 'queue1', 'node': 'rabbit@node1'},
+            {'name': u'kolejka ąę', 'node': 'rabbit@node2'},
+            {'name': 'queue "3"'},
+        ], list(stream))
+        self.assertFalse(stream.is_list)
+        self.assertEqual({'filtered_count': 3, 'page': 1, 'page_count': 12345},
+                         stream.attributes)
+
+    @foreach(['[]', ' [ ] ', '{}', '{"items": [], "page_count": 1}'])
+    def test_empty(self, data):
+        self.assertEqual([], list(JSONArrayStream(_split(data, 1))))
+
+    def test_items_yielded_before_whole_document_is_read(self):
+        chunks = iter(_split(json.dumps(self.sample_queues), 10))
+        stream = iter(JSONArrayStream(chunks))
+        self.assertEqual(self.sample_queues[0], next(stream))
+        self.assertTrue(list(chunks))
+
+    @foreach(['[{"name": "queue1"}', '[{"name": "queue1"} {}]', 'null', '[{"name": '])
+    def test_invalid(self, data):
+        with self.assertRaises(ValueError):
+            list(JSONArrayStream(_split(data, 4)))
@@ -0,0 +1,21 @@
+import unittest
+from StringIO import StringIO
+
+from rabbit_tools.lib import iter_unique_lines
+
+
+class TestIterUniqueLines(unittest.TestCase):
+
+    def test_skips_repeated_and_empty_lines(self):
+        stream = StringIO('queue1\n  queue2 \n\nqueue1\nqueue3\r\nqueue2\n')
+        self.assertEqual(['queue1', 'queue2', 'queue3'], list(iter_unique_lines(stream)))
+
+    def test_window(self):
+        stream = StringIO('a\nb\nc\na\nc\n')
+        self.assertEqual(['a', 'b', 'c', 'a'], list(iter_unique_lines(stream, window=2)))
+
+    def test_lazy(self):
+        stream = StringIO('a\nb\n')
+        lines = iter_unique_lines(stream)
+        self.assertEqual('a', next(lines))
+        self.assertEqual(2, stream.tell())
@@ -0,0 +1,145 @@
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mock import patch
+
+from rabbit_tools.lib import log_exceptions
+from rabbit_tools.logs import (
+    PER_QUEUE,
+    BackgroundLogWriter,
+    flush_background_logging,
+)
+
+
+class _ListHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    @property
+    def messages(self):
+        return [self.format(record) for record in self.records]
+
+
+class TestBackgroundLogWriter(unittest.TestCase):
+
+    def setUp(self):
+        self._logger = logging.getLogger('rabbit_tools.tests.test_logs')
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._handler = _ListHandler()
+        self._logger.addHandler(self._handler)
+
+    def tearDown(self):
+        self._logger.removeHandler(self._handler)
+
+    def test_coalesce_per_queue_messages(self):
+        writer = BackgroundLogWriter(self._logger, burst=3)
+        writer.start()
+        for i in xrange(100):
+            self._logger.error('Queue %r does not exist.', 'queue{}'.format(i), extra=PER_QUEUE)
+            self._logger.warning('Cannot delete queue: %r.', 'queue{}'.format(i),
+                                 extra=PER_QUEUE)
+        self._logger.info('Successfully deleted queues: %s', 'queue0')
+        self._logger.info('Successfully deleted queues: %s', 'queue1')
+        writer.stop()
+        self.assertEqual(["Queue 'queue0' does not exist.",
+                          "Cannot delete queue: 'queue0'.",
+                          "Queue 'queue1' does not exist.",
+                          "Cannot delete queue: 'queue1'.",
+                          "Queue 'queue2' does not exist.",
+                          "Cannot delete queue: 'queue2'.",
+                          'Successfully deleted queues: queue0',
+                          'Successfully deleted queues: queue1'],
+                         self._handler.messages[:8])
+        self.assertItemsEqual(["97 more similar messages, e.g.: Queue 'queue99' does not exist.",
+                               "97 more similar messages, e.g.: Cannot delete queue: 'queue99'."],
+                              self._handler.messages[8:])
+        self.assertEqual([logging.ERROR, logging.WARNING],
+                         sorted(record.levelno for record in self._handler.records[8:])[::-1])
+        # handlers are given back
+        self.assertEqual([self._handler], self._logger.handlers)
+
+    def test_summary_after_interval(self):
+        writer = BackgroundLogWriter(self._logger, interval=0.05, burst=1)
+        writer.start()
+        try:
+            for i in xrange(3):
+                self._logger.error('Queue %r does not exist.', i, extra=PER_QUEUE)
+            time.sleep(0.2)
+            flush_background_logging(self._logger)
+            self.assertEqual(["Queue 0 does not exist.",
+                              "2 more similar messages, e.g.: Queue 2 does not exist."],
+                             self._handler.messages)
+            self._logger.error('Queue %r does not exist.', 3, extra=PER_QUEUE)
+        finally:
+            writer.stop()
+        self.assertEqual('Queue 3 does not exist.', self._handler.messages[-1])
+
+    def test_exception(self):
+        writer = BackgroundLogWriter(self._logger)
+        writer.start()
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            self._logger.exception('Failed')
+        writer.stop()
+        self.assertIn('ZeroDivisionError', self._handler.messages[0])
+
+
+class TestLogExceptions(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.mkdtemp()
+        self._log_path = os.path.join(self._temp_dir, 'tools.log')
+        self._root_logger = logging.getLogger()
+        self._root_handlers = list(self._root_logger.handlers)
+        self._root_level = self._root_logger.level
+
+    def tearDown(self):
+        for handler in list(self._root_logger.handlers):
+            self._root_logger.removeHandler(handler)
+            if handler not in self._root_handlers:
+                handler.close()
+        for handler in self._root_handlers:
+            self._root_logger.addHandler(handler)
+        self._root_logger.setLevel(self._root_level)
+        shutil.rmtree(self._temp_dir)
+
+    def _write_config(self, name, handler_args):
+        path = os.path.join(self._temp_dir, name)
+        with open(path, 'w') as config_file:
+            config_file.write('[loggers]\nkeys=root\n'
+                              '[logger_root]\nlevel=INFO\nhandlers=file\n'
+                              '[handlers]\nkeys=file\n'
+                              '[handler_file]\nclass=FileHandler\nformatter=simple\n'
+                              'args={}\n'
+                              '[formatters]\nkeys=simple\n'
+                              '[formatter_simple]\nformat=%(levelname)s - %(message)s\n'
+                              .format(handler_args))
+        return path
+
+    def test_config_files(self):
+        # the user's file overrides the system-wide one
+        config_paths = [self._write_config('etc.conf', "('/nonexistent/tools.log',)"),
+                        self._write_config('home.conf', repr((self._log_path,)))]
+        with patch('rabbit_tools.config.CONFIG_PATHS', config_paths):
+            with log_exceptions():
+                logging.getLogger('rabbit_tools.base').info('Successfully purged queues: q')
+        with open(self._log_path) as log_file:
+            self.assertEqual('INFO - Successfully purged queues: q\n', log_file.read())
+
+    def test_missing_config_files(self):
+        with patch('rabbit_tools.config.CONFIG_PATHS', [os.path.join(self._temp_dir, 'no')]), \
+                patch('logging.basicConfig') as basic_config_mock:
+            with log_exceptions():
+                pass
+        self.assertTrue(basic_config_mock.called)
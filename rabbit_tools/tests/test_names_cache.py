@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from mock import patch
+
+from rabbit_tools.delete import DelQueueTool
+from rabbit_tools.names_cache import (
+    NamesCache,
+    main,
+    refresh,
+    refresh_in_background,
+    remove_names,
+)
+from rabbit_tools.purge import PurgeQueueTool
+from rabbit_tools.tests.fake_api import FakeManagementAPI
+
+
+class TestNamesCache(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.mkdtemp()
+        self._cache = NamesCache(None, '/', os.path.join(self._temp_dir, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self._temp_dir)
+
+    def test_iter_names(self):
+        names = ['queue.{}'.format(i) for i in xrange(1000)] + ['a', 'b', 'queue', u'kolejka ł',
+                                                                 'with\nline break', 'a']
+        self._cache.write(names)
+        self.assertEqual(['queue.1', 'queue.10', 'queue.100', 'queue.101'],
+                         list(self._cache.iter_names('queue.1'))[:4])
+        self.assertEqual(111, len(list(self._cache.iter_names('queue.1'))))
+        self.assertEqual(['a'], list(self._cache.iter_names('a')))
+        self.assertEqual([u'kolejka ł'.encode('utf-8')], list(self._cache.iter_names(u'kol')))
+        self.assertEqual([], list(self._cache.iter_names('queue.9999')))
+        self.assertEqual([], list(self._cache.iter_names('z')))
+        self.assertEqual(1004, len(list(self._cache.iter_names())))
+
+    def test_missing_or_empty(self):
+        self.assertEqual([], list(self._cache.iter_names('a')))
+        self.assertFalse(self._cache.is_fresh(10))
+        self._cache.write([])
+        self.assertEqual([], list(self._cache.iter_names('a')))
+        self.assertTrue(self._cache.is_fresh(10))
+
+    def test_remove(self):
+        self._cache.remove(['a'])
+        self.assertFalse(os.path.exists(self._cache.path))
+        self._cache.write(['a', 'b', u'kolejka ł', 'c'])
+        os.utime(self._cache.path, (1000, 1000))
+        remove_names({(None, '/'): {'b', u'kolejka ł', 'd'}},
+                     os.path.dirname(self._cache.path))
+        self.assertEqual(['a', 'c'], list(self._cache.iter_names()))
+        # the time of writing the cache is kept
+        self.assertEqual(1000, os.path.getmtime(self._cache.path))
+
+    @patch('rabbit_tools.names_cache.subprocess.Popen')
+    def test_refresh_in_background(self, popen_mock):
+        directory = os.path.dirname(self._cache.path)
+        self._cache.write(['a'])
+        refresh_in_background([(None, '/'), ('eu', 'a/b')], 10, directory)
+        self.assertEqual(1, popen_mock.call_count)
+        argv = popen_mock.call_args[0][0]
+        self.assertEqual(['--target', 'eu', 'a/b'], argv[-3:])
+        refresh_in_background([(None, '/')], 10, directory)
+        self.assertEqual(1, popen_mock.call_count)
+        refresh_in_background([(None, '/')], 0, directory)
+        self.assertEqual(2, popen_mock.call_count)
+
+    def test_refresh(self):
+        directory = os.path.dirname(self._cache.path)
+        with FakeManagementAPI(queue_count=20) as api:
+            api.add_queue('a', 'tmp.1')
+            refresh([(None, '/'), ('eu', 'a')], directory, config=api.get_config(),
+                    cluster_configs={'eu': {}})
+        self.assertEqual(20, len(list(self._cache.iter_names('queue'))))
+        self.assertEqual(['tmp.1'], list(NamesCache('eu', 'a', directory).iter_names()))
+        with patch('sys.stdout', StringIO()) as stdout:
+            main(['--cache-dir', directory, '--vhost', 'a', '--cluster', 'eu', 'tmp'])
+        self.assertEqual('tmp.1\n', stdout.getvalue())
+
+
+class TestToolsRefreshingNamesCache(unittest.TestCase):
+
+    config = {'host': '127.0.0.1', 'port': '15672', 'user': 'guest', 'password': 'guest',
+              'vhost': '/'}
+
+    def test_targets(self):
+        tool = PurgeQueueTool(config=self.config, argv=['q'])
+        self.assertEqual([(None, '/')], tool._get_names_cache_targets())
+        tool = PurgeQueueTool(config=self.config,
+                              argv=['q', '--cluster', 'eu,us', '--vhost', 'a,b'],
+                              cluster_configs={'eu': {}, 'us': {}})
+        self.assertItemsEqual([('eu', 'a'), ('eu', 'b'), ('us', 'a'), ('us', 'b')],
+                              tool._get_names_cache_targets())
+        tool = PurgeQueueTool(config=self.config, argv=['q', '--cluster', 'eu'],
+                              cluster_configs={'eu': {'vhost': 'a'}})
+        self.assertEqual([('eu', 'a')], tool._get_names_cache_targets())
+
+    @patch('rabbit_tools.names_cache.remove_names')
+    @patch('rabbit_tools.names_cache.refresh_in_background')
+    def test_refresh_after_run(self, refresh_mock, remove_mock):
+        removed = self._record_removed(remove_mock)
+        with FakeManagementAPI(queue_count=5) as api:
+            tool = PurgeQueueTool(config=api.get_config(), argv=['queue0000001'])
+            tool.run()
+            # the config has not been read from the config file
+            self.assertFalse(refresh_mock.called)
+            tool.refresh_names_cache = True
+            tool.run()
+            refresh_mock.assert_called_once_with([(None, '/')], 300)
+            self.assertFalse(remove_mock.called)
+            tool = DelQueueTool(config=dict(api.get_config(), names_cache_ttl='60'),
+                                argv=['queue0000001', 'queue0000009'])
+            tool.refresh_names_cache = True
+            tool.run()
+            # deleted (and missing) queues are removed from the cache at once,
+            # without listing queues again
+            self.assertEqual([{(None, '/'): {'queue0000001', 'queue0000009'}}], removed)
+            refresh_mock.assert_called_with([(None, '/')], 60)
+            tool = DelQueueTool(config=dict(api.get_config(), names_cache_ttl='0'),
+                                argv=['queue0000002'])
+            tool.refresh_names_cache = True
+            tool.run()
+            self.assertEqual(2, refresh_mock.call_count)
+            self.assertEqual(1, remove_mock.call_count)
+
+    @staticmethod
+    def _record_removed(remove_mock):
+        # the dict of deleted names is cleared after the call
+        removed = []
+        remove_mock.side_effect = lambda deleted_names: removed.append(
+            {target: set(names) for target, names in deleted_names.iteritems()})
+        return removed
+
+    @patch('rabbit_tools.names_cache.remove_names')
+    @patch('rabbit_tools.names_cache.refresh_in_background')
+    def test_remove_after_polls(self, refresh_mock, remove_mock):
+        removed = self._record_removed(remove_mock)
+        with FakeManagementAPI(queue_count=5) as api:
+            api.add_queue('/', 'tmp.1')
+            tool = DelQueueTool(config=api.get_config(),
+                                argv=['--watch', '60', '--select', 'glob:tmp.*'])
+            tool.refresh_names_cache = True
+            tool.max_polls = 3
+            with patch('time.sleep', side_effect=lambda seconds: api.add_queue('/', 'tmp.2')), \
+                    patch('rabbit_tools.base.logger'):
+                tool.run()
+        # names are removed after each poll deleting queues, not kept until the end
+        self.assertEqual([{(None, '/'): {'tmp.1'}}, {(None, '/'): {'tmp.2'}},
+                          {(None, '/'): {'tmp.2'}}], removed)
+        self.assertEqual({}, tool._deleted_names)
+        refresh_mock.assert_called_once_with([(None, '/')], 300)
@@ -0,0 +1,69 @@
+import unittest
+
+from mock import patch
+
+from rabbit_tools.index import QueueIndex
+from rabbit_tools.picker import QueuePicker
+
+
+class TestQueuePicker(unittest.TestCase):
+
+    def setUp(self):
+        self._mapping = QueueIndex(['queue{}'.format(i) for i in xrange(1, 26)] +
+                                   ['tmp.load.1', 'tmp.load.2', 'tmp.other'])
+        self._picker = QueuePicker(page_size=10)
+        self._printed = []
+
+    def _get_input(self, *inputs):
+        with patch('__builtin__.raw_input', side_effect=inputs),\
+                patch.object(self._picker, '_render', side_effect=self._render):
+            return self._picker.get_input(self._mapping, 'prompt: ')
+
+    def _render(self, mapping):
+        self._printed.append(list(QueuePicker._iter_page(self._picker, mapping)))
+
+    def _shown_numbers(self, page_number=-1):
+        return [nr for nr, _ in self._printed[page_number]]
+
+    def test_first_page(self):
+        self.assertEqual('1', self._get_input('1'))
+        self.assertEqual(range(1, 11), self._shown_numbers())
+
+    def test_next_and_previous_pages(self):
+        self.assertEqual('all', self._get_input('n', 'n', 'n', 'n', 'p', 'all'))
+        self.assertEqual(range(11, 21), self._shown_numbers(1))
+        self.assertEqual(range(21, 29), self._shown_numbers(2))
+        self.assertEqual(range(21, 29), self._shown_numbers(3))
+        self.assertEqual(range(11, 21), self._shown_numbers(5))
+
+    def test_pages_skip_removed_queues(self):
+        for nr in xrange(5, 16):
+            del self._mapping[nr]
+        self._get_input('n', '1')
+        self.assertEqual(range(1, 5) + range(16, 22), self._shown_numbers(0))
+        self.assertEqual(range(22, 29), self._shown_numbers(1))
+
+    def test_search(self):
+        self.assertEqual('q', self._get_input('/TMP', '/tmp.load', 'q'))
+        self.assertEqual([26, 27, 28], self._shown_numbers(1))
+        self.assertEqual([26, 27], self._shown_numbers(2))
+        self.assertEqual({26: 'tmp.load.1', 27: 'tmp.load.2'},
+                         self._picker.filter_mapping(self._mapping))
+
+    def test_search_narrows_previous_results(self):
+        self._get_input('/queue', 'q')
+        with patch.object(self._mapping, 'iteritems') as iteritems_mock:
+            self._get_input('/queue2', 'q')
+        self.assertFalse(iteritems_mock.called)
+        self.assertEqual([2] + range(20, 26), self._shown_numbers())
+
+    def test_search_pages(self):
+        self._get_input('/queue', 'n', 'n', 'n', 'q')
+        self.assertEqual(range(11, 21), self._shown_numbers(2))
+        self.assertEqual(range(21, 26), self._shown_numbers(3))
+        self.assertEqual(range(21, 26), self._shown_numbers(4))
+
+    def test_clear_search(self):
+        self._get_input('/tmp', '/', 'q')
+        self.assertEqual(range(1, 11), self._shown_numbers())
+        self.assertIs(self._mapping, self._picker.filter_mapping(self._mapping))
@@ -0,0 +1,82 @@
+import time
+import unittest
+
+from mock import patch
+from unittest_expander import expand, foreach, param
+
+from rabbit_tools.selection import (
+    SelectionError,
+    Selector,
+)
+
+
+@expand
+class TestSelector(unittest.TestCase):
+
+    sample_queues = [
+        {'name': 'tmp.loadtest.1', 'messages': 2000000, 'consumers': 0,
+         'idle_since': '2017-01-01 10:00:00'},
+        {'name': 'tmp.loadtest.2', 'messages': 10, 'consumers': 0,
+         'idle_since': '2017-01-01T11:30:00.000+00:00'},
+        {'name': 'tmp.other', 'messages': 5000000, 'consumers': 2},
+        {'name': 'parsed', 'messages': 3000, 'consumers': 1},
+        {'name': 'down'},
+    ]
+
+    # 2017-01-01 12:00:00 UTC
+    now = 1483272000
+
+    selections_to_expected_names = [
+        param(expression=r're:^tmp\.loadtest\..*',
+              expected_names=['tmp.loadtest.1', 'tmp.loadtest.2']),
+        param(expression='glob:tmp.*',
+              expected_names=['tmp.loadtest.1', 'tmp.loadtest.2', 'tmp.other']),
+        param(expression='glob:tmp?other', expected_names=['tmp.other']),
+        param(expression='consumers=0 messages>1M', expected_names=['tmp.loadtest.1']),
+        param(expression='messages>=3k  consumers!=0',
+              expected_names=['tmp.other', 'parsed']),
+        param(expression='glob:tmp.* idle>1h', expected_names=['tmp.loadtest.1']),
+        param(expression='idle<1h',
+              expected_names=['tmp.loadtest.2', 'tmp.other', 'parsed', 'down']),
+        param(expression='re:load re:2$', expected_names=['tmp.loadtest.2']),
+    ]
+
+    @foreach(selections_to_expected_names)
+    def test_matches(self, expression, expected_names):
+        selector = Selector(expression)
+        with patch('rabbit_tools.selection.time.time', return_value=self.now):
+            names = [queue['name'] for queue in self.sample_queues if selector.matches(queue)]
+        self.assertEqual(expected_names, names)
+
+    def test_columns_and_name_regex(self):
+        selector = Selector('glob:tmp.* re:load consumers=0 messages>1 messages<5 idle>1d')
+        self.assertEqual(['name', 'consumers', 'messages', 'idle_since'], selector.columns)
+        self.assertTrue(selector.needs_stats)
+        self.assertEqual(r'^tmp\..*$', selector.name_regex)
+
+    def test_name_only(self):
+        selector = Selector('re:^tmp')
+        self.assertEqual(['name'], selector.columns)
+        self.assertFalse(selector.needs_stats)
+
+    @foreach(['', '   ', 'msgs>1', 'messages>', 'messages>abc', 're:(', 'messages'])
+    def test_wrong_selection(self, expression):
+        with self.assertRaises(SelectionError):
+            Selector(expression)
+
+    @foreach([
+        param(expression='re:^tmp', expected=True),
+        param(expression=' glob:* ', expected=True),
+        param(expression='messages>1M', expected=True),
+        param(expression='1', expected=False),
+        param(expression='1-3', expected=False),
+        param(expression='1, 2,3', expected=False),
+        param(expression='all', expected=False),
+        param(expression='', expected=False),
+    ])
+    def test_is_selection(self, expression, expected):
+        self.assertEqual(expected, Selector.is_selection(expression))
+
+    def test_idle_time_is_not_negative_for_now(self):
+        queue = {'name': 'q', 'idle_since': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())}
+        self.assertTrue(Selector('idle<1m').matches(queue))
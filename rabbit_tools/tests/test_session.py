@@ -0,0 +1,129 @@
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from rabbit_tools.session import (
+    Session,
+    SessionError,
+)
+from rabbit_tools.shell import run_in_session
+from rabbit_tools.tests.fake_api import FakeManagementAPI
+
+
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        self._api = FakeManagementAPI(queue_count=10, seed=1)
+        self._api.start()
+        self._queues = self._api.get_queues('/')
+        self._temp_dir = tempfile.mkdtemp()
+        self._socket_path = os.path.join(self._temp_dir, 'session', 'session.sock')
+        self._session = Session(self._api.get_config(), self._socket_path)
+        self._session.start()
+        self._tools_logger = logging.getLogger('rabbit_tools')
+        self._log_level = self._tools_logger.level
+        self._tools_logger.setLevel(logging.INFO)
+
+    def tearDown(self):
+        self._tools_logger.setLevel(self._log_level)
+        self._session.stop()
+        self._api.stop()
+        shutil.rmtree(self._temp_dir)
+
+    def _run(self, tool_name, argv):
+        stdout = StringIO()
+        stderr = StringIO()
+        status = run_in_session(self._socket_path, tool_name, argv, stdout, stderr)
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def test_purge(self):
+        status, _, stderr = self._run('purge', ['queue0000001'])
+        self.assertEqual(0, status)
+        self.assertEqual(0, self._queues.get('queue0000001')['messages'])
+        self.assertIn('INFO - Successfully purged queues: queue0000001', stderr)
+        # only the user can connect
+        self.assertEqual(0, os.stat(self._socket_path).st_mode & 0o077)
+
+    def test_cached_queue_list(self):
+        self._run('purge', ['all'])
+        listing_requests = self._api.requests['GET']
+        self._queues.get('queue0000001')['messages'] = 10
+        self._run('purge', ['all'])
+        self.assertEqual(listing_requests, self._api.requests['GET'])
+        self.assertEqual(0, self._queues.get('queue0000001')['messages'])
+        # deleted queues are removed from lists
+        self._run('del', ['queue0000001'])
+        status, _, stderr = self._run('purge', ['all'])
+        self.assertEqual(0, status)
+        self.assertNotIn('does not exist', stderr)
+        self.assertGreater(self._api.requests['GET'], listing_requests)
+
+    def test_client_kept_open(self):
+        for name in ['queue0000001', 'queue0000002', 'queue0000003']:
+            self._run('purge', [name])
+        self.assertEqual(1, self._api.connections)
+
+    def test_clusters(self):
+        other_api = FakeManagementAPI(queue_count=10, seed=2)
+        other_api.start()
+        try:
+            other_queues = other_api.get_queues('/')
+            self._session.cluster_configs = {'other': other_api.get_config()}
+            self._run('purge', ['queue0000001'])
+            status, _, _ = self._run('del', ['--cluster', 'other', 'queue0000002'])
+            self.assertEqual(0, status)
+            self.assertNotIn('queue0000002', other_queues)
+            self.assertIn('queue0000002', self._queues)
+            self._run('purge', ['all'])
+            self.assertNotEqual(0, sum(other_queues.get(name)['messages']
+                                       for name in other_queues.names()))
+            # lists of queues of each cluster are cached apart
+            self._run('purge', ['--cluster', 'other', 'all'])
+            self.assertEqual(9, len(other_queues))
+            self.assertTrue(all(other_queues.get(name)['messages'] == 0
+                                for name in other_queues.names()))
+            self.assertEqual(1, other_api.connections)
+        finally:
+            other_api.stop()
+
+    def test_invalid_arguments(self):
+        status, _, stderr = self._run('purge', ['--concurrency', '0'])
+        self.assertEqual(1, status)
+        self.assertEqual('Concurrency has to be a positive number.\n', stderr)
+        status, _, stderr = self._run('purge', ['--no-such-argument'])
+        self.assertEqual(2, status)
+        self.assertIn('unrecognized arguments', stderr)
+        status, stdout, _ = self._run('del', ['-h'])
+        self.assertEqual(0, status)
+        self.assertIn('usage:', stdout)
+
+    def test_standard_input(self):
+        for argv in [[], ['-'], ['--from-file', '-']]:
+            status, _, stderr = self._run('del', argv)
+            self.assertEqual(1, status)
+            self.assertIn('cannot read the standard input', stderr)
+        self.assertEqual(10, len(self._queues))
+
+    def test_working_directory_of_client(self):
+        with open(os.path.join(self._temp_dir, 'names'), 'w') as names_file:
+            names_file.write('queue0000001\nqueue0000002\n')
+        cwd = os.getcwd()
+        os.chdir(self._temp_dir)
+        try:
+            status, _, _ = self._run('del', ['--from-file', 'names'])
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(0, status)
+        self.assertNotIn('queue0000001', self._queues)
+        self.assertNotIn('queue0000002', self._queues)
+
+    def test_session_running(self):
+        with self.assertRaises(SessionError):
+            Session(self._api.get_config(), self._socket_path).bind()
+
+    def test_session_not_running(self):
+        with self.assertRaises(SystemExit):
+            run_in_session(os.path.join(self._temp_dir, 'missing.sock'), 'purge', ['queue'])
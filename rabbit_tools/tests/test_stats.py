@@ -0,0 +1,133 @@
+import unittest
+
+from mock import patch
+
+from rabbit_tools.stats import (
+    LatencyHistogram,
+    OperationStats,
+)
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for i in xrange(1, 1001):
+            histogram.add(i / 1000.)
+        self.assertEqual(1000, histogram.count)
+        for percent, expected in [(50, 0.5), (95, 0.95), (99, 0.99), (100, 1.0)]:
+            self.assertAlmostEqual(expected, histogram.percentile(percent),
+                                   delta=expected * 0.1)
+        self.assertEqual(1.0, histogram.max)
+        self.assertEqual(0.001, histogram.min)
+
+    def test_single_value(self):
+        histogram = LatencyHistogram()
+        histogram.add(0.0123)
+        self.assertEqual(0.0123, histogram.percentile(50))
+        self.assertEqual(0.0123, histogram.percentile(99))
+
+    def test_zero_latency(self):
+        histogram = LatencyHistogram()
+        histogram.add(0)
+        self.assertEqual(0, histogram.percentile(99))
+
+    def test_merge(self):
+        histogram = LatencyHistogram()
+        other = LatencyHistogram()
+        for i in xrange(1, 101):
+            (histogram if i % 2 else other).add(i / 1000.)
+        histogram.merge(other)
+        histogram.merge(LatencyHistogram())
+        self.assertEqual(100, histogram.count)
+        self.assertEqual(0.001, histogram.min)
+        self.assertEqual(0.1, histogram.max)
+        self.assertAlmostEqual(0.05, histogram.percentile(50), delta=0.005)
+
+    def test_empty(self):
+        result = LatencyHistogram().to_dict()
+        self.assertEqual(0, result['count'])
+        self.assertIsNone(result['p99'])
+        self.assertEqual([], result['histogram'])
+
+
+class TestOperationStats(unittest.TestCase):
+
+    def test_record(self):
+        stats = OperationStats(keep_queue_records=True)
+        stats.record('queue1', 'ok', 0.01)
+        stats.record('queue2', 404, 0.02)
+        stats.record('queue3', 'ok', 0.03)
+        result = stats.to_dict()
+        self.assertEqual({'ok': 2, '404': 1}, result['operations']['statuses'])
+        self.assertEqual(3, result['operations']['latency']['count'])
+        self.assertEqual(['queue1', 'queue2', 'queue3'],
+                         [record['queue'] for record in result['queues']])
+        self.assertIn('3 operations (404: 1, ok: 2)', stats.get_summary())
+
+    def test_queue_records_not_kept(self):
+        stats = OperationStats()
+        stats.record('queue1', 'ok', 0.01)
+        self.assertNotIn('queues', stats.to_dict())
+
+    def test_phases(self):
+        stats = OperationStats()
+        with patch('rabbit_tools.stats.time.time', side_effect=[10, 12, 20, 21, 21, 24]):
+            with stats.phase('action'):
+                pass
+            self.assertEqual([1], list(stats.timed_iter([1], 'listing')))
+        self.assertEqual({'action': 2, 'listing': 4}, stats.phases)
+
+    def test_merge(self):
+        stats = OperationStats(keep_queue_records=True)
+        target_stats = OperationStats(keep_queue_records=True)
+        target_stats.add_phase_time('action', 2)
+        target_stats.record('queue1', 'ok', 0.01)
+        target_stats.record('queue2', 404, 0.02)
+        stats.record('queue1', 'ok', 0.03)
+        stats.merge(target_stats, vhost='a')
+        result = stats.to_dict()
+        self.assertEqual({'ok': 2, '404': 1}, result['operations']['statuses'])
+        self.assertEqual([None, 'a', 'a'], [record.get('vhost') for record in result['queues']])
+        self.assertEqual([{'vhost': 'a', 'phases': {'action': 2},
+                           'operations': target_stats.to_dict()['operations']}],
+                         result['targets'])
+
+    def test_merge_without_target(self):
+        stats = OperationStats()
+        for _ in xrange(3):
+            poll_stats = OperationStats()
+            poll_stats.add_phase_time('listing', 1)
+            poll_stats.record('queue1', 'ok', 0.01)
+            poll_stats.count('polls')
+            stats.merge(poll_stats)
+        result = stats.to_dict()
+        self.assertEqual({'listing': 3}, result['phases'])
+        self.assertEqual({'polls': 3}, result['counters'])
+        self.assertEqual(3, result['operations']['count'])
+        self.assertNotIn('targets', result)
+
+    def test_freed(self):
+        with patch('rabbit_tools.stats.time.time', side_effect=[0.5, 1.2, 3.9]):
+            stats = OperationStats()
+            stats.add_freed(60, 'messages')
+            stats.add_freed(40, 'messages')
+        stats.record('queue1', 'ok', 0.01)
+        self.assertEqual([(50, 1), (90, 4), (100, 4)], stats.get_freed_times())
+        self.assertIn('Freed 100 (messages): 50% in 1 s, 90% in 4 s, 100% in 4 s.',
+                      stats.get_summary())
+        self.assertEqual({'field': 'messages', 'total': 100,
+                          'times': {'p50': 1, 'p90': 4, 'p100': 4},
+                          'timeline': [{'seconds': 1, 'freed': 60},
+                                       {'seconds': 4, 'freed': 100}]},
+                         stats.to_dict()['freed'])
+
+    def test_merge_freed(self):
+        # seconds of merged stats are counted from the start of these
+        with patch('rabbit_tools.stats.time.time', side_effect=[0, 10, 12]):
+            stats = OperationStats()
+            other = OperationStats()
+            other.add_freed(5, 'bytes')
+        stats.merge(other, vhost='/')
+        self.assertEqual({12: 5}, stats.freed)
+        self.assertEqual('bytes', stats.freed_field)
@@ -0,0 +1,572 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from StringIO import StringIO
+
+from mock import patch
+from unittest_expander import expand, foreach
+
+from rabbit_tools.amqp import AMQPError
+from rabbit_tools.delete import DelQueueTool
+from rabbit_tools.move import MoveMessagesTool
+from rabbit_tools.purge import PurgeQueueTool
+from rabbit_tools.tests.benchmark import run_benchmark
+from rabbit_tools.tests.benchmark_startup import run_benchmark as run_startup_benchmark
+from rabbit_tools.tests.fake_amqp import FakeAMQPServer
+from rabbit_tools.tests.fake_api import FakeManagementAPI
+
+
+@expand
+class TestToolsWithFakeAPI(unittest.TestCase):
+
+    """
+    Tests of tools communicating with the fake management API.
+    """
+
+    def setUp(self):
+        self._api = FakeManagementAPI(queue_count=30, seed=1)
+        self._api.add_queue('/', 'tmp.loadtest.1', messages=5, consumers=0)
+        self._api.add_queue('/', 'tmp.loadtest.2', messages=5, consumers=1)
+        self._api.start()
+        self._queues = self._api.get_queues('/')
+        self._logger_patch = patch('rabbit_tools.base.logger')
+        self._logger_patch.start()
+        self._temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self._logger_patch.stop()
+        self._api.stop()
+        shutil.rmtree(self._temp_dir)
+
+    def _run(self, tool_class, argv):
+        tool = tool_class(config=self._api.get_config(), argv=argv)
+        tool.client.page_size = 7
+        tool.run()
+
+    @foreach(['1', '4'])
+    def test_delete_all(self, concurrency):
+        self._run(DelQueueTool, ['all', '--concurrency', concurrency])
+        self.assertEqual(0, len(self._queues))
+
+    @foreach(['1', '4'])
+    def test_purge_all(self, concurrency):
+        self._run(PurgeQueueTool, ['all', '--concurrency', concurrency])
+        self.assertEqual(32, len(self._queues))
+        self.assertTrue(all(self._queues.get(name)['messages'] == 0
+                            for name in self._queues.names()))
+
+    def test_delete_by_names(self):
+        self._run(DelQueueTool, ['queue0000001', 'queue0000003', 'missing'])
+        self.assertEqual(30, len(self._queues))
+        self.assertNotIn('queue0000001', self._queues)
+        self.assertNotIn('queue0000003', self._queues)
+
+    def test_delete_selection(self):
+        self._run(DelQueueTool, ['--select', r're:^tmp\.loadtest consumers=0'])
+        self.assertEqual(31, len(self._queues))
+        self.assertNotIn('tmp.loadtest.1', self._queues)
+
+    def test_delete_interactive(self):
+        with patch('__builtin__.raw_input', side_effect=['1-3', '/tmp', 'all', 'q']):
+            self._run(DelQueueTool, [])
+        self.assertEqual(27, len(self._queues))
+        self.assertNotIn('queue0000000', self._queues)
+        self.assertNotIn('tmp.loadtest.2', self._queues)
+
+    def test_stats_json(self):
+        stats_path = os.path.join(self._temp_dir, 'stats.json')
+        self._run(DelQueueTool, ['all', '--concurrency', '2', '--stats-json', stats_path])
+        with open(stats_path) as stats_file:
+            stats = json.load(stats_file)
+        self.assertItemsEqual(['action', 'listing', 'total'], stats['phases'])
+        self.assertEqual({'ok': 32}, stats['operations']['statuses'])
+        self.assertEqual(32, len(stats['queues']))
+        self.assertIsNotNone(stats['operations']['latency']['p99'])
+
+    def test_adaptive_with_overloaded_api(self):
+        self._api.capacity = 2
+        stats_path = os.path.join(self._temp_dir, 'stats.json')
+        self._run(DelQueueTool, list(self._queues.names()) + [
+            '--concurrency', '8', '--adaptive', '--retries', '10', '--stats-json', stats_path])
+        self.assertEqual(0, len(self._queues))
+        with open(stats_path) as stats_file:
+            stats = json.load(stats_file)
+        self.assertEqual({'ok': 32}, stats['operations']['statuses'])
+        self.assertEqual(self._api.rejected_count, stats['operations']['retries'])
+
+    def test_retries_of_server_errors(self):
+        self._api.error_rate = 0.3
+        with patch('rabbit_tools.base.get_backoff_delay', return_value=0):
+            self._run(PurgeQueueTool, list(self._queues.names()) + ['--retries', '20'])
+        self.assertTrue(all(self._queues.get(name)['messages'] == 0
+                            for name in self._queues.names()))
+
+    def test_max_rate(self):
+        with patch('rabbit_tools.executor.time.sleep') as sleep_mock:
+            self._run(DelQueueTool, ['all', '--max-rate', '10'])
+        self.assertEqual(0, len(self._queues))
+        self.assertEqual(31, sleep_mock.call_count)
+
+    def test_node_concurrency(self):
+        self._api.stop()
+        self._api = FakeManagementAPI(queue_count=60, node_count=3, latency=0.002, seed=1)
+        self._api.start()
+        self._queues = self._api.get_queues('/')
+        enter_node = self._api.enter_node
+        many_nodes_busy = threading.Event()
+
+        def enter_node_and_wait(vhost, name):
+            # requests are held until two nodes are handling some at once,
+            # so the check does not depend on timing of threads
+            node = enter_node(vhost, name)
+            if self._api.max_busy_nodes > 1:
+                many_nodes_busy.set()
+            many_nodes_busy.wait(5)
+            return node
+        with patch.object(self._api, 'enter_node', side_effect=enter_node_and_wait):
+            self._run(DelQueueTool, ['all', '--concurrency', '9', '--node-concurrency', '2'])
+        self.assertEqual(0, len(self._queues))
+        self.assertItemsEqual(['rabbit@node0', 'rabbit@node1', 'rabbit@node2'],
+                              self._api.node_max_in_flight)
+        self.assertTrue(all(count <= 2 for count in self._api.node_max_in_flight.itervalues()))
+        self.assertGreater(self._api.max_busy_nodes, 1)
+
+    def test_node_endpoints(self):
+        for name in ['tmp.loadtest.1', 'tmp.loadtest.2']:
+            self._queues.get(name)['node'] = 'rabbit@localhost'
+        stats_path = os.path.join(self._temp_dir, 'stats.json')
+        tool = DelQueueTool(config=self._api.get_config(),
+                            argv=['tmp.loadtest.1', 'tmp.loadtest.2', '--node-endpoints',
+                                  '--concurrency', '2', '--stats-json', stats_path])
+        tool.run()
+        self.assertEqual(30, len(self._queues))
+        self.assertEqual(['localhost'], tool._node_clients.keys())
+        with open(stats_path) as stats_file:
+            stats = json.load(stats_file)
+        self.assertEqual(['rabbit@localhost'] * 2,
+                         [record['node'] for record in stats['queues']])
+
+    def _add_vhosts(self):
+        for vhost in ['a', 'b']:
+            self._api.add_queue(vhost, 'tmp.1', messages=5)
+            self._api.add_queue(vhost, 'other', messages=5)
+
+    def test_many_vhosts(self):
+        self._add_vhosts()
+        self._run(DelQueueTool, ['all', '--vhost', 'a,b'])
+        self.assertEqual(0, len(self._api.get_queues('a')))
+        self.assertEqual(0, len(self._api.get_queues('b')))
+        self.assertEqual(32, len(self._queues))
+
+    def test_all_vhosts_selection(self):
+        self._add_vhosts()
+        stats_path = os.path.join(self._temp_dir, 'stats.json')
+        self._run(PurgeQueueTool, ['--all-vhosts', '--select', 'glob:tmp.*',
+                                   '--stats-json', stats_path])
+        for vhost in ['a', 'b']:
+            self.assertEqual(0, self._api.get_queues(vhost).get('tmp.1')['messages'])
+            self.assertEqual(5, self._api.get_queues(vhost).get('other')['messages'])
+        self.assertEqual(0, self._queues.get('tmp.loadtest.1')['messages'])
+        self.assertNotEqual(0, self._queues.get('queue0000000')['messages'])
+        with open(stats_path) as stats_file:
+            stats = json.load(stats_file)
+        self.assertEqual({'ok': 4}, stats['operations']['statuses'])
+        self.assertItemsEqual(['/', 'a', 'b'], [target['vhost'] for target in stats['targets']])
+        self.assertItemsEqual([('a', 'tmp.1'), ('b', 'tmp.1'), ('/', 'tmp.loadtest.1'),
+                               ('/', 'tmp.loadtest.2')],
+                              [(record['vhost'], record['queue']) for record in stats['queues']])
+
+    def test_many_clusters(self):
+        with FakeManagementAPI(queue_count=5) as other_api:
+            other_port = other_api.get_config()['port']
+            tool = DelQueueTool(config=self._api.get_config(),
+                                argv=['all', '--cluster', 'first,second'],
+                                cluster_configs={'first': {}, 'second': {'port': other_port}})
+            tool.run()
+            self.assertEqual(0, len(other_api.get_queues('/')))
+        self.assertEqual(0, len(self._queues))
+
+    def test_many_vhosts_in_interactive_mode(self):
+        with self.assertRaises(SystemExit):
+            DelQueueTool(config=self._api.get_config(), argv=['--vhost', 'a,b'])
+
+    @foreach(['1', '8'])
+    def test_amqp_backend(self, concurrency):
+        with FakeAMQPServer(self._api) as amqp:
+            tool = DelQueueTool(config=amqp.get_config(), argv=['all', '--concurrency',
+                                                                concurrency])
+            tool.run()
+            self.assertEqual(32, amqp.operations)
+        self.assertEqual(0, len(self._queues))
+        self.assertNotIn('DELETE', self._api.requests)
+
+    def test_amqp_backend_missing_queue(self):
+        with FakeAMQPServer(self._api) as amqp:
+            tool = PurgeQueueTool(config=amqp.get_config(),
+                                  argv=['tmp.loadtest.1', 'missing', 'tmp.loadtest.2'])
+            tool.run()
+        self.assertEqual(0, self._queues.get('tmp.loadtest.1')['messages'])
+        self.assertEqual(0, self._queues.get('tmp.loadtest.2')['messages'])
+        self.assertEqual({'ok': 2, 404: 1}, tool._get_stats().status_counts)
+
+    def test_amqp_backend_delete_missing_queue(self):
+        results_path = os.path.join(self._temp_dir, 'results.jsonl')
+        with FakeAMQPServer(self._api) as amqp:
+            tool = DelQueueTool(config=amqp.get_config(),
+                                argv=['tmp.loadtest.1', 'missing', '--json-lines', results_path])
+            tool.run()
+        self.assertNotIn('tmp.loadtest.1', self._queues)
+        self.assertEqual([('tmp.loadtest.1', 'ok'), ('missing', 404)],
+                         [(result['queue'], result['status'])
+                          for result in self._read_json_lines(results_path)])
+
+    def test_registered_backend(self):
+        test_case = self
+
+        class RecordingBackend(object):
+
+            def __init__(self):
+                self.closed = False
+
+            def iter_results(self, method_name, chosen_queues, before_send=None):
+                test_case.assertEqual('delete_queue', method_name)
+                for chosen_queue in chosen_queues:
+                    yield chosen_queue, None, 0.1, 5
+
+            def close(self):
+                self.closed = True
+
+        backend = RecordingBackend()
+
+        class RecordingDelQueueTool(DelQueueTool):
+            backends = dict(DelQueueTool.backends, recording='_get_recording_backend')
+
+            def _get_recording_backend(self):
+                return backend
+
+        results_path = os.path.join(self._temp_dir, 'results.jsonl')
+        tool = RecordingDelQueueTool(config=dict(self._api.get_config(), backend='recording'),
+                                     argv=['tmp.loadtest.1', '--json-lines', results_path])
+        tool.run()
+        self.assertIn('tmp.loadtest.1', self._queues)
+        self.assertEqual([('tmp.loadtest.1', 5)],
+                         [(result['queue'], result['messages'])
+                          for result in self._read_json_lines(results_path)])
+        self.assertTrue(backend.closed)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(SystemExit):
+            DelQueueTool(config=dict(self._api.get_config(), backend='smtp'), argv=['all'])
+        with self.assertRaises(SystemExit):
+            DelQueueTool(config=self._api.get_config(), argv=['all', '--cluster', 'eu,us'],
+                         cluster_configs={'eu': {}, 'us': {'backend': 'smtp'}})
+
+    def test_names_from_file(self):
+        names_path = os.path.join(self._temp_dir, 'names')
+        with open(names_path, 'w') as names_file:
+            names_file.write('queue0000001\nqueue0000002\n\nqueue0000001\nmissing\n')
+        stats_path = os.path.join(self._temp_dir, 'stats.json')
+        self._run(DelQueueTool, ['--from-file', names_path, '--concurrency', '2',
+                                 '--stats-json', stats_path])
+        self.assertEqual(30, len(self._queues))
+        self.assertNotIn('queue0000001', self._queues)
+        with open(stats_path) as stats_file:
+            stats = json.load(stats_file)
+        self.assertEqual({'ok': 2, '404': 1}, stats['operations']['statuses'])
+        self.assertNotIn('GET', self._api.requests)
+
+    def test_names_from_stdin(self):
+        with patch('sys.stdin', StringIO('queue0000001\nqueue0000002\n')):
+            self._run(PurgeQueueTool, ['-'])
+        self.assertEqual(0, self._queues.get('queue0000001')['messages'])
+        self.assertEqual(0, self._queues.get('queue0000002')['messages'])
+        self.assertNotEqual(0, self._queues.get('queue0000003')['messages'])
+
+    def test_names_file_with_names(self):
+        with self.assertRaises(SystemExit):
+            DelQueueTool(config=self._api.get_config(), argv=['queue', '--from-file', '-'])
+
+    def _read_json_lines(self, path):
+        with open(path) as results_file:
+            return [json.loads(line) for line in results_file]
+
+    def test_json_lines(self):
+        results_path = os.path.join(self._temp_dir, 'results.jsonl')
+        self._run(DelQueueTool, ['tmp.loadtest.1', 'missing', '--json-lines', results_path])
+        results = self._read_json_lines(results_path)
+        self.assertEqual(['tmp.loadtest.1', 'missing'], [result['queue'] for result in results])
+        self.assertEqual(['ok', 404], [result['status'] for result in results])
+        self.assertEqual({'/'}, {result['vhost'] for result in results})
+        self.assertTrue(all(result['messages'] is None for result in results))
+        self.assertTrue(all(result['latency'] > 0 for result in results))
+
+    def test_json_lines_of_cluster(self):
+        results_path = os.path.join(self._temp_dir, 'results.jsonl')
+        tool = DelQueueTool(config=self._api.get_config(),
+                            argv=['tmp.loadtest.1', '--cluster', 'eu', '--json-lines',
+                                  results_path],
+                            cluster_configs={'eu': {}})
+        tool.run()
+        self.assertEqual([('eu', 'tmp.loadtest.1')],
+                         [(result['cluster'], result['queue'])
+                          for result in self._read_json_lines(results_path)])
+
+    def test_json_lines_with_amqp_backend(self):
+        results_path = os.path.join(self._temp_dir, 'results.jsonl')
+        with FakeAMQPServer(self._api) as amqp:
+            tool = PurgeQueueTool(config=amqp.get_config(),
+                                  argv=['tmp.loadtest.1', 'tmp.loadtest.2',
+                                        '--json-lines', results_path])
+            tool.run()
+        self.assertEqual([5, 5], [result['messages']
+                                  for result in self._read_json_lines(results_path)])
+
+    def _get_sizes(self, names):
+        return [self._queues.get(name)['messages'] for name in names]
+
+    def test_purge_largest_first(self):
+        results_path = os.path.join(self._temp_dir, 'results.jsonl')
+        stats_path = os.path.join(self._temp_dir, 'stats.json')
+        sizes = self._get_sizes(self._queues.names())
+        self._run(PurgeQueueTool, ['all', '--largest-first', 'messages', '--json-lines',
+                                   results_path, '--stats-json', stats_path])
+        purged_names = [result['queue'] for result in self._read_json_lines(results_path)]
+        self.assertEqual(sorted(sizes, reverse=True),
+                         [sizes[self._queues.names().index(name)] for name in purged_names])
+        # sizes are statistics of the listing
+        self.assertTrue(all('disable_stats' not in query and
+                            query['columns'] == ['name,messages']
+                            for query in self._api.requested_queries))
+        with open(stats_path) as stats_file:
+            freed = json.load(stats_file)['freed']
+        self.assertEqual('messages', freed['field'])
+        self.assertEqual(sum(sizes), freed['total'])
+        self.assertEqual(sum(sizes), freed['timeline'][-1]['freed'])
+        self.assertItemsEqual(['p50', 'p90', 'p100'], freed['times'])
+
+    def test_delete_names_largest_first(self):
+        for name, message_bytes in [('queue0000001', 300), ('queue0000002', 200),
+                                    ('queue0000003', 500), ('tmp.loadtest.1', 100)]:
+            self._queues.get(name)['message_bytes'] = message_bytes
+        names = ['tmp.loadtest.1', 'queue0000001', 'missing', 'queue0000002', 'queue0000003']
+        results_path = os.path.join(self._temp_dir, 'results.jsonl')
+        self._run(DelQueueTool, names + ['--largest-first', 'bytes', '--concurrency', '1',
+                                         '--json-lines', results_path])
+        self.assertEqual(['queue0000003', 'queue0000001', 'queue0000002', 'tmp.loadtest.1',
+                          'missing'],
+                         [result['queue'] for result in self._read_json_lines(results_path)])
+
+    def test_largest_first_with_amqp_backend(self):
+        with FakeAMQPServer(self._api) as amqp:
+            tool = PurgeQueueTool(config=amqp.get_config(),
+                                  argv=['--select', r're:^tmp\.loadtest', '--largest-first',
+                                        'messages'])
+            tool.run()
+        self.assertEqual(10, sum(tool._get_stats().freed.itervalues()))
+        self.assertIn('Freed 10 (messages): 50% in 1 s', tool._get_stats().get_summary())
+
+    def test_json_lines_to_stdout(self):
+        with patch('sys.stdout', StringIO()) as stdout:
+            self._run(DelQueueTool, ['queue0000001', '--json-lines', '-'])
+        self.assertEqual('queue0000001', json.loads(stdout.getvalue())['queue'])
+
+    def test_resume(self):
+        journal_path = os.path.join(self._temp_dir, 'journal')
+        self._api.error_rate = 1
+        self._run(PurgeQueueTool, ['queue0000001', '--journal', journal_path])
+        self._api.error_rate = 0
+        self._run(PurgeQueueTool, ['queue0000002', 'missing', '--journal', journal_path])
+        self._queues.get('queue0000002')['messages'] = 10
+        self._run(PurgeQueueTool, ['queue0000001', 'queue0000002', 'missing', 'queue0000003',
+                                   '--resume', journal_path])
+        self.assertEqual(0, self._queues.get('queue0000001')['messages'])
+        # skipped, because it has been purged by the previous run
+        self.assertEqual(10, self._queues.get('queue0000002')['messages'])
+        self.assertEqual(0, self._queues.get('queue0000003')['messages'])
+        # the missing queue is skipped too
+        self.assertEqual(5, self._api.requests['DELETE'])
+        with open(journal_path) as journal_file:
+            self.assertEqual(4, len(journal_file.readlines()))
+
+    def test_resume_many_vhosts(self):
+        self._add_vhosts()
+        journal_path = os.path.join(self._temp_dir, 'journal')
+        self._run(DelQueueTool, ['tmp.1', '--vhost', 'a', '--journal', journal_path])
+        self._api.add_queue('a', 'tmp.1')
+        tool = DelQueueTool(config=self._api.get_config(),
+                            argv=['tmp.1', '--vhost', 'a,b', '--resume', journal_path])
+        tool.run()
+        self.assertIn('tmp.1', self._api.get_queues('a'))
+        self.assertNotIn('tmp.1', self._api.get_queues('b'))
+        self.assertEqual(1, tool.skipped_count)
+
+    def test_resume_one_of_clusters(self):
+        journal_path = os.path.join(self._temp_dir, 'journal')
+        with FakeManagementAPI(queue_count=5) as other_api:
+            cluster_configs = {'eu': {}, 'us': {'port': other_api.get_config()['port']}}
+
+            def run(argv):
+                tool = DelQueueTool(config=self._api.get_config(), argv=argv,
+                                    cluster_configs=cluster_configs)
+                tool.run()
+                return tool
+            run(['queue0000001', '--cluster', 'eu', '--journal', journal_path])
+            # the queue of the same name in another cluster is not skipped
+            tool = run(['queue0000001', '--cluster', 'us', '--resume', journal_path])
+            self.assertEqual(0, tool.skipped_count)
+            self.assertNotIn('queue0000001', other_api.get_queues('/'))
+            self._queues.add('queue0000001')
+            tool = run(['queue0000001', '--cluster', 'eu,us', '--resume', journal_path])
+            self.assertEqual(2, tool.skipped_count)
+            self.assertIn('queue0000001', self._queues)
+
+    def _watch(self, tool_class, argv, max_polls, between_polls):
+        tool = tool_class(config=self._api.get_config(), argv=['--watch', '60'] + argv)
+        tool.max_polls = max_polls
+        with patch('time.sleep', side_effect=between_polls) as sleep_mock:
+            tool.run()
+        self.assertEqual(max_polls - 1, sleep_mock.call_count)
+        self.assertTrue(all(0 <= seconds <= 60 for (seconds,), _ in sleep_mock.call_args_list))
+        return tool
+
+    def test_watch(self):
+        stats_path = os.path.join(self._temp_dir, 'stats.json')
+        self._watch(PurgeQueueTool, ['--select', 'glob:tmp.* messages>0',
+                                     '--stats-json', stats_path],
+                    max_polls=3,
+                    between_polls=lambda seconds: self._api.add_queue('/', 'tmp.3', messages=5))
+        self.assertEqual(0, self._queues.get('tmp.3')['messages'])
+        self.assertEqual(0, self._queues.get('tmp.loadtest.2')['messages'])
+        with open(stats_path) as stats_file:
+            stats = json.load(stats_file)
+        self.assertEqual({'polls': 3}, stats['counters'])
+        self.assertEqual({'ok': 4}, stats['operations']['statuses'])
+        self.assertNotIn('queues', stats)
+
+    def test_watch_many_vhosts(self):
+        self._add_vhosts()
+        stats_path = os.path.join(self._temp_dir, 'stats.json')
+        self._watch(DelQueueTool, ['--vhost', 'a,b', '--select', 'glob:tmp.*',
+                                   '--stats-json', stats_path],
+                    max_polls=2,
+                    between_polls=lambda seconds: self._api.add_queue('a', 'tmp.2'))
+        self.assertEqual(['other'], list(self._api.get_queues('a').names()))
+        with open(stats_path) as stats_file:
+            stats = json.load(stats_file)
+        self.assertEqual({'ok': 3}, stats['operations']['statuses'])
+        self.assertNotIn('targets', stats)
+
+    def test_watch_failed_poll(self):
+        error_rates = iter([1, 0])
+
+        def between_polls(seconds):
+            self._api.error_rate = next(error_rates)
+            self._api.add_queue('/', 'tmp.3', messages=5)
+
+        tool = self._watch(PurgeQueueTool, ['--select', 'glob:tmp.* messages>0'],
+                           max_polls=3, between_polls=between_polls)
+        self.assertEqual(0, self._queues.get('tmp.3')['messages'])
+        self.assertEqual({'polls': 3, 'failed_polls': 1}, tool._get_stats().counters)
+
+    def _move(self, argv):
+        with FakeAMQPServer(self._api) as amqp:
+            tool = MoveMessagesTool(config=amqp.get_config(), argv=argv)
+            tool.run()
+        return tool
+
+    def test_move_selection(self):
+        self._api.add_queue('/', 'parking')
+        results_path = os.path.join(self._temp_dir, 'results.jsonl')
+        tool = self._move(['--select', r're:^tmp\.loadtest', '--to-queue', 'parking',
+                           '--concurrency', '2', '--json-lines', results_path])
+        self.assertEqual(10, self._queues.get('parking')['messages'])
+        self.assertEqual(0, self._queues.get('tmp.loadtest.1')['messages'])
+        self.assertEqual(0, self._queues.get('tmp.loadtest.2')['messages'])
+        self.assertItemsEqual([('tmp.loadtest.1', 'ok', 5), ('tmp.loadtest.2', 'ok', 5)],
+                              [(result['queue'], result['status'], result['messages'])
+                               for result in self._read_json_lines(results_path)])
+        self.assertEqual({'moved_messages': 10}, tool._get_stats().counters)
+
+    def test_move_to_exchange_of_many_vhosts(self):
+        self._add_vhosts()
+        with FakeAMQPServer(self._api) as amqp:
+            amqp.add_exchange('dead', ['other'])
+            tool = MoveMessagesTool(config=amqp.get_config(),
+                                    argv=['tmp.1', '--vhost', 'a,b', '--to-exchange', 'dead'])
+            tool.run()
+        for vhost in ['a', 'b']:
+            self.assertEqual(0, self._api.get_queues(vhost).get('tmp.1')['messages'])
+            self.assertEqual(10, self._api.get_queues(vhost).get('other')['messages'])
+
+    def test_move_with_max_rate(self):
+        self._api.add_queue('/', 'parking')
+        with patch('rabbit_tools.executor.time.sleep') as sleep_mock:
+            self._move(['--select', r're:^tmp\.loadtest', '--to-queue', 'parking',
+                        '--concurrency', '2', '--max-rate', '0.1'])
+        self.assertEqual(10, self._queues.get('parking')['messages'])
+        # the second move waits 10 s for its turn
+        (seconds,), _ = sleep_mock.call_args
+        self.assertAlmostEqual(10, seconds, delta=1)
+
+    def test_move_to_same_queue(self):
+        self._api.add_queue('/', 'parking', messages=3)
+        results_path = os.path.join(self._temp_dir, 'results.jsonl')
+        self._move(['parking', 'tmp.loadtest.1', '--to-queue', 'parking',
+                    '--json-lines', results_path])
+        self.assertEqual(8, self._queues.get('parking')['messages'])
+        self.assertEqual([406, 'ok'], [result['status']
+                                       for result in self._read_json_lines(results_path)])
+
+    def test_move_to_missing_target(self):
+        with self.assertRaises(AMQPError):
+            self._move(['tmp.loadtest.1', '--to-exchange', 'missing'])
+        self.assertEqual(5, self._queues.get('tmp.loadtest.1')['messages'])
+
+    def test_move_invalid_arguments(self):
+        for argv in [['queue'], ['queue', '--to-queue', 'a', '--to-exchange', 'b'],
+                     ['queue', '--to-queue', 'a', '--routing-key', 'key'],
+                     ['queue', '--to-queue', 'a', '--prefetch', '0'],
+                     ['queue', '--to-queue', 'a', '--adaptive'],
+                     ['queue', '--to-queue', 'a', '--retries', '3'],
+                     ['queue', '--to-queue', 'a', '--node-endpoints']]:
+            with self.assertRaises(SystemExit):
+                MoveMessagesTool(config=self._api.get_config(), argv=argv)
+
+    def test_watch_invalid_arguments(self):
+        for argv in [['--watch', '60'], ['--watch', '0', '--select', 'glob:*'],
+                     ['--watch', '60', '--select', 'glob:*', '--journal', 'journal']]:
+            with self.assertRaises(SystemExit):
+                DelQueueTool(config=self._api.get_config(), argv=argv)
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_run_benchmark(self):
+        result = run_benchmark('delete', 20, concurrency=2)
+        self.assertEqual(20, result['queues'])
+        self.assertEqual(21, result['requests'])
+        self.assertGreater(result['requests_per_second'], 0)
+
+    def test_run_startup_benchmark(self):
+        for name in ['help', 'invalid-args', 'init']:
+            self.assertFalse(run_startup_benchmark(name, repeat=1)['http_stack_imported'])
+        self.assertTrue(run_startup_benchmark('client', repeat=1)['http_stack_imported'])
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_invalid_arguments_before_config(self):
+        with patch('rabbit_tools.base.Config') as config_mock, \
+                self.assertRaises(SystemExit):
+            DelQueueTool(argv=['--concurrency', '0'])
+        self.assertFalse(config_mock.called)
+
+    def test_deferred_client(self):
+        config = {'host': '127.0.0.1', 'port': '15672', 'user': 'guest', 'password': 'guest',
+                  'vhost': '/'}
+        tool = DelQueueTool(config=config, argv=['queue'])
+        self.assertIsNone(tool._client)
+        self.assertIs(tool.client, tool.client)
@@ -0,0 +1,173 @@
+import unittest
+from StringIO import StringIO
+
+from mock import patch
+
+from rabbit_tools.tests.fake_api import FakeManagementAPI
+from rabbit_tools.top import (
+    RateTracker,
+    TopTool,
+)
+
+
+class TestRateTracker(unittest.TestCase):
+
+    @staticmethod
+    def _queue(name, messages, published, delivered):
+        return {
+            'name': name,
+            'messages': messages,
+            'message_stats': {'publish': published, 'deliver_get': delivered},
+        }
+
+    def test_rates(self):
+        tracker = RateTracker()
+        rows = list(tracker.iter_rows([self._queue('a', 10, 100, 90)], 100.0))
+        self.assertEqual([(None, None, None)],
+                         [(row.growth, row.publish_rate, row.deliver_rate) for row in rows])
+        rows = list(tracker.iter_rows([self._queue('a', 30, 140, 110),
+                                       self._queue('b', 1, 1, 0)], 110.0))
+        self.assertEqual([('a', 20, 4.0, 2.0), ('b', None, None, None)],
+                         [(row.name, row.growth, row.publish_rate, row.deliver_rate)
+                          for row in rows])
+
+    def test_reset_counters(self):
+        # the queue was deleted and created again
+        tracker = RateTracker()
+        list(tracker.iter_rows([self._queue('a', 10, 100, 90)], 100.0))
+        row, = tracker.iter_rows([self._queue('a', 0, 5, 0)], 101.0)
+        self.assertEqual((-10, None, None), (row.growth, row.publish_rate, row.deliver_rate))
+
+    def test_queues_without_stats(self):
+        tracker = RateTracker()
+        list(tracker.iter_rows([{'name': 'a', 'messages': 3}], 100.0))
+        row, = tracker.iter_rows([{'name': 'a'}], 101.0)
+        self.assertEqual((0, -3, 0.0, 0.0),
+                         (row.messages, row.growth, row.publish_rate, row.deliver_rate))
+
+    def test_only_previous_sample_is_kept(self):
+        tracker = RateTracker()
+        list(tracker.iter_rows([self._queue('a', 1, 1, 1)], 100.0))
+        list(tracker.iter_rows([self._queue('b', 1, 1, 1)], 101.0))
+        self.assertEqual(['b'], list(tracker._previous))
+
+
+class TestTopTool(unittest.TestCase):
+
+    def setUp(self):
+        self._api = FakeManagementAPI(queue_count=30, seed=1)
+        self._api.start()
+        self._queues = self._api.get_queues('/')
+        for name in self._queues.names():
+            self._queues.get(name)['message_stats'] = {'publish': 0, 'deliver_get': 0}
+        self._logger_patch = patch('rabbit_tools.top.logger')
+        self._logger = self._logger_patch.start()
+
+    def tearDown(self):
+        self._logger_patch.stop()
+        self._api.stop()
+
+    def _get_tool(self, argv):
+        return TopTool(config=self._api.get_config(), argv=argv)
+
+    def _run(self, tool, commands=(), answers=()):
+        """
+        Run the tool, typing commands (or results of functions)
+        between samples; return the output.
+        """
+        commands = list(commands)
+        answers = list(answers)
+
+        def wait_for_command(timeout):
+            if not commands:
+                return 'q'
+            command = commands.pop(0)
+            return command() if callable(command) else command
+
+        stdout = StringIO()
+        with patch.object(tool, '_wait_for_command', side_effect=wait_for_command), \
+                patch('rabbit_tools.top.raw_input', side_effect=lambda prompt: answers.pop(0),
+                      create=True), \
+                patch('sys.stdout', stdout), \
+                patch('rabbit_tools.base.logger'):
+            tool.run()
+        return stdout.getvalue()
+
+    def _get_shown_names(self, output):
+        return [line.split()[-1] for line in output.splitlines() if line.lstrip().startswith('[')]
+
+    def test_top_by_messages(self):
+        tool = self._get_tool(['--top', '5', '--iterations', '1'])
+        output = self._run(tool)
+        expected = sorted(self._queues.names(),
+                          key=lambda name: self._queues.get(name)['messages'], reverse=True)[:5]
+        self.assertEqual(expected, self._get_shown_names(output))
+        self.assertIn('30 queues', output)
+        # only the needed columns are requested, with statistics
+        query = self._api.requested_queries[-1]
+        self.assertEqual(['name,messages,consumers,message_stats.publish,'
+                          'message_stats.deliver_get'], query['columns'])
+        self.assertNotIn('disable_stats', query)
+
+    def test_sort_by_publish_rate(self):
+        tool = self._get_tool(['--top', '2', '--sort', 'publish'])
+        busy = self._queues.names()[7]
+        idle = self._queues.names()[3]
+
+        def publish():
+            self._queues.get(busy)['message_stats']['publish'] += 1000
+            self._queues.get(idle)['message_stats']['publish'] += 1
+            return 'r'
+        output = self._run(tool, [publish, 's consumers', 'x'])
+        samples = output.split(' - vhost ')[1:]
+        self.assertEqual(3, len(samples))
+        self.assertEqual([busy, idle], self._get_shown_names(samples[1]))
+        self.assertIn('Sorted by consumers', samples[2])
+        self._logger.error.assert_called_once_with('Unknown command: %r.', 'x')
+
+    def test_purge_shown_rows(self):
+        tool = self._get_tool(['--top', '3'])
+        first, second, third = sorted(
+            self._queues.names(), key=lambda name: self._queues.get(name)['messages'],
+            reverse=True)[:3]
+        output = self._run(tool, ['p 1,3', 'd 2'], answers=['y', 'n'])
+        self.assertEqual(0, self._queues.get(first)['messages'])
+        self.assertNotEqual(0, self._queues.get(second)['messages'])
+        self.assertEqual(0, self._queues.get(third)['messages'])
+        self.assertIn(second, self._queues)
+        # the list is sampled again after the action
+        self.assertEqual(2, output.count('30 queues'))
+
+    def test_act_on_queues_named_like_arguments(self):
+        for name, messages in [('all', 3 * 10 ** 6), ('-x', 2 * 10 ** 6), ('-', 10 ** 6)]:
+            self._api.add_queue('/', name, messages=messages,
+                                message_stats={'publish': 0, 'deliver_get': 0})
+        tool = self._get_tool(['--top', '3', '--node-concurrency', '2'])
+        self._run(tool, ['p 1,2,3'], answers=['y'])
+        for name in ['all', '-x', '-']:
+            self.assertEqual(0, self._queues.get(name)['messages'])
+        # other queues are not purged
+        self.assertTrue(all(self._queues.get(name)['messages'] for name in self._queues.names()
+                            if name not in ('all', '-x', '-')))
+
+    def test_delete_selection(self):
+        tool = self._get_tool(['--top', '3'])
+        self._run(tool, ['d messages<1000'], answers=['yes'])
+        self.assertTrue(all(self._queues.get(name)['messages'] >= 1000
+                            for name in self._queues.names()))
+        self.assertLess(len(self._queues), 30)
+
+    def test_selection(self):
+        tool = self._get_tool(['--select', 'messages>=5000', '--iterations', '1',
+                               '--top', '50'])
+        output = self._run(tool)
+        self.assertEqual(sorted(name for name in self._queues.names()
+                                if self._queues.get(name)['messages'] >= 5000),
+                         sorted(self._get_shown_names(output)))
+
+    def test_invalid_arguments(self):
+        for argv in [['queue0000001'], ['--watch', '1', '--select', 'messages>0'],
+                     ['--interval', '0'], ['--top', '0'], ['--vhost', 'a,b'],
+                     ['--all-vhosts']]:
+            with self.assertRaises(SystemExit):
+                self._get_tool(argv)
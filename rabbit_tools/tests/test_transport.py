@@ -0,0 +1,132 @@
+import unittest
+
+from pyrabbit.http import (
+    HTTPError,
+    NetworkError,
+)
+
+from rabbit_tools.tests.fake_api import FakeManagementAPI
+from rabbit_tools.transport import (
+    HTTPBackend,
+    ManagementClient,
+    PooledHTTPClient,
+)
+
+
+class TestPooledHTTPClient(unittest.TestCase):
+
+    def setUp(self):
+        self._api = FakeManagementAPI()
+        self._api.add_queue('/', 'queue1')
+        self._api.add_queue('/', 'queue2')
+        self._api.start()
+        self._api_url = self._api.api_url
+
+    def tearDown(self):
+        self._api.stop()
+
+    def _add_queues(self, count):
+        for i in xrange(count):
+            self._api.add_queue('/', 'queue{}'.format(i))
+
+    def test_connection_is_reused(self):
+        client = ManagementClient(self._api_url, 'guest', 'guest', pool_size=2)
+        for _ in xrange(5):
+            self.assertEqual(['queue1', 'queue2'],
+                             [x['name'] for x in client.get_queues('/')])
+        client.delete_queue('/', 'queue2')
+        self.assertEqual(1, self._api.connections)
+
+    def test_basic_auth(self):
+        client = PooledHTTPClient(self._api_url, 'user', 'secret')
+        client.do_call('queues/%2F', 'GET')
+        self.assertEqual({'Basic dXNlcjpzZWNyZXQ='}, self._api.auth_headers)
+
+    def test_http_error(self):
+        client = ManagementClient(self._api_url, 'guest', 'guest')
+        with self.assertRaises(HTTPError) as cm:
+            client.delete_queue('/', 'queue3')
+        self.assertEqual(404, cm.exception.status)
+        client.delete_queue('/', 'queue1')
+        self.assertEqual(1, self._api.connections)
+
+    def test_connections_above_pool_size_are_closed(self):
+        client = PooledHTTPClient(self._api_url, 'guest', 'guest', pool_size=1)
+        first, second = client._get_connection(), client._get_connection()
+        client._release_connection(first)
+        client._release_connection(second)
+        self.assertEqual(1, client._pool.qsize())
+        self.assertIsNone(second.sock)
+
+    def test_network_error(self):
+        client = PooledHTTPClient('127.0.0.1:1', 'guest', 'guest')
+        with self.assertRaises(NetworkError):
+            client.do_call('queues/%2F', 'GET')
+
+    def test_iter_queues_paginated(self):
+        self._add_queues(7)
+        client = ManagementClient(self._api_url, 'guest', 'guest', page_size=3)
+        names = [x for x in client.iter_queues('/', columns=['name'])]
+        self.assertItemsEqual([{'name': 'queue{}'.format(i)} for i in xrange(7)], names)
+        self.assertEqual(3, len(self._api.requested_queries))
+        query = self._api.requested_queries[0]
+        self.assertEqual(['name'], query['columns'])
+        self.assertEqual(['true'], query['disable_stats'])
+
+    def test_iter_queues_deleting_while_iterating(self):
+        self._add_queues(10)
+        client = ManagementClient(self._api_url, 'guest', 'guest', page_size=3)
+        deleted = []
+        for queue in client.iter_queues('/', columns=['name']):
+            client.delete_queue('/', queue['name'])
+            deleted.append(queue['name'])
+        self.assertEqual(10, len(deleted))
+        self.assertEqual(0, len(self._api.get_queues('/')))
+
+    def test_iter_queues_not_paginated(self):
+        self._api.paginated = False
+        client = ManagementClient(self._api_url, 'guest', 'guest', page_size=1)
+        self.assertEqual(['queue1', 'queue2'],
+                         [x['name'] for x in client.iter_queues('/')])
+
+    def test_iter_queues_reuses_connection(self):
+        self._add_queues(7)
+        client = ManagementClient(self._api_url, 'guest', 'guest', page_size=2)
+        self.assertEqual(7, len(list(client.iter_queues('/', columns=['name']))))
+        self.assertEqual(7, len(list(client.iter_queues('/', columns=['name']))))
+        self.assertEqual(1, self._api.connections)
+
+    def test_iter_queues_name_regex(self):
+        self._add_queues(12)
+        client = ManagementClient(self._api_url, 'guest', 'guest', page_size=2)
+        names = [x['name'] for x in client.iter_queues('/', name_regex='^queue1')]
+        self.assertItemsEqual(['queue1', 'queue10', 'queue11'], names)
+
+
+class TestHTTPBackend(unittest.TestCase):
+
+    @staticmethod
+    def _call_method(chosen_queue, before_send):
+        before_send()
+        if chosen_queue[1] == 'missing':
+            return HTTPError({}, status=404), 0.5, None
+        return None, 0.5, None
+
+    def test_results(self):
+        chosen_queues = [(1, 'a'), (2, 'missing'), (3, 'b')]
+        for concurrency in [1, 4]:
+            sent = []
+            backend = HTTPBackend(self._call_method, concurrency)
+            results = {chosen_queue: error for chosen_queue, error, _, _
+                       in backend.iter_results('purge_queue', chosen_queues,
+                                               lambda: sent.append(1))}
+            self.assertEqual([None, 404, None], [getattr(results[chosen_queue], 'status', None)
+                                                 for chosen_queue in chosen_queues])
+            self.assertEqual(3, len(sent))
+
+    def test_exceptions_are_raised(self):
+        def call_method(chosen_queue, before_send):
+            raise NetworkError('refused')
+        backend = HTTPBackend(call_method, 4, get_node=lambda queue_name: 'rabbit@node0')
+        with self.assertRaises(NetworkError):
+            list(backend.iter_results('purge_queue', [(1, 'a')]))
@@ -0,0 +1,441 @@
+"""
+Live monitor of queues of a vhost, like top: the most important
+queues are shown every few seconds, with rates of publishing
+and delivering messages, and can be purged or deleted right away.
+"""
+
+import heapq
+import logging
+import select
+import sys
+import time
+from collections import Sequence
+
+from rabbit_tools.base import (
+    RabbitToolBase,
+    StopReceivingInput,
+)
+from rabbit_tools.delete import DelQueueTool
+from rabbit_tools.lib import log_exceptions
+from rabbit_tools.logs import flush_background_logging
+from rabbit_tools.purge import PurgeQueueTool
+from rabbit_tools.selection import Selector
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 5
+DEFAULT_TOP = 20
+
+# columns of queues fetched by the monitor, besides those needed
+# by the selection
+MONITOR_COLUMNS = ['name', 'messages', 'consumers',
+                   'message_stats.publish', 'message_stats.deliver_get']
+
+# field, by which queues are sorted: attribute of `QueueRow`
+SORT_FIELDS = {
+    'messages': 'messages',
+    'growth': 'growth',
+    'publish': 'publish_rate',
+    'deliver': 'deliver_rate',
+    'consumers': 'consumers',
+}
+
+CLEAR_SCREEN = '\x1b[H\x1b[2J'
+
+
+class QueueRow(object):
+
+    """
+    Statistics of a queue in a sample; `growth` is the change
+    of the number of messages since the previous sample, rates
+    are numbers of messages per second. Changes and rates are None
+    for queues, which were not in the previous sample.
+    """
+
+    __slots__ = ('name', 'messages', 'consumers', 'growth', 'publish_rate', 'deliver_rate')
+
+    def __init__(self, name, messages, consumers, growth, publish_rate, deliver_rate):
+        self.name = name
+        self.messages = messages
+        self.consumers = consumers
+        self.growth = growth
+        self.publish_rate = publish_rate
+        self.deliver_rate = deliver_rate
+
+
+class RateTracker(object):
+
+    """
+    Computes rates of queues from consecutive samples. Only counters
+    of the previous sample are kept (a tuple for each queue), so the
+    memory usage does not grow with the number of samples.
+    """
+
+    def __init__(self):
+        # name: (messages, published messages, delivered messages)
+        self._previous = {}
+        self._previous_time = None
+
+    @staticmethod
+    def _get_counters(queue):
+        message_stats = queue.get('message_stats') or {}
+        return (queue.get('messages') or 0, message_stats.get('publish') or 0,
+                message_stats.get('deliver_get') or 0)
+
+    @staticmethod
+    def _get_rate(current, previous, seconds):
+        # counters are reset, when a queue is created again
+        if current < previous or seconds <= 0:
+            return None
+        return (current - previous) / seconds
+
+    def iter_rows(self, queues, timestamp):
+        """
+        Yield a `QueueRow` for each queue (dict) of the sample taken
+        at the timestamp. The sample replaces the previous one, when
+        all queues have been yielded.
+        """
+        current = {}
+        seconds = None
+        if self._previous_time is not None:
+            seconds = timestamp - self._previous_time
+        for queue in queues:
+            name = queue['name']
+            counters = current[name] = self._get_counters(queue)
+            previous = self._previous.get(name)
+            if previous is None:
+                growth = publish_rate = deliver_rate = None
+            else:
+                growth = counters[0] - previous[0]
+                publish_rate = self._get_rate(counters[1], previous[1], seconds)
+                deliver_rate = self._get_rate(counters[2], previous[2], seconds)
+            yield QueueRow(name, counters[0], queue.get('consumers') or 0, growth,
+                           publish_rate, deliver_rate)
+        self._previous = current
+        self._previous_time = timestamp
+
+
+class SampleTotals(object):
+
+    """
+    Totals of rows of a sample, counted while they are yielded.
+    """
+
+    def __init__(self):
+        self.queue_count = 0
+        self.messages = 0
+        self.publish_rate = 0
+        self.deliver_rate = 0
+
+    def iter_counted(self, rows):
+        for row in rows:
+            self.queue_count += 1
+            self.messages += row.messages
+            self.publish_rate += row.publish_rate or 0
+            self.deliver_rate += row.deliver_rate or 0
+            yield row
+
+
+def _format_number(value, number_format='{:.0f}'):
+    return '-' if value is None else number_format.format(value)
+
+
+class TopTool(RabbitToolBase):
+
+    """
+    Shows `top` queues of the vhost (or of queues matching the
+    selection) every `interval` seconds, sorted by a statistic.
+    Each sample lists queues with the columns needed only; rows
+    are computed while queues are received, and only the top
+    ones are kept.
+
+    Between samples, commands can be typed:
+        p NUMBERS|SELECTION - purge queues of shown rows, or
+                              matching the selection,
+        d NUMBERS|SELECTION - delete them,
+        s FIELD - sort by another field, r - refresh, q - quit.
+    Actions are applied by the purge and delete tools, using the
+    client of the monitor, after they are confirmed.
+    """
+
+    description = ('Show queues with the most messages (or the highest growth, or rates '
+                   'of publishing or delivering messages), refreshed periodically; type '
+                   'commands to purge or delete shown queues.')
+
+    client_method_name = None
+
+    args = dict(RabbitToolBase.args, **{
+        '--interval': {
+            'help': 'Number of seconds between samples (default: {}).'.format(
+                DEFAULT_INTERVAL),
+            'type': float,
+            'default': DEFAULT_INTERVAL,
+            'metavar': 'SECONDS',
+        },
+        '--top': {
+            'help': 'Number of shown queues (default: {}).'.format(DEFAULT_TOP),
+            'type': int,
+            'default': DEFAULT_TOP,
+            'metavar': 'N',
+        },
+        '--sort': {
+            'help': 'Field, by which queues are sorted: messages (default), growth '
+                    '(since the previous sample), publish or deliver (rates), consumers.',
+            'choices': sorted(SORT_FIELDS),
+            'default': 'messages',
+        },
+        '--iterations': {
+            'help': 'Exit after the number of samples (by default, the monitor runs, '
+                    'until it is quit).',
+            'type': int,
+            'metavar': 'N',
+        },
+    })
+
+    # command: tool applying the action
+    action_tools = {
+        'p': PurgeQueueTool,
+        'purge': PurgeQueueTool,
+        'd': DelQueueTool,
+        'delete': DelQueueTool,
+    }
+    action_names = {
+        PurgeQueueTool: 'Purge',
+        DelQueueTool: 'Delete',
+    }
+    sort_commands = ['s', 'sort']
+
+    interval = DEFAULT_INTERVAL
+    top = DEFAULT_TOP
+    sort_field = 'messages'
+    iterations = None
+
+    # numbers of shown rows: names of queues
+    _shown_queues = None
+
+    def _set_action_args(self, parsed_args):
+        if parsed_args.queue_name or self.names_path is not None:
+            sys.exit('The monitor shows all queues, or queues matching a selection (--select).')
+        if parsed_args.watch is not None or self.journal_path:
+            sys.exit('The --watch, --journal and --resume arguments cannot be used '
+                     'with the monitor.')
+        if parsed_args.interval <= 0:
+            sys.exit('Interval has to be a positive number.')
+        if parsed_args.top < 1:
+            sys.exit('Number of shown queues has to be a positive number.')
+        self.interval = parsed_args.interval
+        self.top = parsed_args.top
+        self.sort_field = parsed_args.sort
+        self.iterations = parsed_args.iterations
+        self._rates = RateTracker()
+        self._shown_queues = {}
+
+    def _set_targets(self, parsed_args, cluster_configs):
+        if parsed_args.all_vhosts or ',' in (parsed_args.vhost or '') or ',' in (
+                parsed_args.cluster or ''):
+            sys.exit('The monitor shows queues of one vhost of one cluster.')
+        super(TopTool, self)._set_targets(parsed_args, cluster_configs)
+
+    def _get_action_argv(self):
+        """
+        Return arguments of tools applying actions, taken from
+        arguments of the monitor.
+        """
+        parsed_args = self._parsed_args
+        argv = ['--concurrency', str(self.concurrency)]
+        if parsed_args.adaptive:
+            argv.append('--adaptive')
+        if parsed_args.max_rate is not None:
+            argv.extend(['--max-rate', repr(parsed_args.max_rate)])
+        if parsed_args.retries is not None:
+            argv.extend(['--retries', str(parsed_args.retries)])
+        if parsed_args.node_concurrency is not None:
+            argv.extend(['--node-concurrency', str(parsed_args.node_concurrency)])
+        if parsed_args.node_endpoints:
+            argv.append('--node-endpoints')
+        if parsed_args.largest_first is not None:
+            argv.extend(['--largest-first', parsed_args.largest_first])
+        return argv
+
+    def _iter_sample(self):
+        columns = list(MONITOR_COLUMNS)
+        if self._selector is not None:
+            columns.extend(column for column in self._selector.columns if column not in columns)
+        queues = self.client.iter_queues(self._vhost,
+                                         columns=columns,
+                                         disable_stats=False,
+                                         name_regex=self._selector and self._selector.name_regex)
+        for queue in queues:
+            if self._selector is None or self._selector.matches(queue):
+                yield queue
+
+    def _get_sort_key(self):
+        attribute = SORT_FIELDS[self.sort_field]
+
+        def get_key(row):
+            # rows without the value (new queues) are the last ones
+            value = getattr(row, attribute)
+            return (value is not None, value)
+        return get_key
+
+    def sample(self):
+        """
+        List queues; return the top rows and totals of the sample.
+        """
+        totals = SampleTotals()
+        rows = totals.iter_counted(self._rates.iter_rows(self._iter_sample(), time.time()))
+        top_rows = heapq.nlargest(self.top, rows, key=self._get_sort_key())
+        return top_rows, totals
+
+    def render(self, top_rows, totals, listing_time):
+        """
+        Return lines of the view of the sample; rows are numbered,
+        so they can be chosen in commands.
+        """
+        self._shown_queues = {}
+        lines = [
+            '{} - vhost {!r}: {} queues, {} messages, published {}/s, delivered {}/s, '
+            'listed in {:.2f} s'.format(time.strftime('%H:%M:%S'), self._vhost,
+                                        totals.queue_count, totals.messages,
+                                        _format_number(totals.publish_rate, '{:.1f}'),
+                                        _format_number(totals.deliver_rate, '{:.1f}'),
+                                        listing_time),
+            '',
+            '{:>5} {:>12} {:>10} {:>10} {:>10} {:>9}  {}'.format(
+                '#', 'messages', 'growth', 'publish/s', 'deliver/s', 'consumers', 'name'),
+        ]
+        for number, row in enumerate(top_rows, 1):
+            self._shown_queues[number] = row.name
+            lines.append('{:>5} {:>12} {:>10} {:>10} {:>10} {:>9}  {}'.format(
+                '[{}]'.format(number), row.messages, _format_number(row.growth, '{:+d}'),
+                _format_number(row.publish_rate, '{:.1f}'),
+                _format_number(row.deliver_rate, '{:.1f}'), row.consumers, row.name))
+        lines.extend([
+            '',
+            'Sorted by {}. Commands: p NUMBERS|SELECTION - purge, d NUMBERS|SELECTION - '
+            'delete, s FIELD - sort, r - refresh, q - quit.'.format(self.sort_field),
+        ])
+        return lines
+
+    def _show(self, lines):
+        if sys.stdout.isatty():
+            sys.stdout.write(CLEAR_SCREEN)
+        sys.stdout.write('\n'.join(lines) + '\n')
+        sys.stdout.flush()
+
+    def _wait_for_command(self, timeout):
+        """
+        Return a command typed in the timeout (None, if no command
+        has been typed, or the standard input is not a terminal).
+        """
+        if not sys.stdin.isatty():
+            time.sleep(timeout)
+            return None
+        if not select.select([sys.stdin], [], [], timeout)[0]:
+            return None
+        line = sys.stdin.readline()
+        if not line:
+            raise StopReceivingInput
+        return line.strip()
+
+    def _handle_command(self, command_line):
+        """
+        Run the command; return True, if queues have to be listed
+        again right away.
+        """
+        command, _, argument = command_line.partition(' ')
+        command = command.lower()
+        argument = argument.strip()
+        if not command:
+            return False
+        if command in self.quitting_commands:
+            raise StopReceivingInput
+        if command in self.refresh_commands:
+            return True
+        if command in self.sort_commands:
+            if argument not in SORT_FIELDS:
+                logger.error('Queues can be sorted by: %s.', ', '.join(sorted(SORT_FIELDS)))
+                return False
+            self.sort_field = argument
+            return True
+        if command in self.action_tools:
+            return self._apply_action(self.action_tools[command], argument)
+        logger.error('Unknown command: %r.', command)
+        return False
+
+    def _apply_action(self, tool_class, argument):
+        parsed_input = self._parse_input(argument) if argument else None
+        queue_names = None
+        if isinstance(parsed_input, Selector):
+            argv = ['--select', argument]
+            description = 'queues matching {!r}'.format(argument)
+        elif isinstance(parsed_input, Sequence) and not isinstance(parsed_input, basestring):
+            # names are not passed as arguments, so names like "all"
+            # or "-x" do not change queues chosen by the tool
+            argv = []
+            queue_names = [self._shown_queues[number] for number in parsed_input
+                           if number in self._shown_queues]
+            if not queue_names:
+                logger.error('No queues were selected.')
+                return False
+            description = ', '.join(queue_names)
+        else:
+            logger.error('Choose queues by numbers of shown rows, or by a selection.')
+            return False
+        flush_background_logging()
+        answer = raw_input('{} {}? [y/N] '.format(self.action_names[tool_class], description))
+        if answer.strip().lower() not in ('y', 'yes'):
+            return False
+        tool = tool_class(config=self.config, argv=argv + self._get_action_argv())
+        tool.client = self.client
+        if queue_names is None:
+            tool.run()
+        else:
+            with tool.running():
+                tool.make_action_on_named_queues(queue_names)
+        return True
+
+    def _run(self):
+        from pyrabbit.http import (
+            HTTPError,
+            NetworkError,
+        )
+        sample_count = 0
+        next_sample_time = time.time()
+        try:
+            while self.iterations is None or sample_count < self.iterations:
+                start = time.time()
+                try:
+                    top_rows, totals = self.sample()
+                except (HTTPError, NetworkError) as e:
+                    logger.error('Cannot list queues: %s', e)
+                else:
+                    self._show(self.render(top_rows, totals, time.time() - start))
+                sample_count += 1
+                if sample_count == self.iterations:
+                    break
+                next_sample_time = max(next_sample_time + self.interval, time.time())
+                while True:
+                    timeout = next_sample_time - time.time()
+                    if timeout <= 0:
+                        break
+                    command_line = self._wait_for_command(timeout)
+                    if command_line and self._handle_command(command_line):
+                        next_sample_time = time.time()
+                        break
+        except StopReceivingInput:
+            print 'bye'
+
+
+def main():
+    with log_exceptions():
+        top_tool = TopTool()
+        try:
+            top_tool.run()
+        except KeyboardInterrupt:
+            print "Bye"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+import base64
+import httplib
+import socket
+from collections import OrderedDict
+from Queue import (
+    Empty,
+    Full,
+    LifoQueue,
+)
+from urllib import (
+    quote,
+    urlencode,
+)
+from urlparse import urljoin
+
+from pyrabbit import Client
+from pyrabbit.http import (
+    HTTPClient,
+    HTTPError,
+    NetworkError,
+)
+
+from rabbit_tools.executor import (
+    BoundedExecutor,
+    PartitionedExecutor,
+)
+from rabbit_tools.jsonstream import JSONArrayStream
+
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 5
+DEFAULT_CONNECT_TIMEOUT = 5
+# maximal page size accepted by the management API
+DEFAULT_PAGE_SIZE = 500
+
+
+class PooledHTTPClient(HTTPClient):
+
+    """
+    Replacement of the PyRabbit's HTTP client, which keeps
+    persistent (keep-alive) connections to the management API
+    in a pool, so consecutive requests do not have to open
+    a new TCP connection each time.
+
+    The client is thread-safe. At most `pool_size` idle
+    connections are kept; if more threads make requests
+    at the same time, additional connections are opened
+    and closed after the request.
+    """
+
+    connection_class = httplib.HTTPConnection
+    chunk_size = 64 * 1024
+
+    def __init__(self, server, uname, passwd, timeout=DEFAULT_TIMEOUT,
+                 pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT):
+        self.base_url = 'http://%s/api/' % server
+        self._base_path = '/api/'
+        self._server = server
+        self._timeout = timeout
+        self._connect_timeout = connect_timeout
+        self._auth_header = 'Basic ' + base64.b64encode('{}:{}'.format(uname, passwd))
+        self._pool = LifoQueue(maxsize=pool_size)
+
+    def _get_connection(self):
+        try:
+            return self._pool.get_nowait()
+        except Empty:
+            return self._new_connection()
+
+    def _new_connection(self):
+        conn = self.connection_class(self._server, timeout=self._connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self._timeout)
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _release_connection(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except Empty:
+                return
+
+    @staticmethod
+    def _get_network_error(exc):
+        if isinstance(exc, socket.timeout):
+            return NetworkError("Timeout while trying to connect to RabbitMQ")
+        return NetworkError("Error: %s %s" % (type(exc), exc))
+
+    def _get_headers(self, headers):
+        request_headers = {'Authorization': self._auth_header}
+        if headers:
+            request_headers.update(headers)
+        return request_headers
+
+    @staticmethod
+    def _send(conn, reqtype, url, body, headers):
+        conn.request(reqtype, url, body, headers)
+        return conn.getresponse()
+
+    def _open(self, path, reqtype, body=None, headers=None):
+        """
+        Send a request and return the connection and the response,
+        which body has not been read yet.
+        """
+        url = urljoin(self._base_path, path)
+        headers = self._get_headers(headers)
+        conn = None
+        try:
+            conn = self._get_connection()
+            try:
+                resp = self._send(conn, reqtype, url, body, headers)
+            except socket.timeout:
+                raise
+            except (httplib.HTTPException, socket.error):
+                # the idle connection could have been closed by the server,
+                # so retry once with a fresh one
+                conn.close()
+                conn = self._new_connection()
+                resp = self._send(conn, reqtype, url, body, headers)
+        except Exception as e:
+            if conn is not None:
+                conn.close()
+            raise self._get_network_error(e)
+        return conn, resp
+
+    def _read(self, conn, resp, amt=None):
+        try:
+            return resp.read(amt)
+        except Exception as e:
+            conn.close()
+            raise self._get_network_error(e)
+
+    def _finish(self, conn, resp):
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release_connection(conn)
+
+    def _raise_for_status(self, resp, content, path, body=None):
+        if resp.status < 200 or resp.status > 206:
+            if content:
+                content = self.decode_json_content(content)
+            raise HTTPError(content, resp.status, resp.reason, path, body)
+
+    def do_call(self, path, reqtype, body=None, headers=None):
+        conn, resp = self._open(path, reqtype, body, headers)
+        content = self._read(conn, resp)
+        self._finish(conn, resp)
+        self._raise_for_status(resp, content, path, body)
+        if content:
+            return self.decode_json_content(content) or None
+        return None
+
+    def stream_call(self, path, key='items', fields=None):
+        """
+        Send a GET request and return JSONArrayStream, decoding
+        the response body while it is being received.
+        """
+        conn, resp = self._open(path, 'GET')
+        if resp.status < 200 or resp.status > 206:
+            content = self._read(conn, resp)
+            self._finish(conn, resp)
+            self._raise_for_status(resp, content, path)
+        return JSONArrayStream(self._iter_chunks(conn, resp), key=key, fields=fields)
+
+    def _iter_chunks(self, conn, resp):
+        finished = False
+        try:
+            while True:
+                chunk = self._read(conn, resp, self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+            finished = True
+        finally:
+            # a connection with partially read response cannot be reused
+            if finished:
+                self._finish(conn, resp)
+            else:
+                conn.close()
+
+
+class ManagementClient(Client):
+
+    """
+    PyRabbit's client using the pooled HTTP client, extended
+    with a lightweight, paginated listing of queues.
+    """
+
+    def __init__(self, host, user, passwd, timeout=DEFAULT_TIMEOUT,
+                 pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 page_size=DEFAULT_PAGE_SIZE):
+        super(ManagementClient, self).__init__(host, user, passwd, timeout)
+        self.http = PooledHTTPClient(host, user, passwd,
+                                     timeout=timeout,
+                                     pool_size=pool_size,
+                                     connect_timeout=connect_timeout)
+        self.page_size = page_size
+
+    def _get_queues_page(self, vhost, page, columns, disable_stats, name_regex):
+        params = [
+            ('page', page),
+            ('page_size', self.page_size),
+            ('sort', 'name'),
+        ]
+        if name_regex:
+            params.append(('name', name_regex))
+            params.append(('use_regex', 'true'))
+        if columns:
+            params.append(('columns', ','.join(columns)))
+        if disable_stats:
+            params.append(('disable_stats', 'true'))
+        path = '{}?{}'.format(Client.urls['queues_by_vhost'] % quote(vhost, ''),
+                              urlencode(params))
+        fields = None
+        if columns:
+            # "object.field" columns are returned in nested objects
+            fields = list(OrderedDict.fromkeys(column.partition('.')[0] for column in columns))
+        return self.http.stream_call(path, fields=fields)
+
+    def iter_queues(self, vhost, columns=None, disable_stats=True, name_regex=None):
+        """
+        Yield queues of the vhost, fetching them page by page.
+        Responses are decoded incrementally, so queues are yielded
+        while a page is still being received.
+
+        Only the `columns` (all, if not set) of each queue are
+        requested and kept. If `disable_stats` is True, the API
+        does not collect statistics of queues (like numbers
+        of messages), which makes the listing much cheaper
+        for the broker.
+
+        Pages after the first one are fetched from the last one
+        backwards, so queues removed from already yielded pages
+        (e.g. deleted by the consumer of the generator) do not shift
+        positions of queues in pages, which have not been fetched yet.
+
+        If `name_regex` is set, the API returns only queues with
+        names matching it. Brokers not supporting the pagination
+        ignore the filter and return the whole list at once, it is
+        yielded then as it is received.
+        """
+        first_page = self._get_queues_page(vhost, 1, columns, disable_stats, name_regex)
+        first_page_queues = []
+        for queue in first_page:
+            if first_page.is_list:
+                yield queue
+            else:
+                first_page_queues.append(queue)
+        if first_page.is_list:
+            return
+        for page in xrange(first_page.attributes['page_count'], 1, -1):
+            for queue in self._get_queues_page(vhost, page, columns, disable_stats, name_regex):
+                yield queue
+        for queue in first_page_queues:
+            yield queue
+
+
+class HTTPBackend(object):
+
+    """
+    Backend of tools applying actions with requests of the management
+    API. A queue is handled by `call_method(chosen_queue, before_send)`,
+    which sends the request of the tool (retrying it, if needed)
+    and returns (error, latency, messages); up to `concurrency`
+    queues are handled in parallel. With `get_node`, queues are
+    partitioned by their home nodes, and up to `node_concurrency`
+    queues of a node are handled at once (see `PartitionedExecutor`).
+    """
+
+    def __init__(self, call_method, concurrency=1, node_concurrency=None, get_node=None):
+        self._call_method = call_method
+        self.concurrency = concurrency
+        self.node_concurrency = node_concurrency or concurrency
+        self._get_node = get_node
+
+    def close(self):
+        pass
+
+    def iter_results(self, method_name, chosen_queues, before_send=None):
+        """
+        Apply the action to queues from an iterable of (key, queue
+        name) pairs, like `AMQPBackend.iter_results()`, but yield
+        tuples in the order of completion. The method is chosen
+        by `call_method` (e.g. the client of the home node of a queue),
+        which calls `before_send` before each request.
+        """
+        def call_method(chosen_queue):
+            return self._call_method(chosen_queue, before_send)
+        if self.concurrency > 1 and self._get_node is not None:
+            executor = PartitionedExecutor(self.concurrency, self.node_concurrency)
+            results = executor.map_unordered(call_method, chosen_queues,
+                                             lambda chosen_queue: self._get_node(chosen_queue[1]))
+        elif self.concurrency > 1:
+            executor = BoundedExecutor(self.concurrency)
+            results = executor.map_unordered(call_method, chosen_queues)
+        else:
+            results = ((chosen_queue, call_method(chosen_queue), None)
+                       for chosen_queue in chosen_queues)
+        try:
+            for chosen_queue, result, exc_info in results:
+                if exc_info is not None:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                error, latency, messages = result
+                yield chosen_queue, error, latency, messages
+        finally:
+            # workers stop taking queues, when the consumer stops early
+            results.close()
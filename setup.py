@@ -14,7 +14,11 @@ setup(
         'console_scripts': [
             'rabdel = rabbit_tools.delete:main',
             'rabpurge = rabbit_tools.purge:main',
+            'rabmove = rabbit_tools.move:main',
+            'rabtop = rabbit_tools.top:main',
             'rabbit_tools_config = rabbit_tools.config:main',
+            'rabshell = rabbit_tools.shell:main',
+            'rabbit_tools_complete = rabbit_tools.names_cache:main',
             'testone = rabbit_tools.delete:main',
             'testtwo = rabbit_tools.delete:main',
         ],